@@ -1,4 +1,5 @@
 import yaml
+from functools import lru_cache
 from pathlib import Path
 
 class Config:
@@ -15,6 +16,214 @@ class Config:
     def description_max_length(self) -> int:
         return self._data["description"]["max_length"]
 
+    @property
+    def caption_batch_size(self) -> int:
+        return self._data.get("caption", {}).get("batch_size", 8)
+
+    @property
+    def images_max_decode_pixels(self) -> int:
+        return int(self._data.get("images", {}).get("max_decode_mp", 100) * 1_000_000)
+
+    @property
+    def caption_cache_enabled(self) -> bool:
+        return self._data.get("cache", {}).get("captions", {}).get("enabled", True)
+
+    @property
+    def caption_cache_path(self) -> str:
+        return self._data.get("cache", {}).get("captions", {}).get("path", ".cache/captions.db")
+
+    @property
+    def caption_cache_max_entries(self) -> int:
+        return self._data.get("cache", {}).get("captions", {}).get("max_entries", 100_000)
+
+    @property
+    def caption_cache_max_bytes(self) -> int:
+        return int(self._data.get("cache", {}).get("captions", {}).get("max_mb", 64) * 2**20)
+
+    @property
+    def media_cache_enabled(self) -> bool:
+        return self._data.get("cache", {}).get("media", {}).get("enabled", True)
+
+    @property
+    def media_cache_path(self) -> str:
+        return self._data.get("cache", {}).get("media", {}).get("path", ".cache/media")
+
+    @property
+    def media_cache_max_bytes(self) -> int:
+        return int(self._data.get("cache", {}).get("media", {}).get("max_mb", 1024) * 2**20)
+
+    @property
+    def ocr_enabled(self) -> bool:
+        return self._data.get("ocr", {}).get("enabled", True)
+
+    @property
+    def ocr_tesseract_cmd(self) -> str | None:
+        return self._data.get("ocr", {}).get("tesseract_cmd")
+
+    @property
+    def ocr_tesseract_config(self) -> str:
+        return self._data.get("ocr", {}).get("config", "--oem 3 --psm 7 -l eng")
+
+    @property
+    def ocr_workers(self) -> int:
+        return self._data.get("ocr", {}).get("workers", 2)
+
+    @property
+    def ocr_precheck_enabled(self) -> bool:
+        return self._data.get("ocr", {}).get("precheck", {}).get("enabled", True)
+
+    @property
+    def ocr_precheck_size(self) -> int:
+        return self._data.get("ocr", {}).get("precheck", {}).get("size", 256)
+
+    @property
+    def ocr_precheck_edge_threshold(self) -> int:
+        return self._data.get("ocr", {}).get("precheck", {}).get("edge_threshold", 60)
+
+    @property
+    def ocr_precheck_min_density(self) -> float:
+        return self._data.get("ocr", {}).get("precheck", {}).get("min_density", 0.12)
+
+    @property
+    def caption_backend(self) -> str:
+        return self._data.get("caption", {}).get("backend", "torch")
+
+    @property
+    def caption_decoding(self) -> str:
+        return self._data.get("caption", {}).get("decoding", "beam")
+
+    @property
+    def caption_num_beams(self) -> int:
+        return self._data.get("caption", {}).get("num_beams", 5)
+
+    @property
+    def caption_max_length(self) -> int:
+        return self._data.get("caption", {}).get("max_length", 150)
+
+    @property
+    def caption_min_length(self) -> int:
+        return self._data.get("caption", {}).get("min_length", 20)
+
+    @property
+    def caption_onnx_dir(self) -> str:
+        return self._data.get("caption", {}).get("onnx", {}).get("dir", ".cache/blip-onnx")
+
+    @property
+    def caption_onnx_quantize(self) -> bool:
+        return self._data.get("caption", {}).get("onnx", {}).get("quantize", True)
+
+    @property
+    def caption_onnx_threads(self) -> int:
+        return self._data.get("caption", {}).get("onnx", {}).get("threads", 0)
+
+    @property
+    def series_enabled(self) -> bool:
+        return self._data.get("series", {}).get("enabled", True)
+
+    @property
+    def series_threshold(self) -> int:
+        return self._data.get("series", {}).get("threshold", 6)
+
+    @property
+    def series_share_metadata(self) -> bool:
+        return self._data.get("series", {}).get("share_metadata", True)
+
+    @property
+    def video_probe_workers(self) -> int:
+        return self._data.get("video", {}).get("probe_workers", 8)
+
+    @property
+    def probe_cache_enabled(self) -> bool:
+        return self._data.get("cache", {}).get("probe", {}).get("enabled", True)
+
+    @property
+    def probe_cache_path(self) -> str:
+        return self._data.get("cache", {}).get("probe", {}).get("path", ".cache/probe.db")
+
+    @property
+    def video_keyframes(self) -> int:
+        return self._data.get("video", {}).get("keyframes", 3)
+
+    @property
+    def video_scene_samples(self) -> int:
+        return self._data.get("video", {}).get("scene_samples", 16)
+
+    @property
+    def video_scene_threshold(self) -> float:
+        return self._data.get("video", {}).get("scene_threshold", 0.35)
+
+    @property
+    def video_keyframe_cache_bytes(self) -> int:
+        return int(self._data.get("video", {}).get("keyframe_cache_mb", 64) * 2**20)
+
+    @property
+    def models_idle_timeout(self) -> float:
+        return self._data.get("models", {}).get("idle_timeout", 600)
+
+    @property
+    def models_prewarm(self) -> bool:
+        return self._data.get("models", {}).get("prewarm", True)
+
+    @property
+    def llm_host(self) -> str:
+        return self._data.get("llm", {}).get("host", "http://127.0.0.1:11434")
+
+    @property
+    def llm_model(self) -> str:
+        return self._data.get("llm", {}).get("model", "gemma2:2b")
+
+    @property
+    def llm_keep_alive(self) -> str | int:
+        return self._data.get("llm", {}).get("keep_alive", "30m")
+
+    @property
+    def llm_timeout(self) -> float:
+        return self._data.get("llm", {}).get("timeout", 120)
+
+    @property
+    def llm_connect_timeout(self) -> float:
+        return self._data.get("llm", {}).get("connect_timeout", 5)
+
+    @property
+    def llm_options(self) -> dict:
+        return self._data.get("llm", {}).get("options") or {}
+
+    @property
+    def llm_mode(self) -> str:
+        return self._data.get("llm", {}).get("mode", "structured")
+
+    @property
+    def llm_structured_retries(self) -> int:
+        return self._data.get("llm", {}).get("structured_retries", 1)
+
+    @property
+    def llm_concurrency(self) -> int:
+        return self._data.get("llm", {}).get("concurrency", 4)
+
+    @property
+    def llm_cache_enabled(self) -> bool:
+        return self._data.get("llm", {}).get("cache", {}).get("enabled", True)
+
+    @property
+    def llm_cache_path(self) -> str:
+        return self._data.get("llm", {}).get("cache", {}).get("path", ".cache/llm.db")
+
+    @property
+    def llm_cache_version(self) -> str:
+        return str(self._data.get("llm", {}).get("cache", {}).get("version", 1))
+
+    @property
+    def llm_cache_ttl(self) -> float:
+        return self._data.get("llm", {}).get("cache", {}).get("ttl_days", 30) * 86400
+
+    @property
+    def llm_cache_memory_items(self) -> int:
+        return self._data.get("llm", {}).get("cache", {}).get("memory_items", 2048)
+
+    @property
+    def llm_cache_max_entries(self) -> int:
+        return self._data.get("llm", {}).get("cache", {}).get("max_entries", 200_000)
+
     @property
     def keywords_total(self) -> int:
         return self._data["keywords"]["total"]
@@ -35,6 +244,30 @@ class Config:
     def keywords_mandatory(self) -> list[str]:
         return self._data["keywords"]["mandatory"]
 
+    @property
+    def keywords_similarity(self) -> float:
+        return self._data["keywords"].get("similarity", 0.85)
+
+    @property
+    def holidays_window_days(self) -> int:
+        return self._data.get("holidays", {}).get("window_days", 30)
+
+    @property
+    def holidays_only_window(self) -> bool:
+        return self._data.get("holidays", {}).get("only_window", False)
+
+    @property
+    def vocab_enabled(self) -> bool:
+        return self._data.get("vocab", {}).get("enabled", True)
+
+    @property
+    def vocab_path(self) -> str:
+        return self._data.get("vocab", {}).get("path", "output/vocab.db")
+
+    @property
+    def vocab_cache_items(self) -> int:
+        return self._data.get("vocab", {}).get("cache_items", 20000)
+
     @property
     def input_dir(self) -> str:
         return self._data["output"]["input_dir"]
@@ -46,3 +279,13 @@ class Config:
     @property
     def output_mode(self) -> str:
         return self._data["output"]["mode"]
+
+    @property
+    def exiftool_processes(self) -> int:
+        return self._data["output"].get("exiftool_processes", 2)
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Общий экземпляр Config для сервисов (config.yaml читается один раз)"""
+    return Config()
@@ -0,0 +1,68 @@
+"""
+Общий слой загрузки картинок: декодируем сразу в то разрешение,
+которое нужно потребителю (модель, OCR, превью), а не в полные 40–60 MP.
+JPEG уменьшается ещё на этапе DCT (Image.draft), остальное — через reduce().
+"""
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from adapters.config_loader import get_config
+
+# BLIP сам приводит вход к 384×384 — короткая сторона должна быть не меньше
+MODEL_SIZE = 384
+# Tesseract'у нужны читаемые буквы, но не 8000 px по длинной стороне
+OCR_SIZE = 1600
+# превью в таблице Qt / веб-интерфейсе (с запасом под HiDPI)
+THUMB_SIZE = 240
+
+
+class ImageTooLargeError(ValueError):
+    """Картинку нельзя уменьшить при декодировании, а целиком она не влезает в лимит памяти."""
+
+
+def _target_size(size: tuple[int, int], side: int, cover: bool) -> tuple[int, int]:
+    w, h = size
+    scale = side / (min(w, h) if cover else max(w, h))
+    if scale >= 1:
+        return w, h
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def fit(image: Image.Image, side: int, cover: bool = False) -> Image.Image:
+    """
+    Уменьшает уже декодированную картинку.
+    cover=False — длинная сторона ≤ side; cover=True — короткая сторона = side.
+    """
+    target = _target_size(image.size, side, cover)
+    if target == image.size:
+        return image
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image.resize(target, Image.Resampling.LANCZOS)
+
+
+def load_image(path: str | Path, side: int, cover: bool = False, mode: str = "RGB") -> Image.Image:
+    """
+    Открывает картинку сразу в нужном разрешении (см. fit) и с учётом EXIF-поворота.
+    Пиковая память на одну картинку ограничена images.max_decode_mp из config.yaml.
+    """
+    image = Image.open(path)
+    target = _target_size(image.size, side, cover)
+    if image.format == "JPEG" and target != image.size:
+        # DCT-scaling: libjpeg декодирует в 1/2, 1/4 или 1/8 размера, не меньше target
+        image.draft(mode, target)
+
+    max_pixels = get_config().images_max_decode_pixels
+    if image.width * image.height > max_pixels:
+        image.close()
+        raise ImageTooLargeError(
+            f"{Path(path).name}: {image.width}×{image.height} больше лимита "
+            f"{max_pixels / 1e6:.0f} MP для декодирования"
+        )
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != mode:
+        image = image.convert(mode)
+    return fit(image, side, cover)
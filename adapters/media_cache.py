@@ -0,0 +1,217 @@
+"""
+Общий дисковый кэш производных медиа: ключевые кадры видео, превью картинок и веб-превью.
+
+Ключ = абсолютный путь + размер + mtime исходника + вид записи + параметры
+извлечения (сторона, cover, настройки сцен...), поэтому одноимённые файлы из разных
+папок не пересекаются, а изменённый файл просто даёт новый ключ.
+Файлы пишутся во временный файл и атомарно переименовываются (os.replace),
+учёт размера и LRU — в SQLite (WAL), так что кэш можно делить между воркерами
+и процессами. Сверх cache.media.max_mb вытесняются давно не читанные записи.
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from PIL import Image
+
+from adapters.config_loader import get_config
+
+
+def _source_id(path: str | Path) -> dict:
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class MediaCache:
+    """Файлы в root/<2 символа>/<sha256>.<suffix> + индекс размеров и обращений."""
+
+    def __init__(self, root: str | Path, max_bytes: int = 1024 * 2**20):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.root / "index.db", timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS entry (
+            name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entry_last_access ON entry(last_access);
+        -- число записей и суммарный размер держат триггеры: put() не пересчитывает весь индекс,
+        -- и итог верен для всех процессов, пишущих в этот кэш
+        CREATE TABLE IF NOT EXISTS entry_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            entries INTEGER NOT NULL,
+            bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO entry_totals(id, entries, bytes)
+            SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM entry;
+        CREATE TRIGGER IF NOT EXISTS entry_totals_insert AFTER INSERT ON entry BEGIN
+            UPDATE entry_totals SET entries = entries + 1, bytes = bytes + new.size WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entry_totals_delete AFTER DELETE ON entry BEGIN
+            UPDATE entry_totals SET entries = entries - 1, bytes = bytes - old.size WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entry_totals_update AFTER UPDATE OF size ON entry BEGIN
+            UPDATE entry_totals SET bytes = bytes + new.size - old.size WHERE id = 1;
+        END;
+        """)
+        self.conn.commit()
+
+    def entry_name(self, source: str | Path, kind: str, params: dict, suffix: str) -> str:
+        key = json.dumps({"source": _source_id(source), "kind": kind, "params": params}, sort_keys=True)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return f"{digest[:2]}/{digest}.{suffix}"
+
+    def get(self, name: str) -> Path | None:
+        """Путь к записи или None; чтение продлевает ей жизнь в LRU."""
+        file = self.root / name
+        with self._lock:
+            if not file.exists():
+                self.misses += 1
+                self.conn.execute("DELETE FROM entry WHERE name = ?", (name,))
+                self.conn.commit()
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE entry SET last_access = ? WHERE name = ?", (time.time(), name))
+            self.conn.commit()
+        return file
+
+    def put(self, name: str, data: bytes) -> Path:
+        """Атомарная запись: читатели видят либо старый файл, либо новый целиком."""
+        file = self.root / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=file.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, file)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            # upsert, а не INSERT OR REPLACE: при REPLACE триггеры удаления не срабатывают
+            self.conn.execute(
+                "INSERT INTO entry(name, size, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET size = excluded.size, last_access = excluded.last_access",
+                (name, len(data), time.time())
+            )
+            self._evict()
+            self.conn.commit()
+        return file
+
+    def _evict(self):
+        """Удаляем самые давно читанные файлы, пока кэш не влезет в max_bytes (скан — только при превышении)."""
+        total = self.conn.execute("SELECT bytes FROM entry_totals WHERE id = 1").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for name, size in self.conn.execute("SELECT name, size FROM entry ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            victims.append((name,))
+            total -= size
+        for (name,) in victims:
+            (self.root / name).unlink(missing_ok=True)
+        self.conn.executemany("DELETE FROM entry WHERE name = ?", victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self.conn.execute("SELECT entries, bytes FROM entry_totals WHERE id = 1").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+
+def encode_jpeg(image: Image.Image, quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _open_cached(name: str) -> Image.Image | None:
+    file = media_cache.get(name)
+    if file is None:
+        return None
+    try:
+        with Image.open(file) as image:
+            return image.convert("RGB")
+    except OSError:
+        return None  # вытеснена другим воркером между get и open — строим заново
+
+
+def cached_images(source: str | Path, kind: str, params_list: list[dict],
+                  build: Callable[[list[int]], list[Image.Image | None]],
+                  quality: int = 90) -> list[Image.Image | None]:
+    """
+    Несколько картинок одного исходника (например, кадры ролика): из кэша (JPEG)
+    те, что есть, build(индексы промахов) — одним вызовом для остальных.
+    build возвращает список, выровненный с промахами; None (кадра нет — ролик короче)
+    остаётся None и в результате, выровненном с params_list.
+    """
+    if media_cache is None:
+        return list(build(list(range(len(params_list)))))
+    names = [media_cache.entry_name(source, kind, params, "jpg") for params in params_list]
+    images = [_open_cached(name) for name in names]
+    missing = [i for i, image in enumerate(images) if image is None]
+    if missing:
+        for i, image in zip(missing, build(missing)):
+            if image is not None:
+                media_cache.put(names[i], encode_jpeg(image, quality))
+                images[i] = image
+    return images
+
+
+def cached_image(source: str | Path, kind: str, params: dict,
+                 build: Callable[[], Image.Image], quality: int = 90) -> Image.Image:
+    """Одна картинка из кэша или build(), сохранённая в кэш; без кэша — просто build()."""
+    return cached_images(source, kind, [params], lambda _: [build()], quality)[0]
+
+
+def cached_json(source: str | Path, kind: str, params: dict, build: Callable[[], dict]) -> dict:
+    """Небольшие данные, посчитанные по исходнику (сцены ролика и т.п.)."""
+    if media_cache is None:
+        return build()
+    name = media_cache.entry_name(source, kind, params, "json")
+    file = media_cache.get(name)
+    if file is not None:
+        try:
+            return json.loads(file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+    data = build()
+    media_cache.put(name, json.dumps(data).encode("utf-8"))
+    return data
+
+
+def cached_path(source: str | Path, kind: str, params: dict,
+                build: Callable[[], Image.Image], quality: int = 85) -> Path | None:
+    """Путь к JPEG в кэше (для отдачи файлом, как в веб-превью); None — кэш выключен."""
+    if media_cache is None:
+        return None
+    name = media_cache.entry_name(source, kind, params, "jpg")
+    return media_cache.get(name) or media_cache.put(name, encode_jpeg(build(), quality))
+
+
+_config = get_config()
+media_cache = MediaCache(
+    _config.media_cache_path,
+    max_bytes=_config.media_cache_max_bytes,
+) if _config.media_cache_enabled else None
@@ -1,35 +1,207 @@
+"""
+Запись метаданных в файлы: картинки — внутрь через exiftool, видео — .xmp рядом.
+
+exiftool — Perl, и запуск интерпретатора стоит дороже самой записи, поэтому
+процессы запускаются один раз в режиме `-stay_open True -@ -` и живут до выхода.
+Аргументы каждого файла уходят в stdin процесса и закрываются `-execute<N>`;
+ответ читается до `{ready<N>}` в stdout (и до такой же метки, выведенной
+через -echo4, в stderr), так что результат однозначно относится к своему файлу.
+write_many раскладывает файлы по пулу из output.exiftool_processes процессов.
+"""
+import atexit
+import itertools
+import re
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+
+from adapters.config_loader import get_config
 from domain.models import MetadataEntity
 
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+_UPDATED = re.compile(r"(\d+) image files? updated")
+
+
+class ExifToolError(RuntimeError):
+    """exiftool не записал файл (текст — из его stderr/stdout)."""
+
+
+def _arg(value: str) -> str:
+    # в -@ каждый аргумент — одна строка
+    return " ".join(str(value).splitlines())
+
+
+def image_args(meta: MetadataEntity) -> list[str]:
+    """Аргументы exiftool для одного файла: каждый ключ — отдельный элемент списка Keywords."""
+    args = [
+        f"-Title={_arg(meta.title or '')}",
+        f"-Description={_arg(meta.description or '')}",
+        "-Keywords=",  # сначала очищаем, иначе ключи допишутся к старым
+    ]
+    args += [f"-Keywords={_arg(kw)}" for kw in meta.keywords or []]
+    return args + ["-overwrite_original"]
+
+
+class ExifToolProcess:
+    """Один постоянный exiftool; запросы к нему идут по очереди (lock)."""
+
+    def __init__(self, executable: str = "exiftool"):
+        self.executable = executable
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._proc: subprocess.Popen | None = None
+
+    def _start(self):
+        self._proc = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-", "-common_args", "-charset", "filename=utf8"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="replace",
+        )
+
+    @staticmethod
+    def _read_until(stream, marker: str) -> str:
+        lines = []
+        for line in stream:
+            if line.rstrip("\r\n") == marker:
+                return "".join(lines)
+            lines.append(line)
+        raise ExifToolError("exiftool завершился посреди ответа")
+
+    def execute(self, args: list[str]) -> tuple[str, str]:
+        """Один запуск команды внутри живого процесса → (stdout, stderr)."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            n = next(self._counter)
+            marker = f"{{ready{n}}}"
+            try:
+                self._proc.stdin.write("\n".join(args + ["-echo4", marker, f"-execute{n}"]) + "\n")
+                self._proc.stdin.flush()
+                out = self._read_until(self._proc.stdout, marker)
+                err = self._read_until(self._proc.stderr, marker)
+            except (OSError, ExifToolError):
+                # процесс умер — следующий запрос поднимет новый
+                self._kill()
+                raise
+            return out, err
+
+    def write(self, path: Path, meta: MetadataEntity):
+        out, err = self.execute(image_args(meta) + [str(path)])
+        updated = _UPDATED.search(out)
+        if not updated or int(updated.group(1)) == 0 or "Error" in err:
+            raise ExifToolError((err or out).strip() or "файл не обновлён")
+
+    def _kill(self):
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def close(self):
+        with self._lock:
+            if self._proc is None:
+                return
+            try:
+                self._proc.stdin.write("-stay_open\nFalse\n")
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+            self._proc = None
+
+
+class ExifToolWriter:
+    """Пул постоянных exiftool; файлы пачки раскладываются по процессам."""
+
+    def __init__(self, processes: int = 2, executable: str = "exiftool"):
+        self.processes = [ExifToolProcess(executable) for _ in range(max(1, processes))]
+
+    def write_many(self, items: list[tuple[Path, MetadataEntity]]) -> dict[Path, str | None]:
+        """path → None (записано) или текст ошибки, для каждого файла."""
+        if not items:
+            return {}
+        shards = [items[i::len(self.processes)] for i in range(len(self.processes))]
+
+        def run(process: ExifToolProcess, shard):
+            result = {}
+            for path, meta in shard:
+                try:
+                    process.write(path, meta)
+                    result[path] = None
+                except Exception as e:
+                    result[path] = str(e)
+            return result
+
+        results: dict[Path, str | None] = {}
+        with ThreadPoolExecutor(max_workers=len(self.processes)) as pool:
+            for part in pool.map(run, self.processes, shards):
+                results.update(part)
+        return {path: results[path] for path, _ in items}
+
+    def close(self):
+        for process in self.processes:
+            process.close()
+
+
+_writer: ExifToolWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> ExifToolWriter:
+    """Общий пул процесса; exiftool закрываются при выходе."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ExifToolWriter(get_config().exiftool_processes)
+            atexit.register(_writer.close)
+        return _writer
+
+
+def write_many(entities: list[MetadataEntity]) -> dict[str, str | None]:
+    """
+    Пакетная запись: картинки — через постоянные exiftool, видео — .xmp рядом.
+    Возвращает file → None (записано) или текст ошибки.
+    """
+    images = [(Path(e.file), e) for e in entities if Path(e.file).suffix.lower() in IMAGE_EXT]
+    results = {str(path): error for path, error in get_writer().write_many(images).items()}
+    for entity in entities:
+        if str(Path(entity.file)) in results:
+            continue
+        try:
+            _write_xmp(Path(entity.file), entity)
+            results[str(Path(entity.file))] = None
+        except Exception as e:
+            results[str(Path(entity.file))] = str(e)
+
+    written = sum(error is None for error in results.values())
+    print(f"✅ Метаданные записаны: {written}/{len(results)}")
+    for file, error in results.items():
+        if error is not None:
+            print(f"❌ Ошибка записи метаданных в {Path(file).name}: {error}")
+    return results
+
 
 def write_image_metadata(path: Path, meta: MetadataEntity):
     """
     Записываем title/description/keywords внутрь изображения (JPG/PNG).
     Используем exiftool, поэтому он должен быть установлен в системе.
     """
-    try:
-        subprocess.run([
-            "exiftool",
-            f"-Title={meta.title}",
-            f"-Description={meta.description}",
-            f"-Keywords={','.join(meta.keywords)}",
-            "-overwrite_original",
-            str(path)
-        ], check=True)
+    error = get_writer().write_many([(path, meta)])[path]
+    if error is None:
         print(f"✅ Метаданные записаны в {path.name}")
-    except Exception as e:
-        print(f"❌ Ошибка записи метаданных в {path.name}: {e}")
+    else:
+        print(f"❌ Ошибка записи метаданных в {path.name}: {error}")
 
 
-def write_video_metadata(path: Path, meta: MetadataEntity):
-    """
-    Для видео создаём .xmp рядом (Shutterstock, Adobe читают такие файлы).
-    """
+def _write_xmp(path: Path, meta: MetadataEntity) -> Path:
     xmp_path = path.with_suffix(".xmp")
-    try:
-        with open(xmp_path, "w", encoding="utf-8") as f:
-            f.write(f"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
+    with open(xmp_path, "w", encoding="utf-8") as f:
+        f.write(f"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
   <rdf:Description xmlns:dc="http://purl.org/dc/elements/1.1/">
    <dc:title><rdf:Alt><rdf:li xml:lang="x-default">{meta.title}</rdf:li></rdf:Alt></dc:title>
@@ -38,6 +210,16 @@ def write_video_metadata(path: Path, meta: MetadataEntity):
   </rdf:Description>
  </rdf:RDF>
 </x:xmpmeta>""")
+    return xmp_path
+
+
+def write_video_metadata(path: Path, meta: MetadataEntity):
+    """
+    Для видео создаём .xmp рядом (Shutterstock, Adobe читают такие файлы).
+    """
+    xmp_path = path.with_suffix(".xmp")
+    try:
+        _write_xmp(path, meta)
         print(f"✅ XMP сохранён для {path.name}")
     except Exception as e:
         print(f"❌ Ошибка записи XMP для {path.name}: {e}")
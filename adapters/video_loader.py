@@ -0,0 +1,127 @@
+"""
+Кадры видео прямо в память: один ffprobe на ролик и один ffmpeg на все нужные кадры.
+Каждый момент берётся своим входом с -ss перед -i (быстрый seek к ближайшему
+ключевому кадру и точный добор до нужного), кадры масштабируются в ffmpeg до
+разрешения потребителя и пишутся rawvideo rgb24 — по выходу на момент, так что
+момент без кадра (за концом ролика, битый участок) не сдвигает соседние;
+без JPEG и повторного декодирования.
+"""
+import json
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+
+class VideoDecodeError(RuntimeError):
+    """ffprobe/ffmpeg не смогли прочитать ролик."""
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    duration: float
+    width: int       # после поворота (как ffmpeg отдаёт кадры)
+    height: int
+    fps: float = 0.0
+    codec: str = ""
+    rotation: int = 0
+
+
+def probe(path: str | Path) -> VideoInfo:
+    """Длительность, размер кадра, fps, кодек и поворот одним вызовом ffprobe (JSON)."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries",
+            "format=duration:stream=width,height,codec_name,avg_frame_rate,r_frame_rate"
+            ":stream_tags=rotate:stream_side_data=rotation",
+            "-of", "json",
+            str(path),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise VideoDecodeError(f"ffprobe {Path(path).name}: {result.stderr.strip()}")
+    data = json.loads(result.stdout or "{}")
+    streams = data.get("streams") or []
+    if not streams:
+        raise VideoDecodeError(f"{Path(path).name}: нет видеопотока")
+    stream = streams[0]
+    width, height = int(stream["width"]), int(stream["height"])
+    rotation = stream.get("tags", {}).get("rotate", 0)
+    for side_data in stream.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    rotation = int(float(rotation)) % 360
+    if rotation % 180 == 90:
+        width, height = height, width
+    return VideoInfo(
+        duration=float(data.get("format", {}).get("duration") or 0.0),
+        width=width,
+        height=height,
+        fps=_rate(stream.get("avg_frame_rate")) or _rate(stream.get("r_frame_rate")),
+        codec=stream.get("codec_name", ""),
+        rotation=rotation,
+    )
+
+
+def _rate(value: str | None) -> float:
+    """'30000/1001' → 29.97; '0/0' и пустое → 0."""
+    num, _, den = (value or "0/0").partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def frame_size(info: VideoInfo, side: int, cover: bool = False) -> tuple[int, int]:
+    """
+    Размер кадра на выходе (чётные стороны — требование большинства фильтров).
+    cover=False — длинная сторона ≤ side; cover=True — короткая сторона = side.
+    """
+    w, h = info.width, info.height
+    scale = min(1.0, side / (min(w, h) if cover else max(w, h)))
+    return max(2, round(w * scale / 2) * 2), max(2, round(h * scale / 2) * 2)
+
+
+def spaced_timestamps(duration: float, count: int) -> list[float]:
+    """count моментов, равномерно внутри ролика (без самого начала и конца)."""
+    return [duration * i / (count + 1) for i in range(1, count + 1)]
+
+
+def read_frames(path: str | Path, timestamps: list[float], side: int, cover: bool = False,
+                info: VideoInfo | None = None) -> list[Image.Image | None]:
+    """
+    Кадры в моменты timestamps (сек) как RGB-картинки размера frame_size(info, side, cover).
+    Результат выровнен с timestamps: если в момент кадра нет (ролик короче,
+    чем ожидалось), на его месте None.
+    """
+    if not timestamps:
+        return []
+    info = info or probe(path)
+    width, height = frame_size(info, side, cover)
+    cmd = ["ffmpeg", "-v", "error", "-nostdin", "-y"]
+    for ts in timestamps:
+        cmd += ["-ss", f"{max(0.0, ts):.3f}", "-i", str(path)]
+    cmd += ["-filter_complex", ";".join(
+        f"[{i}:v:0]trim=end_frame=1,scale={width}:{height}:flags=area,setsar=1,format=rgb24[f{i}]"
+        for i in range(len(timestamps))
+    )]
+    frame_bytes = width * height * 3
+    with tempfile.TemporaryDirectory(prefix="frames-") as tmp:
+        outputs = [Path(tmp) / f"{i}.rgb" for i in range(len(timestamps))]
+        for i, output in enumerate(outputs):
+            cmd += ["-map", f"[f{i}]", "-f", "rawvideo", "-pix_fmt", "rgb24", str(output)]
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        frames = []
+        for output in outputs:
+            data = output.read_bytes() if output.exists() else b""
+            frames.append(Image.frombytes("RGB", (width, height), data[:frame_bytes])
+                          if len(data) >= frame_bytes else None)
+    if result.returncode != 0 and not any(frame is not None for frame in frames):
+        raise VideoDecodeError(f"ffmpeg {Path(path).name}: {result.stderr.decode(errors='replace').strip()}")
+    return frames
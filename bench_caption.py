@@ -0,0 +1,74 @@
+"""
+Замер пропускной способности BLIP (картинок в минуту) для разных batch_size.
+
+batch_size меряется мимо caption-кэша (иначе со второго прогона меряются
+попадания в SQLite, а не BLIP); отдельно — холодный и тёплый кэш
+generate_captions на временной базе.
+
+Запуск:
+    python bench_caption.py input/ 1 4 8 16
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import services.caption_service as caption_service
+from services.caption_cache import CaptionCache
+from services.caption_service import DEFAULT_BATCH_SIZE, _caption_batch, generate_captions
+
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def bench_batch_sizes(paths: list[str], batch_sizes: list[int]) -> dict[int, float]:
+    """Возвращает {batch_size: картинок в минуту}; кэш не участвует."""
+    # прогрев: первый generate тянет ленивую инициализацию torch
+    _caption_batch(paths[:1])
+
+    results = {}
+    for bs in batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(paths), bs):
+            _caption_batch(paths[i:i + bs])
+        elapsed = time.perf_counter() - start
+        results[bs] = len(paths) * 60 / elapsed
+        print(f"batch_size={bs:<3} {elapsed:8.2f} sec  {results[bs]:8.1f} img/min")
+    return results
+
+
+def bench_cache(paths: list[str], batch_size: int = DEFAULT_BATCH_SIZE) -> dict[str, float]:
+    """generate_captions на пустом временном кэше (cold), затем повторно (warm): {режим: картинок в минуту}"""
+    paths = list(dict.fromkeys(paths))  # повторы внутри прогона сделали бы холодный кэш тёплым
+    saved = caption_service.caption_cache
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        caption_service.caption_cache = CaptionCache(Path(tmp) / "captions.db")
+        try:
+            for mode in ("cold", "warm"):
+                start = time.perf_counter()
+                generate_captions(paths, batch_size=batch_size)
+                elapsed = time.perf_counter() - start
+                results[mode] = len(paths) * 60 / elapsed
+                print(f"cache={mode:<5} {elapsed:8.2f} sec  {results[mode]:8.1f} img/min")
+        finally:
+            caption_service.caption_cache.conn.close()
+            caption_service.caption_cache = saved
+    return results
+
+
+if __name__ == "__main__":
+    folder = Path(sys.argv[1] if len(sys.argv) > 1 else "input")
+    sizes = [int(x) for x in sys.argv[2:]] or [1, 4, 8, 16]
+    images = sorted(str(p) for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXT)
+    if not images:
+        print(f"⚠️ В {folder} нет картинок")
+        sys.exit(1)
+
+    # для честного сравнения прогоняем одинаковое число картинок: две самые большие пачки
+    total = max(sizes) * 2
+    batch_images = (images * (total // len(images) + 1))[:total]
+    print(f"🖼️ {len(batch_images)} картинок из {folder}\n")
+    bench_batch_sizes(batch_images, sizes)
+
+    print(f"\n🗄️ caption-кэш, {len(images[:total])} разных картинок, batch_size={DEFAULT_BATCH_SIZE}\n")
+    bench_cache(images[:total])
@@ -0,0 +1,50 @@
+"""
+Сравнение полного декодирования с adapters.image_loader на больших файлах:
+время и прирост RSS на одну картинку.
+
+Запуск:
+    python bench_image_decode.py input/
+"""
+import sys
+import time
+from pathlib import Path
+
+import psutil
+from PIL import Image
+
+from adapters.image_loader import MODEL_SIZE, OCR_SIZE, THUMB_SIZE, load_image
+
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def measure(fn, path: Path) -> tuple[float, float]:
+    """(секунды, МБ прироста RSS) для одного декодирования"""
+    proc = psutil.Process()
+    rss_before = proc.memory_info().rss
+    start = time.perf_counter()
+    image = fn(path)
+    elapsed = time.perf_counter() - start
+    rss_delta = (proc.memory_info().rss - rss_before) / 2**20
+    del image
+    return elapsed, rss_delta
+
+
+if __name__ == "__main__":
+    folder = Path(sys.argv[1] if len(sys.argv) > 1 else "input")
+    images = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXT)
+    if not images:
+        print(f"⚠️ В {folder} нет картинок")
+        sys.exit(1)
+
+    variants = {
+        "full": lambda p: Image.open(p).convert("RGB"),
+        "model": lambda p: load_image(p, MODEL_SIZE, cover=True),
+        "ocr": lambda p: load_image(p, OCR_SIZE),
+        "thumb": lambda p: load_image(p, THUMB_SIZE),
+    }
+    for path in images:
+        with Image.open(path) as im:
+            print(f"\n🖼️ {path.name} {im.width}×{im.height}")
+        for name, fn in variants.items():
+            elapsed, rss = measure(fn, path)
+            print(f"  {name:<6} {elapsed * 1000:8.1f} ms  {rss:8.1f} MB RSS")
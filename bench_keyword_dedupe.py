@@ -0,0 +1,69 @@
+"""
+Сравнение отбора почти-дублей ключей: прежний O(n²) цикл difflib
+против services.keyword_dedupe на 100 / 1 000 / 10 000 кандидатов.
+Кандидаты — ключи-заглушки Ollama и их опечатки/вариации плюс случайные слова,
+результаты обеих реализаций сверяются поэлементно.
+
+Запуск:
+    python bench_keyword_dedupe.py            # 100, 1000, 10000
+    python bench_keyword_dedupe.py 100 1000   # без долгого эталона на 10k
+"""
+import random
+import string
+import sys
+import time
+
+from services.keyword_dedupe import KeywordDeduper, dedupe_keywords_difflib
+from services.ollama_stub import STUB_KEYWORDS
+from services.priority_synonyms import priority_synonyms
+
+
+def make_candidates(n: int, seed: int = 42) -> list[str]:
+    rng = random.Random(seed)
+    base = list(dict.fromkeys(STUB_KEYWORDS + [w for syns in priority_synonyms.values() for w in syns]))
+
+    def variant(word: str) -> str:
+        chars = list(word)
+        for _ in range(rng.randint(0, 2)):
+            i = rng.randrange(len(chars))
+            op = rng.random()
+            if op < 0.4:
+                chars.insert(i, rng.choice(string.ascii_lowercase))
+            elif op < 0.7 and len(chars) > 3:
+                chars.pop(i)
+            else:
+                chars[i] = rng.choice(string.ascii_lowercase)
+        return "".join(chars)
+
+    def random_word() -> str:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+                 for _ in range(rng.choice((1, 1, 2)))]
+        return " ".join(words)
+
+    return [variant(rng.choice(base)) if rng.random() < 0.6 else random_word() for _ in range(n)]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000]
+    for n in sizes:
+        candidates = make_candidates(n)
+        expected, t_difflib = timed(dedupe_keywords_difflib, candidates)
+
+        deduper = KeywordDeduper()
+        start = time.perf_counter()
+        for keyword in candidates:
+            deduper.add(keyword)
+        t_engine = time.perf_counter() - start
+
+        same = deduper.accepted == expected
+        print(f"\n🔑 {n} кандидатов → {len(expected)} уникальных")
+        print(f"  difflib O(n²)  {t_difflib * 1000:10.1f} ms")
+        print(f"  keyword_dedupe {t_engine * 1000:10.1f} ms  "
+              f"(полных сравнений: {deduper.full_compares}, ×{t_difflib / max(t_engine, 1e-9):.0f})")
+        print(f"  {'✅ решения совпадают' if same else '❌ решения расходятся'}")
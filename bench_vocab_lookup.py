@@ -0,0 +1,151 @@
+"""
+Поиск по словарю Getty: прежний GettyVocab.lookup (два запроса на термин,
+без индексов) против lookup_many на базе размером с AAT.
+База собирается из синтетического N-Triples дампа через vocab_loader:
+по умолчанию 70 000 концептов и ~4 altLabel на каждый (как английская часть AAT).
+Запросы — списки по 49 ключей: треть preferred, треть alt, треть промахи.
+Отдельно — search (опечатки, плюрали, фразы) и suggest (префиксы) в мс на запрос.
+
+Запуск:
+    python bench_vocab_lookup.py                 # 70 000 концептов
+    python bench_vocab_lookup.py 20000 --threads 4
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from vocab.vocab_loader import LOOKUP_INDEXES, SKOS, load_rdf_to_db
+from vocab.vocab_lookup import GettyVocab
+
+SYLLABLES = [c + v for c in "bdfgklmnprstvz" for v in ("a", "e", "i", "o", "u", "ar", "en", "ol")]
+
+
+def make_word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_dump(path: Path, concepts: int, seed: int = 7) -> tuple[list[str], list[str]]:
+    rng = random.Random(seed)
+    prefs, alts = [], []
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(concepts):
+            uri = f"http://vocab.getty.edu/aat/{300000000 + i}"
+            pref = f"{make_word(rng)} {make_word(rng)}" if rng.random() < 0.4 else make_word(rng)
+            prefs.append(pref)
+            f.write(f'<{uri}> <{SKOS}prefLabel> "{pref}"@en .\n')
+            f.write(f'<{uri}> <{SKOS}prefLabel> "{pref}e"@de .\n')
+            for _ in range(rng.randint(2, 6)):
+                alt = make_word(rng) + rng.choice([""] * 12 + ["s", " art", " style"])
+                alts.append(alt)
+                f.write(f'<{uri}> <{SKOS}altLabel> "{alt}"@en .\n')
+    return prefs, alts
+
+
+def make_typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice("aeioubkmt") + word[i + 1:]
+
+
+def old_lookup(conn: sqlite3.Connection, term: str):
+    """GettyVocab.lookup до lookup_many: два запроса на термин."""
+    cur = conn.cursor()
+    cur.execute("SELECT preferred_label, uri FROM vocab_entry WHERE term = ? COLLATE NOCASE", (term,))
+    row = cur.fetchone()
+    if row:
+        return {"preferred": row[0], "uri": row[1]}
+    cur.execute("""
+        SELECT v.preferred_label, v.uri FROM vocab_entry v JOIN alt_label a ON a.entry_id = v.id
+         WHERE a.alt = ? COLLATE NOCASE
+    """, (term,))
+    row = cur.fetchone()
+    return {"preferred": row[0], "uri": row[1]} if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("concepts", type=int, nargs="?", default=70_000)
+    parser.add_argument("--lists", type=int, default=200, help="списков ключей на замер")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dump, db = Path(tmp) / "aat.nt", Path(tmp) / "vocab.db"
+        prefs, alts = make_dump(dump, args.concepts)
+        load_rdf_to_db(str(dump), "AAT", db)
+
+        rng = random.Random(1)
+        lists = [
+            [rng.choice(prefs) for _ in range(16)] + [rng.choice(alts) for _ in range(16)]
+            + [make_word(rng) + "xq" for _ in range(17)]
+            for _ in range(args.lists)
+        ]
+        total = sum(len(terms) for terms in lists)
+
+        # прежний путь: базы без индексов поиска
+        conn = sqlite3.connect(db)
+        for name in LOOKUP_INDEXES:
+            conn.execute(f"DROP INDEX {name}")
+        sample = lists[:max(1, args.lists // 20)]
+        t = time.perf_counter()
+        expected = [[old_lookup(conn, term) for term in terms] for terms in sample]
+        old_rate = sum(len(terms) for terms in sample) / (time.perf_counter() - t)
+        conn.close()
+
+        vocab = GettyVocab(str(db), cache_size=0)  # индексы восстанавливает сам
+        got = [list(vocab.lookup_many(terms).values()) for terms in sample]
+        mismatches = sum(a != b for exp, res in zip(expected, got) for a, b in zip(exp, res))
+
+        t = time.perf_counter()
+        for terms in lists:
+            vocab.lookup_many(terms)
+        cold_rate = total / (time.perf_counter() - t)
+
+        cached = GettyVocab(str(db), cache_size=total)
+        for terms in lists:
+            cached.lookup_many(terms)
+        t = time.perf_counter()
+        for terms in lists:
+            cached.lookup_many(terms)
+        warm_rate = total / (time.perf_counter() - t)
+
+        def worker(part):
+            for terms in part:
+                vocab.lookup_many(terms)
+            vocab.close()
+
+        threads = [threading.Thread(target=worker, args=(lists[i::args.threads],)) for i in range(args.threads)]
+        t = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        threaded_rate = total / (time.perf_counter() - t)
+
+        fuzzy = [make_typo(rng.choice(prefs), rng) for _ in range(200)]
+        fuzzy += [rng.choice(alts) + "s" for _ in range(100)] + [f"{rng.choice(prefs)} photo" for _ in range(100)]
+        t = time.perf_counter()
+        found = sum(bool(vocab.search(q, limit=5)) for q in fuzzy)
+        search_ms = (time.perf_counter() - t) * 1000 / len(fuzzy)
+
+        prefixes = [rng.choice(prefs)[:rng.randint(2, 6)] for _ in range(400)]
+        t = time.perf_counter()
+        for prefix in prefixes:
+            vocab.suggest(prefix)
+        suggest_ms = (time.perf_counter() - t) * 1000 / len(prefixes)
+
+        print(f"концептов: {args.concepts}, altLabel: {len(alts)}, списков по 49: {args.lists}")
+        print(f"  прежний lookup, без индексов : {old_rate:12,.0f} терминов/с")
+        print(f"  lookup_many, без LRU         : {cold_rate:12,.0f} терминов/с")
+        print(f"  lookup_many, LRU прогрет     : {warm_rate:12,.0f} терминов/с")
+        print(f"  lookup_many, {args.threads} потока, без LRU : {threaded_rate:12,.0f} терминов/с")
+        print(f"  расхождений с прежним lookup: {mismatches}")
+        print(f"  search (опечатки/плюрали/фразы): {search_ms:.2f} мс на запрос, найдено {found}/{len(fuzzy)}")
+        print(f"  suggest (префикс 2–6 символов) : {suggest_ms:.2f} мс на запрос")
+
+
+if __name__ == "__main__":
+    main()
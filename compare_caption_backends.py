@@ -0,0 +1,59 @@
+"""
+Сравнение бэкендов caption: PyTorch (float32) против ONNX Runtime (int8).
+Печатает задержку на картинку (по одной и пачкой caption.batch_size) и согласие
+captions между бэкендами.
+
+Запуск:
+    python compare_caption_backends.py input/
+"""
+import sys
+import time
+from pathlib import Path
+
+from adapters.image_loader import MODEL_SIZE, load_image
+from services.caption_service import DEFAULT_BATCH_SIZE, _blip_batch
+
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def token_jaccard(a: str, b: str) -> float:
+    ta, tb = set(a.lower().split()), set(b.lower().split())
+    return len(ta & tb) / len(ta | tb) if ta | tb else 1.0
+
+
+def run_backend(backend: str, images: list, batch_size: int = 1) -> tuple[list[str], float]:
+    """(captions, секунд на картинку) при пачках по batch_size; первый прогон — прогрев модели"""
+    _blip_batch(images[:1], backend=backend)
+    start = time.perf_counter()
+    captions = []
+    for i in range(0, len(images), batch_size):
+        captions.extend(_blip_batch(images[i:i + batch_size], backend=backend))
+    return captions, (time.perf_counter() - start) / len(images)
+
+
+if __name__ == "__main__":
+    folder = Path(sys.argv[1] if len(sys.argv) > 1 else "input")
+    paths = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXT)
+    if not paths:
+        print(f"⚠️ В {folder} нет картинок")
+        sys.exit(1)
+    images = [load_image(p, MODEL_SIZE, cover=True) for p in paths]
+
+    torch_caps, torch_latency = run_backend("torch", images)
+    onnx_caps, onnx_latency = run_backend("onnx", images)
+    _, torch_batch_latency = run_backend("torch", images, DEFAULT_BATCH_SIZE)
+    _, onnx_batch_latency = run_backend("onnx", images, DEFAULT_BATCH_SIZE)
+
+    for path, a, b in zip(paths, torch_caps, onnx_caps):
+        mark = "=" if a == b else "≠"
+        print(f"{mark} {path.name}\n    torch: {a}\n    onnx:  {b}")
+
+    exact = sum(a == b for a, b in zip(torch_caps, onnx_caps)) / len(paths)
+    jaccard = sum(token_jaccard(a, b) for a, b in zip(torch_caps, onnx_caps)) / len(paths)
+    print("\n========================================")
+    print(f"torch: {torch_latency * 1000:8.0f} ms/картинка")
+    print(f"onnx:  {onnx_latency * 1000:8.0f} ms/картинка  (x{torch_latency / onnx_latency:.1f})")
+    print(f"пачкой по {DEFAULT_BATCH_SIZE}:")
+    print(f"torch: {torch_batch_latency * 1000:8.0f} ms/картинка")
+    print(f"onnx:  {onnx_batch_latency * 1000:8.0f} ms/картинка  (x{torch_batch_latency / onnx_batch_latency:.1f})")
+    print(f"совпадение captions: {exact:.0%}, пересечение слов (Jaccard): {jaccard:.2f}")
@@ -20,3 +20,13 @@ ADOBE_CATEGORIES = {
     "Business": ["office", "corporate", "meeting"],
     "Technology": ["computer", "device", "innovation"],
 }
+
+# Категории по стокам (ключ — имя стока в экспортёрах).
+# Термин — строка (вес 1.0) или (термин, вес), если он говорит о категории слабее.
+# iStock и Pond5 пока без своих списков — берут категории Shutterstock.
+STOCK_CATEGORIES = {
+    "shutterstock": SHUTTERSTOCK_CATEGORIES,
+    "adobe": ADOBE_CATEGORIES,
+    "istock": SHUTTERSTOCK_CATEGORIES,
+    "pond5": SHUTTERSTOCK_CATEGORIES,
+}
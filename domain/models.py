@@ -7,8 +7,11 @@ class MetadataEntity:
     title: str
     description: str
     keywords: List[str]
-    disambiguations: Dict[str, str]
+    disambiguations: Dict[str, Dict[str, str]]  # keyword → {"preferred", "uri"} из словаря Getty
     category: Optional[str] = None
     secondary_category: Optional[str] = None
+    # сток → {"category", "secondary_category"}; category/secondary_category выше — для Shutterstock
+    categories: Optional[Dict[str, Dict[str, Optional[str]]]] = None
     flags: Optional[Dict[str, bool]] = None
     captions: Optional[List[str]] = None
+    series_id: Optional[str] = None
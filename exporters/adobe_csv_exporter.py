@@ -1,6 +1,8 @@
 import csv
 from typing import List
 
+from .base import stock_category
+
 def export_csv_for_adobe(results: List[dict], path: str):
     """
     Экспорт для Adobe Stock.
@@ -12,9 +14,10 @@ def export_csv_for_adobe(results: List[dict], path: str):
 
         for r in results:
             keywords_str = ", ".join(r["keywords"])
+            category, _ = stock_category(r, "adobe")
             flags_str = ";".join([f"{k}:{int(v)}" for k, v in r.get("flags", {}).items()])
 
             writer.writerow([
                 r["file"].split("/")[-1], r["title"], r["description"],
-                keywords_str, r.get("category") or "", flags_str, r.get("series_id", "")
+                keywords_str, category, flags_str, r.get("series_id", "")
             ])
@@ -3,4 +3,16 @@ from typing import List, Protocol
 class BaseExporter(Protocol):
     def export(self, results: List[dict], path: str) -> None:
         """Экспортирует results в нужный формат"""
-        ...
\ No newline at end of file
+        ...
+
+
+def stock_category(r: dict, stock: str) -> tuple[str, str]:
+    """
+    (category, secondary_category) записи для стока: из r["categories"], посчитанных
+    один раз на файл (services.category_service), иначе — общие поля записи.
+    """
+    own = (r.get("categories") or {}).get(stock) or {}
+    return (
+        own.get("category") or r.get("category") or "",
+        own.get("secondary_category") or r.get("secondary_category") or "",
+    )
@@ -1,6 +1,8 @@
 import csv
 from typing import List
 
+from .base import stock_category
+
 def export_csv_for_istock(results: List[dict], path: str):
     """
     Экспорт для iStock (DeepMeta).
@@ -21,12 +23,14 @@ def export_csv_for_istock(results: List[dict], path: str):
 
             filename = r["file"].split("/")[-1]
             keywords_str = ", ".join(r["keywords"])
-            disambig_str = "; ".join([f"{k}:{v}" for k, v in r.get("disambigs", {}).items()])
+            category, secondary_category = stock_category(r, "istock")
+            disambigs = r.get("disambiguations") or r.get("disambigs") or {}
+            disambig_str = "; ".join([f"{k}:{v['uri'] if isinstance(v, dict) else v}" for k, v in disambigs.items()])
             flags_str = ";".join([f"{k}:{int(v)}" for k, v in r.get("flags", {}).items()])
 
             writer.writerow([
                 filename, "", r["title"], r["description"], "", "", keywords_str,
                 "00:00:01" if r.get("type") == "video" else "",
-                disambig_str, r.get("category") or "", r.get("secondary_category") or "", flags_str,
+                disambig_str, category, secondary_category, flags_str,
                 r.get("series_id", "")
             ])
@@ -1,6 +1,8 @@
 import csv
 from typing import List
 
+from .base import stock_category
+
 def export_csv_for_pond5(results: List[dict], path: str):
     """
     Экспорт для Pond5.
@@ -15,8 +17,9 @@ def export_csv_for_pond5(results: List[dict], path: str):
 
         for r in results:
             keywords_str = ", ".join(r["keywords"])
+            category, secondary_category = stock_category(r, "pond5")
             writer.writerow([
                 r["file"].split("/")[-1], r["title"], r["description"],
-                keywords_str, r.get("category") or "", r.get("secondary_category") or "",
+                keywords_str, category, secondary_category,
                 "", "", "", r.get("series_id", "")
             ])
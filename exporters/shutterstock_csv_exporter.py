@@ -1,6 +1,8 @@
 import csv
 from typing import List
 
+from .base import stock_category
+
 def export_csv_for_shutterstock(results: List[dict], path: str):
     """
     Экспорт для Shutterstock.
@@ -16,7 +18,8 @@ def export_csv_for_shutterstock(results: List[dict], path: str):
                 continue
 
             keywords_str = ", ".join(r["keywords"])
+            category, _ = stock_category(r, "shutterstock")
             writer.writerow([
                 r["file"].split("/")[-1], r["title"], r["description"],
-                keywords_str, r.get("category") or "", r.get("series_id", "")
+                keywords_str, category, r.get("series_id", "")
             ])
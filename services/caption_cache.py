@@ -0,0 +1,160 @@
+"""
+Дисковый кэш captions (SQLite), адресуемый по содержимому файла.
+Ключ = sha256 байтов файла + отпечаток модели/параметров generate/настроек OCR,
+поэтому повторный прогон папки не гоняет BLIP, пока не поменялись файл или модель.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from adapters.config_loader import get_config
+
+CHUNK_SIZE = 1 << 20
+
+
+def fingerprint(params: dict) -> str:
+    """Стабильный хэш настроек (модель, generate, OCR), входящих в ключ кэша."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class CaptionCache:
+    """SQLite-кэш с LRU-вытеснением по числу записей и суммарному размеру."""
+
+    def __init__(self, path: str | Path, max_entries: int = 100_000, max_bytes: int = 64 * 2**20):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS caption (
+            key TEXT PRIMARY KEY,
+            caption TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS caption_last_access ON caption(last_access);
+        -- число записей и суммарный размер держат триггеры: put() не пересчитывает всю таблицу
+        CREATE TABLE IF NOT EXISTS caption_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            entries INTEGER NOT NULL,
+            bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO caption_totals(id, entries, bytes)
+            SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM caption;
+        CREATE TRIGGER IF NOT EXISTS caption_totals_insert AFTER INSERT ON caption BEGIN
+            UPDATE caption_totals SET entries = entries + 1, bytes = bytes + new.size WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS caption_totals_delete AFTER DELETE ON caption BEGIN
+            UPDATE caption_totals SET entries = entries - 1, bytes = bytes - old.size WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS caption_totals_update AFTER UPDATE OF size ON caption BEGIN
+            UPDATE caption_totals SET bytes = bytes + new.size - old.size WHERE id = 1;
+        END;
+        CREATE TABLE IF NOT EXISTS file_hash (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL
+        );
+        """)
+        self.conn.commit()
+
+    def file_hash(self, path: str | Path) -> str:
+        """
+        sha256 содержимого файла. Хэш запоминается по path+size+mtime,
+        чтобы не перечитывать неизменённые файлы при каждом прогоне.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT sha256 FROM file_hash WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if row:
+            return row[0]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_hash(path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, sha)
+            )
+            self.conn.commit()
+        return sha
+
+    def key(self, path: str | Path, params_fingerprint: str) -> str:
+        return f"{self.file_hash(path)}:{params_fingerprint}"
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self.conn.execute("SELECT caption FROM caption WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE caption SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key: str, caption: str):
+        size = len(key) + len(caption.encode("utf-8"))
+        with self._lock:
+            # upsert, а не INSERT OR REPLACE: при REPLACE триггеры удаления не срабатывают
+            self.conn.execute(
+                "INSERT INTO caption(key, caption, size, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET caption = excluded.caption, size = excluded.size, "
+                "last_access = excluded.last_access",
+                (key, caption, size, time.time())
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Выкидываем самые давно использованные записи сверх лимитов (скан — только при превышении)."""
+        count, total = self.conn.execute("SELECT entries, bytes FROM caption_totals WHERE id = 1").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        excess_rows = max(0, count - self.max_entries)
+        excess_bytes = max(0, total - self.max_bytes)
+        victims = []
+        freed = 0
+        for key, size in self.conn.execute("SELECT key, size FROM caption ORDER BY last_access"):
+            if len(victims) >= excess_rows and freed >= excess_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM caption WHERE key = ?", victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self.conn.execute("SELECT entries, bytes FROM caption_totals WHERE id = 1").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+
+_config = get_config()
+caption_cache = CaptionCache(
+    _config.caption_cache_path,
+    max_entries=_config.caption_cache_max_entries,
+    max_bytes=_config.caption_cache_max_bytes,
+) if _config.caption_cache_enabled else None
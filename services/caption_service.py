@@ -1,40 +1,209 @@
-from transformers import BlipProcessor, BlipForConditionalGeneration
+import difflib
+
 from PIL import Image
-import torch
-import pytesseract
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+from adapters.config_loader import get_config
+from adapters.image_loader import MODEL_SIZE, OCR_SIZE, fit, load_image
+from services.caption_cache import caption_cache, fingerprint
+from services.model_registry import registry
+from services.ocr_service import submit_ocr
+from services.onnx_caption import load_onnx_captioner
+
+BLIP_MODEL = "Salesforce/blip-image-captioning-base"
+_config = get_config()
+DEFAULT_BATCH_SIZE = _config.caption_batch_size
+BACKEND = _config.caption_backend
+
+GENERATION_PARAMS = {
+    "max_length": _config.caption_max_length,
+    "min_length": _config.caption_min_length,
+    "num_beams": _config.caption_num_beams if _config.caption_decoding == "beam" else 1,
+    "length_penalty": 1.0,
+}
+
+
+def cache_fingerprint() -> str:
+    """Всё, от чего зависит текст caption: модель, параметры generate и OCR."""
+    config = get_config()
+    return fingerprint({
+        "model": BLIP_MODEL,
+        "backend": BACKEND,
+        "quantize": config.caption_onnx_quantize if BACKEND == "onnx" else None,
+        "generate": GENERATION_PARAMS,
+        "ocr": {
+            "enabled": config.ocr_enabled,
+            "config": config.ocr_tesseract_config,
+            "precheck": config.ocr_precheck_enabled,
+            "precheck_size": config.ocr_precheck_size,
+            "edge_threshold": config.ocr_precheck_edge_threshold,
+            "min_density": config.ocr_precheck_min_density,
+        },
+    })
+
+
+def _load_blip():
+    """BLIP для описаний: грузится реестром при первом caption, а не при импорте."""
+    import torch
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL)
+    model = BlipForConditionalGeneration.from_pretrained(
+        BLIP_MODEL,
+        torch_dtype=torch.float16 if device == "cuda" else torch.float32
+    ).to(device)
+    model.eval()
+    return processor, model, device
+
+
+def _unload_blip(blip):
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+registry.register("blip", _load_blip, _unload_blip)
+registry.register("blip-onnx", lambda: load_onnx_captioner(BLIP_MODEL))
+
+
+def _torch_batch(images: list[Image.Image]) -> list[str]:
+    """Один проход processor + generate для всей пачки картинок (PyTorch)."""
+    import torch
+
+    with registry.use("blip") as (processor, model, device):
+        inputs = processor(images=images, return_tensors="pt").to(device)
+        with torch.no_grad():
+            output_ids = model.generate(**inputs, **GENERATION_PARAMS)
+        return processor.batch_decode(output_ids, skip_special_tokens=True)
+
+
+def _onnx_batch(images: list[Image.Image]) -> list[str]:
+    """То же через ONNX Runtime (int8) — для машин без GPU."""
+    with registry.use("blip-onnx") as captioner:
+        return captioner.generate(images, **GENERATION_PARAMS)
+
+
+def _blip_batch(images: list[Image.Image], backend: str | None = None) -> list[str]:
+    """Caption пачки картинок бэкендом из config.yaml (caption.backend)."""
+    if (backend or BACKEND) == "onnx":
+        return _onnx_batch(images)
+    return _torch_batch(images)
+
+
+def decode_side() -> tuple[int, bool]:
+    """Разрешение, в котором нужен вход caption: под OCR, если он включён, иначе под BLIP (cover)."""
+    return (OCR_SIZE, False) if get_config().ocr_enabled else (MODEL_SIZE, True)
+
 
-# BLIP для описаний
-processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained(
-    "Salesforce/blip-image-captioning-base",
-    torch_dtype=torch.float16 if device == "cuda" else torch.float32
-).to(device)
+def _caption_batch(image_paths: list[str]) -> list[str]:
+    """OCR в пуле + BLIP одной пачкой, без кэша."""
+    # один раз декодируем в разрешении OCR, для BLIP уменьшаем уже в памяти
+    side, cover = decode_side()
+    return _caption_images([load_image(p, side, cover=cover) for p in image_paths])
+
+
+def _caption_images(ocr_images: list[Image.Image]) -> list[str]:
+    """То же для уже декодированных картинок в разрешении decode_side()."""
+    if get_config().ocr_enabled:
+        images = [fit(image, MODEL_SIZE, cover=True) for image in ocr_images]
+    else:
+        images = ocr_images
+
+    # 1. OCR уходит в пул и идёт параллельно с BLIP
+    ocr_futures = [submit_ocr(image) for image in ocr_images]
+
+    # 2. BLIP описание (вся пачка за один forward/beam-search)
+    blip_captions = _blip_batch(images)
+
+    # 3. Объединяем
+    captions = []
+    for future, caption in zip(ocr_futures, blip_captions):
+        ocr_text = future.result()
+        captions.append(f"{ocr_text}, {caption}" if ocr_text else caption)
+    return captions
+
+
+def generate_captions(image_paths: list[str], batch_size: int = DEFAULT_BATCH_SIZE) -> list[str]:
+    """
+    Создаём captions для списка картинок микро-пачками по batch_size.
+    Порядок результата совпадает с порядком image_paths.
+    Файлы, уже лежащие в кэше, в BLIP не попадают.
+    """
+    captions: list[str | None] = [None] * len(image_paths)
+    keys: list[str | None] = [None] * len(image_paths)
+    if caption_cache is not None:
+        params = cache_fingerprint()
+        for i, p in enumerate(image_paths):
+            keys[i] = caption_cache.key(p, params)
+            captions[i] = caption_cache.get(keys[i])
+
+    misses = [i for i, c in enumerate(captions) if c is None]
+    for start in range(0, len(misses), batch_size):
+        chunk = misses[start:start + batch_size]
+        for i, caption in zip(chunk, _caption_batch([image_paths[i] for i in chunk])):
+            captions[i] = caption
+            if caption_cache is not None:
+                caption_cache.put(keys[i], caption)
+    return captions
+
+
+def generate_captions_for_images(images: list[Image.Image], batch_size: int = DEFAULT_BATCH_SIZE) -> list[str]:
+    """
+    Captions для картинок, уже лежащих в памяти (ключевые кадры видео),
+    в разрешении decode_side(). Кэш здесь не участвует: для видео кэшируется
+    общий caption ролика (см. video_cache_key).
+    """
+    captions = []
+    for start in range(0, len(images), batch_size):
+        captions.extend(_caption_images(images[start:start + batch_size]))
+    return captions
+
+
+def video_cache_key(video_path: str) -> str | None:
+    """
+    Ключ кэша общего caption ролика (None — кэш выключен): содержимое файла +
+    настройки caption + настройки выбора ключевых кадров.
+    """
+    if caption_cache is None:
+        return None
+    config = get_config()
+    params = fingerprint({
+        "caption": cache_fingerprint(),
+        "keyframes": config.video_keyframes,
+        "samples": config.video_scene_samples,
+        "threshold": config.video_scene_threshold,
+    })
+    return caption_cache.key(video_path, params)
+
+
+def merge_captions(captions: list[str], similarity: float = 0.8) -> str:
+    """
+    Caption нескольких кадров → один: главный кадр первым, почти-повторы
+    (та же сцена, чуть другая формулировка BLIP) отбрасываются.
+    """
+    merged: list[str] = []
+    for caption in captions:
+        caption = caption.strip()
+        if caption and all(difflib.SequenceMatcher(None, caption.lower(), m.lower()).ratio() < similarity
+                           for m in merged):
+            merged.append(caption)
+    return "; ".join(merged)
+
+
+def cached_caption(key: str | None) -> str | None:
+    return caption_cache.get(key) if caption_cache is not None and key is not None else None
+
+
+def store_caption(key: str | None, caption: str):
+    if caption_cache is not None and key is not None:
+        caption_cache.put(key, caption)
 
 
 def generate_caption(image_path: str) -> str:
     """Создаём caption по картинке (общее описание + распознанный текст)."""
-    image = Image.open(image_path).convert("RGB")
-
-    # 1. BLIP описание
-    inputs = processor(image, return_tensors="pt").to(device)
-    with torch.no_grad():
-        output_ids = model.generate(
-            **inputs,
-            max_length=150,
-            min_length=20,
-            num_beams=5,
-            length_penalty=1.0
-        )
-    caption = processor.decode(output_ids[0], skip_special_tokens=True)
-
-    # 2. OCR (распознаём текст/цифры)
-    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-    custom_config = r'--oem 3 --psm 7 -l eng'
-    ocr_text = pytesseract.image_to_string(image, config=custom_config).strip()
+    return generate_captions([image_path], batch_size=1)[0]
 
-    # 3. Объединяем
-    if ocr_text:
-        return f"{ocr_text}, {caption}"
-    return caption
+
+def prewarm():
+    """Фоновая загрузка BLIP, чтобы первый файл не ждал модель."""
+    return registry.prewarm("blip-onnx" if BACKEND == "onnx" else "blip")
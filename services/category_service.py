@@ -1,10 +1,84 @@
-from domain.categories import SHUTTERSTOCK_CATEGORIES
+"""
+Категории по ключевым словам сразу для всех стоков.
+Из domain/categories.py один раз собирается обратный индекс
+«термин → [(сток, категория, вес)]», и список ключей проходится один раз:
+каждая категория набирает сумму весов совпавших терминов, умноженных на вес
+позиции ключа (ключи уже отсортированы политикой по релевантности).
+Итог на каждый сток — основная и запасная категория (secondary_category).
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from domain.categories import STOCK_CATEGORIES
+from services.keyword_policy import fold
+
+UNCATEGORIZED = "Uncategorized"
+
+
+@dataclass(frozen=True)
+class StockCategory:
+    primary: str = UNCATEGORIZED
+    secondary: str | None = None
+
+
+def _fold_phrase(text: str) -> str:
+    return " ".join(fold(t) for t in text.lower().split())
+
+
+@lru_cache(maxsize=1)
+def category_index() -> dict[str, list[tuple[str, str, float]]]:
+    """Термин (в единственном числе) → [(сток, категория, вес)]; собирается один раз."""
+    index: dict[str, list[tuple[str, str, float]]] = {}
+    for stock, categories in STOCK_CATEGORIES.items():
+        for category, terms in categories.items():
+            for term in terms:
+                term, weight = term if isinstance(term, tuple) else (term, 1.0)
+                index.setdefault(_fold_phrase(term), []).append((stock, category, weight))
+    return index
+
+
+def _position_weight(position: int) -> float:
+    # первые ключи (из caption) решают больше, хвост LLM — меньше
+    return 1.0 / (1.0 + position / 10)
+
+
+def classify(keywords: list[str]) -> dict[str, StockCategory]:
+    """Основная и запасная категория для каждого стока за один проход по ключам."""
+    index = category_index()
+    scores: dict[str, dict[str, float]] = {stock: {} for stock in STOCK_CATEGORIES}
+    matched: set[tuple[str, str, str]] = set()
+    for position, keyword in enumerate(keywords):
+        phrase = _fold_phrase(keyword)
+        tokens = phrase.split()
+        # сам ключ ('new year') и его слова ('dog' из 'happy dog')
+        for term in dict.fromkeys([phrase] + tokens):
+            for stock, category, weight in index.get(term, ()):
+                if (stock, category, term) in matched:
+                    continue
+                matched.add((stock, category, term))
+                bucket = scores[stock]
+                bucket[category] = bucket.get(category, 0.0) + weight * _position_weight(position)
+
+    result = {}
+    for stock, bucket in scores.items():
+        order = list(STOCK_CATEGORIES[stock])
+        ranked = sorted(bucket, key=lambda c: (-bucket[c], order.index(c)))
+        result[stock] = StockCategory(
+            primary=ranked[0] if ranked else UNCATEGORIZED,
+            secondary=ranked[1] if len(ranked) > 1 else None,
+        )
+    return result
+
+
+def stock_categories(keywords: list[str]) -> dict[str, dict[str, str | None]]:
+    """classify в виде, который хранится в MetadataEntity.categories и results.json."""
+    return {
+        stock: {"category": c.primary, "secondary_category": c.secondary}
+        for stock, c in classify(keywords).items()
+    }
+
 
 def detect_category(keywords: list[str], stock: str = "shutterstock") -> str:
     """Определяет категорию по ключевым словам"""
-    kws = [kw.lower() for kw in keywords]
-    categories = SHUTTERSTOCK_CATEGORIES if stock == "shutterstock" else SHUTTERSTOCK_CATEGORIES
-    for cat, terms in categories.items():
-        if any(term in kws for term in terms):
-            return cat
-    return "Uncategorized"
+    categories = classify(keywords)
+    return categories.get(stock, categories["shutterstock"]).primary
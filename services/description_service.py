@@ -1,4 +1,5 @@
 from services.holidays_service import find_all_related
+from services.keyword_policy import get_policy
 
 def enrich_description_with_holidays(base_desc: str, themes: list[str], max_len: int = 200) -> str:
     """
@@ -15,23 +16,10 @@ def enrich_description_with_holidays(base_desc: str, themes: list[str], max_len:
             return candidate
     return base_desc  # если ничего не влезло
 
-def enrich_keywords_with_holidays(base_keywords: list[str], themes: list[str]) -> list[str]:
+def enrich_keywords_with_holidays(base_keywords: list[str], themes: list[str], caption: str = "") -> list[str]:
     """
-    Добавляет праздники в ключевые слова (нормализуя их).
+    Добавляет праздники в ключевые слова — внутри общей политики ключей
+    (services.keyword_policy): слова праздников проходят ту же нормализацию,
+    склейку форм, квоты и лимит config.yaml, что и ответ LLM.
     """
-    holidays = find_all_related(themes)
-    if not holidays:
-        return base_keywords
-
-    extra_keywords = []
-    for holiday in holidays:
-        # Оставляем только суть, убираем 'international', 'day', 'world', 'national'
-        words = [
-            w.lower() for w in holiday.replace("'", "").split()
-            if w.lower() not in {"international", "national", "world", "day"}
-        ]
-        extra_keywords.extend(words)
-
-    # Убираем дубликаты, сохраняем до 49
-    combined = list(dict.fromkeys(base_keywords + extra_keywords))
-    return combined[:49]
+    return get_policy().apply(caption, base_keywords, themes)
@@ -0,0 +1,59 @@
+"""
+Привязка ключевых слов к словарю Getty: keyword → {"preferred", "uri"}.
+Все ключи файла (или пачки файлов) уходят в GettyVocab.lookup_many одним
+запросом по индексам; разрешённые термины кэширует LRU самого GettyVocab,
+поэтому между файлами повторные ключи в базу не ходят.
+Без базы словаря (vocab_loader не запускали) стадия просто ничего не добавляет.
+"""
+import threading
+import time
+from pathlib import Path
+
+from adapters.config_loader import get_config
+
+RETRY_INTERVAL = 30.0   # сек между проверками, не появилась ли база словаря
+
+_vocab = None
+_vocab_lock = threading.Lock()
+_retry_at = 0.0
+_reported = False
+
+
+def get_vocab():
+    """
+    Общий GettyVocab процесса или None, если словарь выключен или не загружен.
+    Запоминается только успешное открытие: если vocab_loader соберёт базу
+    при уже запущенном сервере, она подхватится не позже чем через RETRY_INTERVAL.
+    """
+    global _vocab, _retry_at, _reported
+    if _vocab is not None or time.monotonic() < _retry_at:
+        return _vocab
+    with _vocab_lock:
+        if _vocab is None and time.monotonic() >= _retry_at:
+            config = get_config()
+            if config.vocab_enabled and Path(config.vocab_path).exists():
+                from vocab.vocab_lookup import GettyVocab
+                _vocab = GettyVocab(config.vocab_path, cache_size=config.vocab_cache_items)
+            else:
+                _retry_at = time.monotonic() + RETRY_INTERVAL
+                if not _reported:
+                    print("ℹ️ Словарь Getty не загружен — disambiguations пропускаются")
+                    _reported = True
+    return _vocab
+
+
+def disambiguate_many(keyword_lists: list[list[str]]) -> list[dict[str, dict]]:
+    """Для каждого списка ключей — найденные в словаре: keyword → {"preferred", "uri"}."""
+    vocab = get_vocab()
+    if vocab is None:
+        return [{} for _ in keyword_lists]
+    resolved = vocab.lookup_many(kw for keywords in keyword_lists for kw in keywords)
+    return [
+        {kw: resolved[kw] for kw in keywords if resolved.get(kw)}
+        for keywords in keyword_lists
+    ]
+
+
+def disambiguate(keywords: list[str]) -> dict[str, dict]:
+    """Ключи одного файла, найденные в словаре Getty."""
+    return disambiguate_many([keywords])[0]
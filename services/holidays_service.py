@@ -1,7 +1,23 @@
+"""
+Праздники по ключевым словам. Все JSON из services/holidays загружаются один раз
+в HolidayMatcher — обратный индекс «слово → праздники», так что весь список
+ключей сопоставляется за один проход, без чтения файлов и перебора всех праздников.
+Индекс пересобирается сам, если JSON на диске поменялись (по mtime/size).
+
+Элемент JSON — строка с названием или объект с датой для приоритета по окну дат:
+    "International Dog Day"
+    {"name": "International Dog Day", "date": "08-26"}
+"""
 import json
+import re
+import threading
+from dataclasses import dataclass
+from datetime import date
 from pathlib import Path
 from typing import List
 
+from adapters.config_loader import get_config
+
 HOLIDAYS_DIR = Path(__file__).parent / "holidays"
 
 # список всех тем
@@ -18,38 +34,186 @@ HOLIDAY_TOPICS = [
     "education",
 ]
 
+# слова названий, по которым праздник не ищется (есть почти в каждом)
+_INDEX_NOISE = frozenset({
+    "international", "national", "world", "global", "day", "days", "week", "month",
+    "awareness", "the", "and", "for", "of",
+})
+
+PER_TOPIC_LIMIT = 5
+TOTAL_LIMIT = 10
+
+
+@dataclass(frozen=True)
+class Holiday:
+    name: str
+    topic: str
+    order: int                       # позиция в исходных JSON (тема, затем строка) — для стабильного ранга
+    date: tuple[int, int] | None = None  # (месяц, день)
+
+
+def _tokens(text: str) -> list[str]:
+    from services.keyword_policy import fold
+    return [fold(t) for t in re.findall(r"[a-z0-9]+", text.lower().replace("'", ""))
+            if len(t) > 2 and t not in _INDEX_NOISE]
+
+
+def _parse_date(value) -> tuple[int, int] | None:
+    if not value:
+        return None
+    month, day = (int(p) for p in str(value).split("-"))
+    return month, day
+
+
+def _days_apart(month_day: tuple[int, int], on: date) -> int:
+    """Расстояние в днях до ближайшего повторения даты (через границу года тоже)."""
+    best = 366
+    for year in (on.year - 1, on.year, on.year + 1):
+        try:
+            best = min(best, abs((date(year, *month_day) - on).days))
+        except ValueError:  # 29 февраля в невисокосный год
+            continue
+    return best
+
+
 def load_holidays(topic: str) -> List[str]:
     """
     Загружает список праздников по теме.
     """
-    file_path = HOLIDAYS_DIR / f"{topic}.json"
-    if not file_path.exists():
-        return []
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return [h.name for h in get_matcher().by_topic.get(topic, [])]
+
+
+class HolidayMatcher:
+    """Обратный индекс по словам названий всех тем; потокобезопасная перезагрузка."""
+
+    def __init__(self, directory: Path = HOLIDAYS_DIR, topics: list[str] = HOLIDAY_TOPICS):
+        self.directory = Path(directory)
+        self.topics = list(topics)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.by_topic: dict[str, list[Holiday]] = {}
+        self.index: dict[str, list[Holiday]] = {}
+        self.name_tokens: dict[Holiday, frozenset[str]] = {}
+
+    def _files_stamp(self) -> tuple:
+        stamp = []
+        for topic in self.topics:
+            path = self.directory / f"{topic}.json"
+            try:
+                st = path.stat()
+                stamp.append((topic, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append((topic, None, None))
+        return tuple(stamp)
+
+    def _build(self, stamp: tuple):
+        by_topic, index, name_tokens = {}, {}, {}
+        order = 0
+        for topic, mtime, _ in stamp:
+            holidays = []
+            if mtime is not None:
+                with open(self.directory / f"{topic}.json", "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+                for entry in entries:
+                    if isinstance(entry, dict):
+                        holiday = Holiday(entry["name"], topic, order, _parse_date(entry.get("date")))
+                    else:
+                        holiday = Holiday(entry, topic, order)
+                    order += 1
+                    holidays.append(holiday)
+                    name_tokens[holiday] = frozenset(_tokens(holiday.name))
+                    for token in name_tokens[holiday]:
+                        index.setdefault(token, []).append(holiday)
+            by_topic[topic] = holidays
+        self.by_topic, self.index, self.name_tokens, self._stamp = by_topic, index, name_tokens, stamp
+
+    def refresh(self):
+        """Пересобирает индекс, если JSON на диске изменились с прошлой загрузки."""
+        stamp = self._files_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._build(stamp)
+
+    def match(self, keywords: List[str], on: date | None = None, window_days: int = 0,
+              only_window: bool = False, topic: str | None = None) -> List[str]:
+        """
+        Праздники, в названии которых есть слова из keywords ('dogs' → 'International Dog Day').
+        Индекс даёт только кандидатов; праздник принимается, если в его названии есть
+        все слова хотя бы одной фразы keywords и все слова названия есть среди keywords
+        ('dog' не находит 'World Hot Dog Day', 'pet at home' — 'Stay at Home Day').
+        Ранг: сколько слов названия совпало, затем близость к дате on (в пределах window_days),
+        затем порядок в JSON. only_window=True отбрасывает датированные праздники вне окна;
+        topic — искать только в одной теме.
+        """
+        self.refresh()
+        index, name_tokens = self.index, self.name_tokens
+        phrases = [frozenset(tokens) for tokens in map(_tokens, keywords) if tokens]
+        vocabulary = frozenset().union(*phrases)
+        hits: dict[Holiday, int] = {}
+        for phrase in dict.fromkeys(phrases):
+            for holiday in index.get(next(iter(phrase)), ()):
+                name = name_tokens[holiday]
+                if holiday not in hits and phrase <= name and name <= vocabulary:
+                    hits[holiday] = len(name)
+
+        ranked = []
+        for holiday, score in hits.items():
+            if topic is not None and holiday.topic != topic:
+                continue
+            distance = None
+            if on is not None and window_days > 0 and holiday.date is not None:
+                days = _days_apart(holiday.date, on)
+                if days <= window_days:
+                    distance = days
+                elif only_window:
+                    continue
+            ranked.append((-score, distance is None, distance or 0, holiday.order, holiday))
+        ranked.sort(key=lambda r: r[:4])
+
+        result, per_topic = [], {}
+        for *_, holiday in ranked:
+            if per_topic.get(holiday.topic, 0) >= PER_TOPIC_LIMIT or holiday.name in result:
+                continue
+            per_topic[holiday.topic] = per_topic.get(holiday.topic, 0) + 1
+            result.append(holiday.name)
+            if len(result) >= TOTAL_LIMIT:
+                break
+        return result
+
+
+_matcher: HolidayMatcher | None = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher() -> HolidayMatcher:
+    """Общий HolidayMatcher процесса (JSON читаются при первом обращении и после изменений)."""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = HolidayMatcher()
+    _matcher.refresh()
+    return _matcher
+
 
 def find_related_holidays(keywords: List[str], topic: str) -> List[str]:
     """
     Возвращает список праздников, связанных с ключевыми словами в одной теме.
-    Совпадение — по подстроке (например, 'dog' → 'International Dog Day').
+    Совпадение — по слову названия (например, 'dog' → 'International Dog Day').
     """
-    holidays = load_holidays(topic)
-    result = []
-    for kw in keywords:
-        for holiday in holidays:
-            if kw.lower() in holiday.lower() and holiday not in result:
-                result.append(holiday)
-    return result[:5]  # ограничиваем, чтобы не захламлять
-
-def find_all_related(keywords: List[str]) -> List[str]:
+    return get_matcher().match(keywords, topic=topic)
+
+
+def find_all_related(keywords: List[str], on: date | None = None) -> List[str]:
     """
     Возвращает список праздников, связанных с ключевыми словами,
     проверяя все темы (animals, health, family, food и т. д.).
+    Праздники около даты on (по умолчанию — сегодня, день загрузки) идут раньше,
+    окно — holidays.window_days в config.yaml.
     """
-    result = []
-    for topic in HOLIDAY_TOPICS:
-        holidays = find_related_holidays(keywords, topic)
-        for h in holidays:
-            if h not in result:
-                result.append(h)
-    return result[:10]  # ограничиваем итоговый список
+    config = get_config()
+    window = config.holidays_window_days
+    if window > 0 and on is None:
+        on = date.today()
+    return get_matcher().match(keywords, on=on, window_days=window, only_window=config.holidays_only_window)
@@ -1,14 +1,51 @@
 from pathlib import Path
 from domain.models import MetadataEntity
-from services.caption_service import generate_caption
+from services.caption_service import generate_caption, generate_captions, DEFAULT_BATCH_SIZE
 from services.keyword_service import generate_metadata_with_prompt
-from services.category_service import detect_category
+from services.llm_stage import generate_metadata_many
+from services.category_service import stock_categories
+from services.series_service import SeriesMember, is_copy, propagate, remember_leader
 
 
-def process_image(path: Path, callback=None) -> MetadataEntity:
-    """Обработка изображения: caption → metadata → category/flags"""
+def _build_entity(path: Path, caption: str, enriched: dict, callback=None) -> MetadataEntity:
+    """metadata от LLM → category/flags → MetadataEntity"""
+    categories = enriched.get("categories")
+    if categories is None:
+        categories = stock_categories(enriched.get("keywords") or [])
+        if callback:
+            callback("category", categories["shutterstock"]["category"])
+
+    flags = {"image": True}
+    if callback:
+        callback("flags", str(flags))
+
+    return MetadataEntity(
+        file=str(path),
+        title=enriched.get("title"),
+        description=enriched.get("description"),
+        keywords=enriched.get("keywords"),
+        category=categories["shutterstock"]["category"],
+        secondary_category=categories["shutterstock"]["secondary_category"],
+        categories=categories,
+        flags=flags,
+        captions=[caption] if caption else [],
+        disambiguations=enriched.get("disambiguations") or {}
+    )
+
+
+def _failed_entity(path: Path, e: Exception) -> MetadataEntity:
+    print(f"❌ Ошибка при обработке изображения {path}: {e}")
+    return MetadataEntity(file=str(path), title="", description="", keywords=[], disambiguations={})
+
+
+def process_image(path: Path, callback=None, caption: str | None = None) -> MetadataEntity:
+    """
+    Обработка изображения: caption → metadata → category/flags.
+    caption можно передать заранее (посчитан пачкой в process_images).
+    """
     try:
-        caption = generate_caption(str(path))
+        if caption is None:
+            caption = generate_caption(str(path))
         if callback and caption:
             callback("captions", caption)
 
@@ -17,25 +54,68 @@ def process_image(path: Path, callback=None) -> MetadataEntity:
             media_type="image",
             callback=callback
         )
+        return _build_entity(path, caption, enriched, callback)
+    except Exception as e:
+        return _failed_entity(path, e)
 
-        category = detect_category(enriched.get("keywords", []))
-        if callback and category:
-            callback("category", category)
 
-        flags = {"image": True}
-        if callback:
-            callback("flags", str(flags))
-
-        return MetadataEntity(
-            file=str(path),
-            title=enriched.get("title"),
-            description=enriched.get("description"),
-            keywords=enriched.get("keywords"),
-            category=category,
-            flags=flags,
-            captions=[caption] if caption else [],
-            disambiguations=[]
-        )
-    except Exception as e:
-        print(f"❌ Ошибка при обработке изображения {path}: {e}")
-        return MetadataEntity(file=str(path), title="", description="", keywords=[], disambiguations=[])
+def process_images(paths: list[Path], callbacks: list | None = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE,
+                   series: dict[Path, SeriesMember] | None = None) -> list[MetadataEntity]:
+    """
+    Пакетная обработка: captions считаем микро-пачками по batch_size,
+    LLM-запросы всех файлов пачки идут одновременно (services.llm_stage).
+    series — результат detect_series: файлы серии получают series_id,
+    а не-лидеры (если лидер уже готов) — его метаданные без caption/LLM.
+    """
+    callbacks = callbacks or [None] * len(paths)
+    series = series or {}
+    results = []
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        callback_of = dict(zip(chunk, callbacks[start:start + batch_size]))
+        # лидер всегда раньше по порядку, поэтому копии узнаём ещё до caption
+        own = [p for p in chunk if not is_copy(series.get(p))]
+        try:
+            captions = generate_captions([str(p) for p in own], batch_size=batch_size)
+        except Exception as e:
+            print(f"❌ Ошибка пакетного caption ({len(own)} файлов): {e}")
+            captions = [None] * len(own)
+
+        entities: dict[Path, MetadataEntity] = {}
+        ready = []
+        for path, caption in zip(own, captions):
+            try:
+                if caption is None:
+                    caption = generate_caption(str(path))
+            except Exception as e:
+                entities[path] = _failed_entity(path, e)
+                continue
+            if callback_of[path] and caption:
+                callback_of[path]("captions", caption)
+            ready.append((path, caption))
+
+        enriched_list = generate_metadata_many([(caption, "image", callback_of[path]) for path, caption in ready])
+        for (path, caption), enriched in zip(ready, enriched_list):
+            try:
+                entities[path] = _build_entity(path, caption, enriched, callback_of[path])
+            except Exception as e:
+                entities[path] = _failed_entity(path, e)
+            member = series.get(path)
+            if member:
+                entities[path].series_id = member.series_id
+                if member.index == 0:
+                    remember_leader(member.series_id, entities[path])
+
+        for path in chunk:
+            if path in entities:
+                continue
+            member = series.get(path)
+            shared = propagate(member, path, callback_of[path])
+            if shared is None:
+                # лидер серии не обработался — файл идёт сам по себе
+                shared = process_image(path, callback=callback_of[path])
+                shared.series_id = member.series_id
+            entities[path] = shared
+        results.extend(entities[p] for p in chunk)
+    return results
@@ -0,0 +1,225 @@
+"""
+Ключевые кадры видео: по одному на сцену, а не один кадр из середины.
+
+Ролик пробуется scene_samples кадрами в разрешении превью (один вызов ffmpeg),
+соседние пробы сравниваются по цветовым гистограммам; скачок больше
+scene_threshold — склейка. В каждой сцене берётся проба, ближе всего к средней
+гистограмме сцены; до video.keyframes самых длинных сцен и есть ключевые кадры.
+Выбранные пробы сразу служат превью (UI, веб, pHash серий), а в разрешении
+caption ключевые моменты декодируются один раз — вторым вызовом ffmpeg
+в caption_images, когда до них доходит обработка.
+
+В памяти (LRU по байтам) держатся только моменты и маленькие превью, поэтому
+бюджета хватает на целую папку: превью в UI и detect_series не пробуют ролик
+второй раз при обработке. Между запусками всё это переживает в дисковом кэше
+adapters.media_cache.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from adapters.config_loader import get_config
+from adapters.image_loader import THUMB_SIZE
+from adapters.media_cache import cached_images, cached_json
+from adapters.video_loader import VideoInfo, read_frames, spaced_timestamps
+from services.caption_service import decode_side
+from services.probe_service import probe_cached
+
+PREVIEW_SIZE = THUMB_SIZE   # сторона проб: по ним ищутся сцены, выбранные идут в превью
+_BINS = 16                  # корзин гистограммы на канал
+
+
+@dataclass
+class Keyframe:
+    timestamp: float
+    weight: float           # доля ролика, которую занимает сцена
+    preview: Image.Image    # длинная сторона ≤ PREVIEW_SIZE
+
+
+@dataclass
+class VideoKeyframes:
+    info: VideoInfo
+    keyframes: list[Keyframe]   # по времени
+
+    @property
+    def main(self) -> Keyframe | None:
+        """Кадр самой длинной сцены."""
+        return max(self.keyframes, key=lambda k: k.weight, default=None)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(k.preview.width * k.preview.height * 3 for k in self.keyframes)
+
+
+def _histogram(image: Image.Image) -> np.ndarray:
+    pixels = np.asarray(image.convert("RGB")).reshape(-1, 3) // (256 // _BINS)
+    hist = np.concatenate([np.bincount(pixels[:, c], minlength=_BINS) for c in range(3)]).astype(np.float64)
+    return hist / hist.sum() * 3
+
+
+def _distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Доля «перетёкших» пикселей между гистограммами: 0 — одинаковые, 1 — ничего общего."""
+    return float(np.abs(a - b).sum() / 6)
+
+
+def select_keyframes(samples: list[Image.Image], timestamps: list[float], count: int,
+                     threshold: float) -> list[tuple[float, float]]:
+    """
+    (timestamp, weight) ключевых кадров по пробам: сцены режутся там, где разница
+    гистограмм соседних проб больше threshold; из каждой сцены — самая «типичная» проба;
+    остаются count самых длинных сцен, в порядке времени.
+    """
+    if not samples:
+        return []
+    hists = [_histogram(image) for image in samples]
+    scenes, current = [], [0]
+    for i in range(1, len(hists)):
+        if _distance(hists[i - 1], hists[i]) > threshold:
+            scenes.append(current)
+            current = []
+        current.append(i)
+    scenes.append(current)
+
+    chosen = []
+    for scene in scenes:
+        mean = np.mean([hists[i] for i in scene], axis=0)
+        best = min(scene, key=lambda i: _distance(hists[i], mean))
+        chosen.append((timestamps[best], len(scene) / len(hists)))
+    chosen = sorted(chosen, key=lambda k: -k[1])[:count]
+    return sorted(chosen)
+
+
+class KeyframeStore:
+    """LRU ключевых кадров с превью, ключ — путь + размер + mtime файла."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[tuple, VideoKeyframes] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: Path) -> tuple:
+        stat = path.stat()
+        return str(path.resolve()), stat.st_size, stat.st_mtime_ns
+
+    def get(self, path: Path) -> VideoKeyframes | None:
+        key = self._key(path)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, path: Path, item: VideoKeyframes):
+        key = self._key(path)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._items[key] = item
+            self._bytes += item.nbytes
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def discard(self, path: Path):
+        key = self._key(path)
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._bytes -= item.nbytes
+
+
+_store = KeyframeStore(get_config().video_keyframe_cache_bytes)
+
+
+def _scene_params() -> dict:
+    config = get_config()
+    return {
+        "samples": config.video_scene_samples,
+        "threshold": config.video_scene_threshold,
+        "keyframes": config.video_keyframes,
+        "side": PREVIEW_SIZE,
+    }
+
+
+def analyze(path: Path) -> VideoKeyframes:
+    """
+    Сцены ролика: метаданные — из индекса ffprobe (probe_service), пробы — один ffmpeg
+    в разрешении превью; моменты и превью кладутся в дисковый кэш (adapters.media_cache),
+    так что повторный запуск не вызывает ни ffprobe, ни ffmpeg.
+    """
+    config = get_config()
+    info = probe_cached(path)
+    params = _scene_params()
+    samples: dict[float, Image.Image] = {}
+
+    def detect() -> dict:
+        if info.duration <= 0:
+            return {"keyframes": []}
+        timestamps = spaced_timestamps(info.duration, max(1, config.video_scene_samples))
+        frames = read_frames(path, timestamps, PREVIEW_SIZE, info=info)
+        # моменты без кадра (битый участок, ролик короче индекса) выпадают, не сдвигая соседние
+        samples.update((ts, frame) for ts, frame in zip(timestamps, frames) if frame is not None)
+        chosen = select_keyframes(list(samples.values()), list(samples), max(1, config.video_keyframes),
+                                  config.video_scene_threshold)
+        # пробы не прочитались (битый индекс и т.п.) — хотя бы середина ролика
+        return {"keyframes": chosen or [(info.duration / 2, 1.0)]}
+
+    chosen = [tuple(k) for k in cached_json(path, "scenes", params, detect)["keyframes"]]
+
+    def build_previews(missing: list[int]) -> list[Image.Image | None]:
+        # только что посчитанные пробы уже в памяти; иначе (превью вытеснено из кэша) — один ffmpeg
+        if all(chosen[i][0] in samples for i in missing):
+            return [samples[chosen[i][0]] for i in missing]
+        return read_frames(path, [chosen[i][0] for i in missing], PREVIEW_SIZE, info=info)
+
+    previews = cached_images(
+        path, "keyframe-preview",
+        [{**params, "timestamp": round(ts, 3)} for ts, _ in chosen],
+        build_previews,
+        quality=90,
+    )
+    return VideoKeyframes(info, [
+        Keyframe(ts, weight, image) for (ts, weight), image in zip(chosen, previews) if image is not None
+    ])
+
+
+def keyframes(path: Path) -> VideoKeyframes:
+    """Ключевые кадры с превью из LRU или свежего analyze (остаются в LRU до discard)."""
+    item = _store.get(path)
+    if item is None:
+        item = analyze(path)
+        _store.put(path, item)
+    return item
+
+
+def caption_images(path: Path) -> list[tuple[Keyframe, Image.Image]]:
+    """
+    Ключевые кадры в разрешении decode_side() для caption: моменты берутся из
+    keyframes (сцены второй раз не ищутся), сами кадры — один вызов ffmpeg
+    (или дисковый кэш).
+    """
+    video = keyframes(path)
+    side, cover = decode_side()
+    images = cached_images(
+        path, "keyframe",
+        [{"timestamp": round(k.timestamp, 3), "side": side, "cover": cover} for k in video.keyframes],
+        lambda missing: read_frames(path, [video.keyframes[i].timestamp for i in missing],
+                                    side, cover=cover, info=video.info),
+        quality=95,
+    )
+    return [(keyframe, image) for keyframe, image in zip(video.keyframes, images) if image is not None]
+
+
+def discard(path: Path):
+    """Ролик обработан — его превью и моменты из LRU больше не нужны."""
+    try:
+        _store.discard(path)
+    except OSError:
+        pass
@@ -0,0 +1,100 @@
+"""
+Отбор ключевых слов без почти-дублей.
+
+Решение то же, что у прежнего цикла
+    if not any(SequenceMatcher(None, k, u).ratio() > 0.85 for u in unique)
+но полный SequenceMatcher запускается только для пар, которые прошли
+дешёвые верхние оценки ratio (ни одна не занижает сходство, поэтому
+ни одна пара, которую difflib счёл бы дублем, не отсекается):
+    1. точное совпадение — ratio 1.0 без сравнения;
+    2. корзины по длине: ratio ≤ 2·min(la, lb) / (la + lb);
+    3. маска букв: буквы k, которых нет в u вовсе, не могут совпасть;
+    4. гистограмма символов: ratio ≤ 2·|k ∩ u| / (la + lb) (как quick_ratio).
+"""
+import difflib
+from collections import Counter
+
+
+class KeywordDeduper:
+    def __init__(self, threshold: float = 0.85):
+        self.threshold = threshold
+        self.accepted: list[str] = []
+        self._exact: set[str] = set()
+        # длина → [(слово, маска букв, гистограмма, SequenceMatcher с seq2=слово)]
+        self._by_length: dict[int, list[tuple[str, int, Counter, difflib.SequenceMatcher]]] = {}
+        self.full_compares = 0
+
+    @staticmethod
+    def _mask(word: str) -> int:
+        mask = 0
+        for ch in word:
+            mask |= 1 << (ord(ch) & 63)
+        return mask
+
+    def _length_window(self, length: int) -> range:
+        # границы с запасом ±1, точная проверка — в is_duplicate той же формулой, что у difflib
+        t = self.threshold
+        low = max(1, int(length * t / (2 - t)) - 1)
+        high = int(length * (2 - t) / t) + 1
+        return range(low, high + 1)
+
+    def is_duplicate(self, keyword: str) -> bool:
+        """True, если keyword похож (ratio > threshold) на уже принятое слово."""
+        if keyword in self._exact:
+            return True
+        length = len(keyword)
+        mask = self._mask(keyword)
+        hist = None
+        t = self.threshold
+        for other_length in self._length_window(length):
+            bucket = self._by_length.get(other_length)
+            if not bucket:
+                continue
+            total = length + other_length
+            if 2.0 * min(length, other_length) / total <= t:
+                continue
+            for word, word_mask, word_hist, matcher in bucket:
+                # буквы keyword, которых в word нет совсем, дают минимум по несовпадению на каждую
+                bound = min(length - (mask & ~word_mask).bit_count(),
+                            other_length - (word_mask & ~mask).bit_count())
+                if 2.0 * bound / total <= t:
+                    continue
+                if hist is None:
+                    hist = Counter(keyword)
+                common = sum(min(n, word_hist[ch]) for ch, n in hist.items())
+                if 2.0 * common / total <= t:
+                    continue
+                self.full_compares += 1
+                matcher.set_seq1(keyword)
+                if matcher.ratio() > t:
+                    return True
+        return False
+
+    def add(self, keyword: str) -> bool:
+        """Принимает keyword, если он не почти-дубль; возвращает, принят ли."""
+        if self.is_duplicate(keyword):
+            return False
+        self.accepted.append(keyword)
+        self._exact.add(keyword)
+        matcher = difflib.SequenceMatcher(None, "", keyword)
+        self._by_length.setdefault(len(keyword), []).append(
+            (keyword, self._mask(keyword), Counter(keyword), matcher)
+        )
+        return True
+
+
+def dedupe_keywords(keywords: list[str], threshold: float = 0.85) -> list[str]:
+    """Первое вхождение из каждой группы похожих слов, порядок сохраняется."""
+    deduper = KeywordDeduper(threshold)
+    for keyword in keywords:
+        deduper.add(keyword)
+    return deduper.accepted
+
+
+def dedupe_keywords_difflib(keywords: list[str], threshold: float = 0.85) -> list[str]:
+    """Эталон O(n²): прежняя реализация из finalize_keywords (для бенчмарка и сверки)."""
+    unique = []
+    for k in keywords:
+        if not any(difflib.SequenceMatcher(None, k, u).ratio() > threshold for u in unique):
+            unique.append(k)
+    return unique
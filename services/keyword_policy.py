@@ -0,0 +1,181 @@
+"""
+Пост-обработка ключевых слов по правилам из config.yaml (секция keywords).
+KeywordPolicy собирается из Config один раз (get_policy) и дальше только применяется:
+
+    кандидаты: слова caption + приоритетные синонимы + ответ LLM + слова праздников
+    → нормализация и stopwords → склейка форм (dogs = dog) и почти-дублей
+    → ранжирование (сначала то, что есть в caption) → mandatory
+    → квоты single_words / two_words → total штук
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from adapters.config_loader import Config, get_config
+from services.holidays_service import find_all_related
+from services.keyword_dedupe import KeywordDeduper
+from services.priority_synonyms import priority_synonyms
+
+# формы, которые правилами ниже склеиваются неверно
+_IRREGULAR_PLURALS = {
+    "children": "child", "people": "person", "men": "man", "women": "woman",
+    "mice": "mouse", "geese": "goose", "feet": "foot", "teeth": "tooth",
+    "leaves": "leaf", "wolves": "wolf", "knives": "knife", "lives": "life", "wives": "wife",
+}
+_NO_FOLD = frozenset({
+    "christmas", "news", "series", "species", "physics", "mathematics", "always",
+    "lens", "bus", "gas", "canvas", "jeans", "pants", "clothes", "scissors", "thanksgiving",
+})
+# служебные слова caption, которые не бывают ключами
+_FUNCTION_WORDS = frozenset({
+    "the", "and", "with", "for", "from", "into", "onto", "over", "under", "near", "its", "his", "her",
+    "their", "this", "that", "there", "are", "was", "were", "has", "have", "while", "some", "out",
+    "stay", "your", "our", "you", "all", "not", "about", "against", "of", "to", "in", "on", "at", "a", "an",
+})
+# слова праздников, которые сами по себе ключом не являются
+_HOLIDAY_NOISE = frozenset({"international", "national", "world", "day"})
+
+
+def fold(word: str) -> str:
+    """Единственное число для сравнения ключей: puppies → puppy, boxes → box, dogs → dog."""
+    if word in _NO_FOLD:
+        return word
+    if word in _IRREGULAR_PLURALS:
+        return _IRREGULAR_PLURALS[word]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _normalize(keyword: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9']+", keyword.lower())).replace("'", "")
+
+
+@dataclass(frozen=True)
+class KeywordPolicy:
+    total: int = 49
+    single_words: int = 30
+    two_words: int = 19
+    stopwords: frozenset = frozenset()
+    mandatory: tuple = ()
+    similarity: float = 0.85
+    caption_terms: int = 10
+
+    @classmethod
+    def from_config(cls, config: Config) -> "KeywordPolicy":
+        return cls(
+            total=config.keywords_total,
+            single_words=config.keywords_single,
+            two_words=config.keywords_double,
+            stopwords=frozenset(_normalize(w) for w in config.keywords_stopwords),
+            mandatory=tuple(dict.fromkeys(_normalize(w) for w in config.keywords_mandatory)),
+            similarity=config.keywords_similarity,
+        )
+
+    def caption_candidates(self, caption: str) -> list[str]:
+        """Слова caption (первые caption_terms) вместе с их приоритетными синонимами."""
+        words = [w for w in re.findall(r"\b[a-z]+\b", caption.lower())
+                 if len(w) > 2 and w not in _FUNCTION_WORDS][:self.caption_terms]
+        expanded = []
+        for w in words:
+            expanded.append(w)
+            expanded.extend(priority_synonyms.get(w, []))
+        return list(dict.fromkeys(expanded))
+
+    def holiday_candidates(self, themes: list[str] | None) -> list[str]:
+        """
+        Праздники по темам описания → отдельные слова ('International Dog Day' → 'dog');
+        служебные слова названий ('for', 'stay') и stopwords отсеиваются, как в caption.
+        """
+        if not themes:
+            return []
+        words = []
+        for holiday in find_all_related(themes):
+            words.extend(
+                w for w in _normalize(holiday).split()
+                if w not in _HOLIDAY_NOISE and w not in _FUNCTION_WORDS and w not in self.stopwords
+            )
+        return words
+
+    def _allowed(self, keyword: str) -> bool:
+        tokens = keyword.split()
+        return (
+            0 < len(tokens) <= 2
+            and len(keyword) > 2
+            and keyword not in self.stopwords
+            and not any(t in self.stopwords for t in tokens)
+        )
+
+    def apply(self, caption: str, keywords: list[str], themes: list[str] | None = None) -> list[str]:
+        """Итоговый список ключей одного файла."""
+        return self.apply_many([(caption, keywords, themes)])[0]
+
+    def apply_many(self, jobs: list[tuple[str, list[str], list[str] | None]],
+                   holidays: dict[tuple, list[str]] | None = None) -> list[list[str]]:
+        """
+        jobs — (caption, ключи от LLM, темы описания для праздников); порядок сохраняется.
+        holidays — общий на прогон кэш «темы → слова праздников», если файлы приходят по одному.
+        """
+        holidays = {} if holidays is None else holidays
+        results = []
+        for caption, keywords, themes in jobs:
+            key = tuple(themes or ())
+            if key not in holidays:
+                holidays[key] = self.holiday_candidates(themes)
+            results.append(self._select(caption, keywords, holidays[key]))
+        return results
+
+    def _select(self, caption: str, keywords: list[str], holiday_words: list[str]) -> list[str]:
+        caption_words = self.caption_candidates(caption)
+        caption_folded = {fold(w) for w in re.findall(r"[a-z]+", caption.lower())}
+
+        # mandatory заходят первыми, чтобы их формы/почти-дубли из LLM отсеялись
+        deduper = KeywordDeduper(self.similarity)
+        seen: set[tuple[str, ...]] = set()
+        for term in self.mandatory:
+            deduper.add(term)
+            seen.add(tuple(fold(t) for t in term.split()))
+
+        ranked = []
+        for position, raw in enumerate(caption_words + list(keywords) + holiday_words):
+            keyword = _normalize(raw)
+            if not self._allowed(keyword):
+                continue
+            folded = tuple(fold(t) for t in keyword.split())
+            if folded in seen or not deduper.add(keyword):
+                continue
+            seen.add(folded)
+            # ранг: термины, которые встречаются в caption, — вперёд, внутри — порядок кандидатов
+            tier = 0 if any(t in caption_folded for t in folded) else 1
+            ranked.append((tier, position, keyword))
+        ranked.sort()
+
+        slots = self.total - len(self.mandatory)
+        quota = {1: self.single_words, 2: self.two_words}
+        for term in self.mandatory:
+            size = min(len(term.split()), 2)
+            quota[size] = max(0, quota[size] - 1)
+
+        selected, leftovers = [], []
+        for _, _, keyword in ranked:
+            size = len(keyword.split())
+            if quota[size] > 0:
+                quota[size] -= 1
+                selected.append(keyword)
+            else:
+                leftovers.append(keyword)
+        # квота одного вида не добрана — свободные места отдаём другому, по рангу
+        if len(selected) < slots:
+            chosen = set(selected) | set(leftovers[:slots - len(selected)])
+            selected = [k for _, _, k in ranked if k in chosen]
+        return selected[:slots] + list(self.mandatory[:self.total])
+
+
+@lru_cache(maxsize=1)
+def get_policy() -> KeywordPolicy:
+    """Общая политика для всех сервисов (собирается из config.yaml один раз)."""
+    return KeywordPolicy.from_config(get_config())
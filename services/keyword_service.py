@@ -1,26 +1,47 @@
-import subprocess
-import re
-from services.priority_synonyms import priority_synonyms
-from services.description_service import enrich_description_with_holidays, enrich_keywords_with_holidays
-import difflib
+import json
+from typing import Callable
+from adapters.config_loader import get_config
+from services.llm_client import OllamaError, get_client
+from services.keyword_policy import get_policy
 
+LLM_MODEL = get_config().llm_model
 
-def call_ollama(model: str, prompt: str) -> str:
+
+def call_ollama(model: str, prompt: str, format: str | None = None,
+                on_token: Callable[[str], None] | None = None) -> str:
     try:
-        result = subprocess.run(
-            ["ollama", "run", model],
-            input=prompt.encode("utf-8"),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
-        return result.stdout.decode("utf-8").strip()
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Ollama error: {e.stderr.decode('utf-8')}")
+        return get_client().generate(model, prompt, format=format, on_token=on_token)
+    except OllamaError as e:
+        print(f"❌ Ollama error: {e}")
         return ""
 
 
-def generate_title(caption: str, media_type: str) -> str:
+def _clean_title(raw: str, caption: str) -> str:
+    return raw.split("\n")[0].strip('" ') if raw else caption
+
+
+def _fit_description(desc: str) -> str:
+    """Обрезаем до description.max_length по границе темы (запятой), иначе — по границе слова."""
+    max_length = get_config().description_max_length
+    if len(desc) <= max_length:
+        return desc
+    cut = desc[:max_length + 1]
+    boundary = cut.rfind(",")
+    if boundary < max_length // 2:
+        boundary = cut.rfind(" ")
+    return (cut[:boundary] if boundary > 0 else desc[:max_length]).rstrip(" ,.;")
+
+
+def _clean_description(raw: str, caption: str) -> str:
+    if not raw:
+        return _fit_description(caption.strip())
+    desc = raw.strip('" ').replace("\n", " ").replace(" a ", " ").replace(" the ", " ").replace("The ", "").replace("A ", "")
+    desc = desc.encode("ascii", "ignore").decode("ascii")  # чистим эмодзи и нелатиницу
+    # чистим кавычки и артикли; длинное (или склеенное из caption кадров) — обрезаем, а не переспрашиваем
+    return _fit_description(desc)
+
+
+def generate_title(caption: str, media_type: str, on_token: Callable[[str], None] | None = None) -> str:
     prompt = (
         f"You are generating an English title for photo/video metadata. "
         f"Rephrase this caption into a clean extended title of 7–12 words: {caption}. "
@@ -28,11 +49,11 @@ def generate_title(caption: str, media_type: str) -> str:
         f"Make it natural, professional, and relevant for commercial usage. "
         f"Output must be only the title, no comments, no explanations."
     )
-    raw = call_ollama("gemma2:2b", prompt)
-    return raw.split("\n")[0].strip('" ') if raw else caption
+    raw = call_ollama(LLM_MODEL, prompt, on_token=on_token)
+    return _clean_title(raw, caption)
 
 
-def generate_description(caption: str, media_type: str) -> str:
+def generate_description(caption: str, media_type: str, on_token: Callable[[str], None] | None = None) -> str:
     original_caption = caption.strip()
 
     prompt = (
@@ -49,33 +70,16 @@ def generate_description(caption: str, media_type: str) -> str:
         f"- Max 200 characters.\n"
     )
 
-    raw = call_ollama("gemma2:2b", prompt)
-    if not raw:
-        return original_caption
-
-    desc = raw.strip('" ').replace("\n", " ").replace(" a ", " ").replace(" the ", " ").replace("The ", "").replace("A ", "")
-    desc = desc.encode("ascii", "ignore").decode("ascii")  # чистим эмодзи и нелатиницу
-    # чистим кавычки и артикли
-
-    return desc
-
-
-def generate_keywords(caption: str, media_type: str, description: str = "") -> list[str]:
-    """Генерация 49 релевантных ключей с приоритетом по смыслу (просто и стабильно)."""
+    raw = call_ollama(LLM_MODEL, prompt, on_token=on_token)
+    return _clean_description(raw, original_caption)
 
-    # --- 1. Базовые слова из кэпшона ---
-    words = re.findall(r"\b[a-zA-Z]+\b", caption.lower())
-    base_words = [w for w in words if len(w) > 2][:10]
 
-    # --- 2. Подмешиваем приоритетные синонимы ---
-    expanded = []
-    for w in base_words:
-        expanded.append(w)
-        if w in priority_synonyms:
-            expanded.extend(priority_synonyms[w])
-    expanded = list(dict.fromkeys(expanded))
-
-    # --- 3. Один промпт к нейросети ---
+def generate_keywords(caption: str, media_type: str, description: str = "",
+                      on_token: Callable[[str], None] | None = None, finalize: bool = True) -> list[str]:
+    """
+    Генерация ключей: один промпт к нейросети, дальше — пост-обработка finalize_keywords.
+    finalize=False возвращает сырой ответ LLM (LLM-стадия прогоняет его через политику сама, вместе с праздниками).
+    """
     prompt = (
         f"You are generating stock photo/video metadata keywords.\n"
         f"Caption: {caption}\n"
@@ -88,65 +92,187 @@ def generate_keywords(caption: str, media_type: str, description: str = "") -> l
         f"- Output only comma-separated lowercase keywords."
     )
 
-    raw = call_ollama("gemma2:2b", prompt)
+    raw = call_ollama(LLM_MODEL, prompt, on_token=on_token)
     keywords = [w.strip().lower() for w in raw.split(",") if w.strip()] if raw else []
+    return finalize_keywords(caption, keywords) if finalize else keywords
 
-    # --- 4. Добавляем наши приоритетные термины ---
-    keywords = expanded + keywords
 
-    # --- 5. Фильтрация и сортировка по релевантности ---
-    banned = {"photo", "image", "stock", "photography", "here", "words", "generated"}
-    keywords = [k for k in keywords if k not in banned and len(k) > 2]
+def finalize_keywords(caption: str, keywords: list[str], themes: list[str] | None = None) -> list[str]:
+    """Ответ LLM → итоговые ключи по правилам config.yaml (см. services.keyword_policy)."""
+    return get_policy().apply(caption, keywords, themes)
 
-    # Удаляем дубли и слишком похожие слова
-    unique = []
-    for k in keywords:
-        if not any(difflib.SequenceMatcher(None, k, u).ratio() > 0.85 for u in unique):
-            unique.append(k)
 
-    # --- 6. Сортировка — более короткие и частотные в начале ---
-    unique.sort(key=lambda x: (len(x), x))
+METADATA_FIELDS = ("title", "description", "keywords")
 
-    # --- 7. Ограничение до 49 ключей ---
-    final_keywords = unique[:49]
+_FIELD_RULES = {
+    "title": '"title": English title of 7–12 words that rephrases the caption (do not copy it '
+             'word-for-word), natural, professional, relevant for commercial usage',
+    "description": '"description": ONE line — the caption EXACTLY as written, a comma, then 3–5 short '
+                   'semantic/commercial themes (2–3 words each), optionally 1–2 real observances if clearly '
+                   'relevant; only commas and periods; max {max_length} characters',
+    "keywords": '"keywords": array of up to 100 short lowercase keywords (single words or 2-word phrases) '
+                'with commercial, visual and thematic relevance, no duplicates, no filler words',
+}
 
-    return final_keywords
 
+def _structured_prompt(caption: str, fields: list[str]) -> str:
+    max_length = get_config().description_max_length
+    rules = "\n".join(f"- {_FIELD_RULES[f].format(max_length=max_length)}" for f in fields)
+    return (
+        f"You are generating stock photo/video metadata.\n"
+        f"Caption: {caption.strip()}\n\n"
+        f"Return ONLY a JSON object with exactly these keys:\n"
+        f"{rules}\n"
+        f"No comments, no explanations, no markdown."
+    )
+
+
+def validate_metadata(data: dict, fields: list[str]) -> list[str]:
+    """Возвращает поля, которые не прошли схему (их переспрашиваем)."""
+    failed = []
+    for field in fields:
+        value = data.get(field)
+        if field == "title":
+            ok = isinstance(value, str) and 3 <= len(value.split()) <= 20
+        elif field == "description":
+            ok = isinstance(value, str) and bool(value.strip())  # длину правит _clean_description
+        else:
+            ok = isinstance(value, list) and sum(isinstance(k, str) and bool(k.strip()) for k in value) >= 10
+        if not ok:
+            failed.append(field)
+    return failed
+
+
+class JsonFieldStream:
+    """
+    Разбор JSON-ответа по мере генерации: текст строковых значений верхнего уровня
+    уходит в on_delta(field, text) — title/description как есть, элементы keywords через ", ".
+    """
+
+    def __init__(self, on_delta: Callable[[str, str], None]):
+        self.on_delta = on_delta
+        self.depth = 0            # вложенность {} / []
+        self.expect_key = False   # следующая строка на depth 1 — ключ
+        self.in_string = False
+        self.in_key = False
+        self.escape = ""          # накопленная escape-последовательность (\n, \u0041)
+        self.key = ""
+        self.field = None         # поле, чьё значение сейчас читаем
+        self.items = 0            # уже отданных элементов массива keywords
+
+    def feed(self, chunk: str):
+        out: dict[str, str] = {}
+        for ch in chunk:
+            if self.in_string:
+                text = self._string_char(ch)
+                if text and self.field:
+                    out[self.field] = out.get(self.field, "") + text
+                continue
+            if ch == '"':
+                self.in_string = True
+                self.in_key = self.depth == 1 and self.expect_key
+                if self.in_key:
+                    self.key = ""
+                elif self.depth == 2 and self.field == "keywords":
+                    if self.items:
+                        out["keywords"] = out.get("keywords", "") + ", "
+                    self.items += 1
+            elif ch in "{[":
+                self.depth += 1
+                self.expect_key = ch == "{" and self.depth == 1
+            elif ch in "}]":
+                self.depth -= 1
+            elif ch == ":" and self.depth == 1:
+                self.expect_key = False
+                self.field = self.key if self.key in METADATA_FIELDS else None
+                self.items = 0
+            elif ch == "," and self.depth == 1:
+                self.expect_key = True
+                self.field = None
+        for field, text in out.items():
+            self.on_delta(field, text)
+
+    def _string_char(self, ch: str) -> str:
+        if self.escape:
+            self.escape += ch
+            if self.escape[1] == "u" and len(self.escape) < 6:
+                return ""
+            seq, self.escape = self.escape, ""
+            if seq[1] == "u":
+                try:
+                    return self._text(chr(int(seq[2:], 16)))
+                except ValueError:
+                    return ""
+            return self._text({"n": " ", "t": " ", "r": ""}.get(seq[1], seq[1]))
+        if ch == "\\":
+            self.escape = ch
+            return ""
+        if ch == '"':
+            self.in_string = self.in_key = False
+            return ""
+        return self._text(ch)
+
+    def _text(self, ch: str) -> str:
+        if self.in_key:
+            self.key += ch
+            return ""
+        return ch
+
+
+def generate_structured_metadata(caption: str, media_type: str,
+                                 on_delta: Callable[[str, str], None] | None = None,
+                                 finalize: bool = True) -> dict:
+    """
+    Один запрос к LLM за JSON {title, description, keywords}.
+    Поля, не прошедшие validate_metadata, переспрашиваются отдельно (llm.structured_retries раз),
+    а если и это не помогло — берутся из обычных промптов generate_title/description/keywords.
+    on_delta(field, text) получает текст полей по мере генерации (только первого запроса).
+    finalize=False — keywords как их вернула LLM, без finalize_keywords.
+    """
+    pending = list(METADATA_FIELDS)
+    data = {}
+    on_token = JsonFieldStream(on_delta).feed if on_delta else None
+    for _ in range(1 + get_config().llm_structured_retries):
+        raw = call_ollama(LLM_MODEL, _structured_prompt(caption, pending), format="json", on_token=on_token)
+        on_token = None
+        try:
+            answer = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            answer = {}
+        if not isinstance(answer, dict):
+            answer = {}
+        failed = validate_metadata(answer, pending)
+        data.update({f: answer[f] for f in pending if f not in failed})
+        pending = failed
+        if not pending:
+            break
+    if pending:
+        print(f"⚠️ JSON-ответ без полей {pending}, добираем обычными промптами")
 
-def generate_metadata_with_prompt(caption: str, media_type: str = "image", callback=None) -> dict:
-    """Генерация метаданных (title, description, keywords) построчно с анимацией."""
     results = {}
+    if "title" in data:
+        results["title"] = _clean_title(data["title"], caption)
+    else:
+        results["title"] = generate_title(caption, media_type)
 
-    try:
-        # 1. Title
-        title = generate_title(caption, media_type)
-        if callback and title:
-            callback("title", title)
-        results["title"] = title
-
-        # 2. Description
-        desc = generate_description(caption, media_type)
-        themes = [t.strip().lower() for t in desc.split(",") if t.strip()]
-        desc = enrich_description_with_holidays(desc, themes)
-        if callback and desc:
-            callback("description", desc)
-        results["description"] = desc
-
-        # 3. Keywords
-        keywords = generate_keywords(caption, media_type)
-        keywords = enrich_keywords_with_holidays(keywords, themes)
-        if callback and keywords:
-            callback("keywords", ", ".join(keywords))
-        results["keywords"] = keywords
-
-        # 4. Category (сразу после keywords)
-        from services.category_service import detect_category
-        category = detect_category(keywords)
-        if callback and category:
-            callback("category", category)
-        results["category"] = category
-
-    except Exception as e:
-        print(f"❌ Ошибка в generate_metadata_with_prompt: {e}")
-
-    return results
\ No newline at end of file
+    if "description" in data:
+        results["description"] = _clean_description(data["description"], caption.strip())
+    else:
+        results["description"] = generate_description(caption, media_type)
+
+    if "keywords" in data:
+        llm_keywords = [k.strip().lower() for k in data["keywords"] if isinstance(k, str) and k.strip()]
+        results["keywords"] = finalize_keywords(caption, llm_keywords) if finalize else llm_keywords
+    else:
+        results["keywords"] = generate_keywords(caption, media_type, finalize=finalize)
+    return results
+
+
+def generate_metadata_with_prompt(caption: str, media_type: str = "image", callback=None) -> dict:
+    """
+    Генерация метаданных (title, description, keywords) для одного файла.
+    Запросы идут параллельно через LLM-стадию (services.llm_stage), каждое поле
+    отдаётся в callback по готовности.
+    """
+    from services.llm_stage import generate_metadata_many
+    return generate_metadata_many([(caption, media_type, callback)])[0]
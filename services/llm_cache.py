@@ -0,0 +1,163 @@
+"""
+Кэш ответов LLM: ключ — отпечаток (модель, нормализованный промпт, options, format, версия).
+Два уровня: LRU в памяти и SQLite на диске. Записи живут ttl секунд;
+смена текста шаблона меняет сам промпт, а llm.cache.version сбрасывает кэш целиком
+(например, после правок пост-обработки ответа).
+"""
+import atexit
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# обращения к диску (last_access) пишутся пачкой, а не commit на каждое попадание
+TOUCH_BATCH = 64
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Пробелы/переводы строк не влияют на ключ: 'a  b\\n' и 'a b' — один промпт."""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def prompt_fingerprint(model: str, prompt: str, options: dict | None = None,
+                       format: str | dict | None = None, version: str = "1") -> str:
+    payload = {
+        "model": model,
+        "prompt": normalize_prompt(prompt),
+        "options": options or {},
+        "format": format,
+        "version": version,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str | Path, version: str = "1", ttl: float = 30 * 86400,
+                 memory_items: int = 2048, max_entries: int = 200_000):
+        self.version = str(version)
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._touched: dict[str, float] = {}
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS llm_response (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            version TEXT NOT NULL,
+            created REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS llm_response_last_access ON llm_response(last_access);
+        -- число записей держат триггеры: put() не считает COUNT(*) по всей таблице
+        CREATE TABLE IF NOT EXISTS llm_response_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            entries INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO llm_response_totals(id, entries) SELECT 1, COUNT(*) FROM llm_response;
+        CREATE TRIGGER IF NOT EXISTS llm_response_totals_insert AFTER INSERT ON llm_response BEGIN
+            UPDATE llm_response_totals SET entries = entries + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS llm_response_totals_delete AFTER DELETE ON llm_response BEGIN
+            UPDATE llm_response_totals SET entries = entries - 1 WHERE id = 1;
+        END;
+        """)
+        # записи других версий и просроченные больше никогда не совпадут — чистим сразу
+        self.conn.execute(
+            "DELETE FROM llm_response WHERE version != ? OR created < ?",
+            (self.version, time.time() - self.ttl)
+        )
+        self.conn.commit()
+        atexit.register(self.flush)
+
+    def key(self, model: str, prompt: str, options: dict | None = None,
+            format: str | dict | None = None) -> str:
+        return prompt_fingerprint(model, prompt, options, format, self.version)
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+            row = self.conn.execute(
+                "SELECT response, created FROM llm_response WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] < self.ttl:
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH:
+                    self._flush_touched()
+                    self.conn.commit()
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._touched.pop(key, None)
+            self._flush_touched()  # LRU-порядок для вытеснения — с учётом последних попаданий
+            # upsert, а не INSERT OR REPLACE: при REPLACE триггер удаления не срабатывает
+            self.conn.execute(
+                "INSERT INTO llm_response(key, response, version, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET response = excluded.response, "
+                "version = excluded.version, created = excluded.created, last_access = excluded.last_access",
+                (key, response, self.version, now, now)
+            )
+            count = self.conn.execute("SELECT entries FROM llm_response_totals WHERE id = 1").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM llm_response WHERE key IN "
+                    "(SELECT key FROM llm_response ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.conn.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self.conn.executemany("UPDATE llm_response SET last_access = ? WHERE key = ?",
+                                  [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Дописать отложенные last_access (при выходе)."""
+        with self._lock:
+            self._flush_touched()
+            self.conn.commit()
+
+    def _remember(self, key: str, response: str, created: float):
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
@@ -0,0 +1,150 @@
+"""
+Клиент к локальному Ollama по HTTP API (/api/generate) вместо `ollama run`
+на каждый промпт: keep-alive соединения из общего пула (pool_size = llm.concurrency),
+переживающего потоки и event loop'ы LLM-стадии, модель остаётся
+загруженной на сервере (keep_alive), таймауты и options — из config.yaml.
+С on_token ответ читается потоком (stream=true): каждый токен уходит
+в on_token сразу, как его сгенерировала модель.
+"""
+import json
+from functools import lru_cache
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from adapters.config_loader import get_config
+from services.llm_cache import LLMCache
+
+
+class OllamaError(RuntimeError):
+    """Ollama недоступен или вернул ошибку."""
+
+
+class OllamaClient:
+    def __init__(self, host: str = "http://127.0.0.1:11434", keep_alive: str | int = "30m",
+                 timeout: float = 120, connect_timeout: float = 5,
+                 options: dict | None = None, pool_size: int = 4,
+                 cache: LLMCache | None = None):
+        self.host = host.rstrip("/")
+        self.cache = cache
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, timeout)
+        self.options = options or {}
+        self.pool_size = pool_size
+        # одна сессия на все потоки: запросы с общими заголовками и без cookies ей не мешают,
+        # а пул urllib3 потокобезопасен — соединения переиспользуются между пачками
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, model: str, prompt: str, options: dict | None, stream: bool, **extra) -> dict:
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, **(options or {})},
+        }
+        payload.update({k: v for k, v in extra.items() if v is not None})
+        return payload
+
+    def generate(self, model: str, prompt: str, options: dict | None = None,
+                 format: str | dict | None = None, timeout: float | None = None,
+                 on_token: Callable[[str], None] | None = None) -> str:
+        """
+        Полный ответ модели одной строкой (повторный промпт берётся из кэша).
+        on_token получает куски ответа по мере генерации; ответ из кэша — одним куском.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(model, prompt, {**self.options, **(options or {})}, format)
+            cached = self.cache.get(key)
+            if cached is not None:
+                if on_token:
+                    on_token(cached)
+                return cached
+
+        if on_token:
+            response = self._stream(model, prompt, options, format, timeout, on_token)
+        else:
+            response = self._generate(model, prompt, options, format, timeout)
+        if key is not None and response:
+            self.cache.put(key, response)
+        return response
+
+    def cache_stats(self) -> dict:
+        """Hit-rate кэша ответов (пустой dict, если кэш выключен)."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def _generate(self, model: str, prompt: str, options: dict | None,
+                  format: str | dict | None, timeout: float | None) -> str:
+        try:
+            resp = self.session.post(
+                f"{self.host}/api/generate",
+                json=self._payload(model, prompt, options, stream=False, format=format),
+                timeout=(self.timeout[0], timeout) if timeout else self.timeout,
+            )
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama недоступен ({self.host}): {e}") from e
+        if resp.status_code != 200:
+            raise OllamaError(f"Ollama {resp.status_code}: {resp.text[:200]}")
+        try:
+            return resp.json().get("response", "").strip()
+        except ValueError as e:
+            raise OllamaError(f"Ollama вернул не JSON: {resp.text[:200]}") from e
+
+    def _stream(self, model: str, prompt: str, options: dict | None,
+                format: str | dict | None, timeout: float | None,
+                on_token: Callable[[str], None]) -> str:
+        # timeout здесь — пауза между токенами, а не время всего ответа
+        chunks = []
+        try:
+            with self.session.post(
+                f"{self.host}/api/generate",
+                json=self._payload(model, prompt, options, stream=True, format=format),
+                timeout=(self.timeout[0], timeout) if timeout else self.timeout,
+                stream=True,
+            ) as resp:
+                if resp.status_code != 200:
+                    raise OllamaError(f"Ollama {resp.status_code}: {resp.text[:200]}")
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        part = json.loads(line)
+                    except ValueError as e:
+                        raise OllamaError(f"Ollama вернул не JSON: {line[:200]!r}") from e
+                    if part.get("error"):
+                        raise OllamaError(f"Ollama: {part['error']}")
+                    token = part.get("response", "")
+                    if token:
+                        chunks.append(token)
+                        on_token(token)
+                    if part.get("done"):
+                        break
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama недоступен ({self.host}): {e}") from e
+        return "".join(chunks).strip()
+
+
+@lru_cache(maxsize=1)
+def get_client() -> OllamaClient:
+    """Общий клиент для всех сервисов."""
+    config = get_config()
+    return OllamaClient(
+        host=config.llm_host,
+        keep_alive=config.llm_keep_alive,
+        timeout=config.llm_timeout,
+        connect_timeout=config.llm_connect_timeout,
+        options=config.llm_options,
+        pool_size=config.llm_concurrency,
+        cache=LLMCache(
+            config.llm_cache_path,
+            version=config.llm_cache_version,
+            ttl=config.llm_cache_ttl,
+            memory_items=config.llm_cache_memory_items,
+            max_entries=config.llm_cache_max_entries,
+        ) if config.llm_cache_enabled else None,
+    )
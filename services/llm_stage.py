@@ -0,0 +1,122 @@
+"""
+Асинхронная LLM-стадия: title, description и keywords одного файла
+запрашиваются одновременно, и одновременно в работе несколько файлов.
+Общий лимит запросов к Ollama — llm.concurrency (под OLLAMA_NUM_PARALLEL сервера).
+title и description уходят в callback сразу, как только готовы; keywords
+(и category) — как только у файла готовы ключи и описание: политика ключей
+и поиск по словарю Getty идут по файлу, не дожидаясь остальных файлов пачки.
+
+Контракт callback(field, value):
+    "title.delta" / "description.delta" / "keywords.delta" — очередной кусок текста
+        поля прямо из потока модели (дописывать к уже показанному);
+    "title" / "description" / "keywords" / "category" — итоговое значение после
+        очистки и обогащения (заменяет накопленные куски).
+В результате, кроме полей, — "categories": категории всех стоков (services.category_service)
+и "disambiguations": ключи, найденные в словаре Getty (services.disambiguation_service).
+"""
+import asyncio
+from typing import Callable, Optional
+
+from adapters.config_loader import get_config
+from services.description_service import enrich_description_with_holidays
+from services.keyword_policy import get_policy
+from services.keyword_service import (
+    generate_description,
+    generate_keywords,
+    generate_structured_metadata,
+    generate_title,
+)
+
+Callback = Optional[Callable[[str, str], None]]
+
+
+async def _file_metadata(caption: str, media_type: str, callback: Callback,
+                         limit: asyncio.Semaphore, holidays: dict[tuple, list[str]]) -> dict:
+    """
+    Все LLM-запросы одного файла; holiday-обогащение описания ждёт только description,
+    политика ключей — keywords и темы описания (для праздников).
+    holidays — общий кэш праздников пачки (трогается только из потока event loop).
+    """
+    from services.category_service import stock_categories
+    from services.disambiguation_service import disambiguate_many
+
+    results = {}
+
+    async def llm(fn, *args, **kwargs):
+        async with limit:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def delta(field: str):
+        return (lambda text: callback(f"{field}.delta", text)) if callback else None
+
+    def done(value) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        return future
+
+    try:
+        if get_config().llm_mode == "structured":
+            on_delta = (lambda field, text: callback(f"{field}.delta", text)) if callback else None
+            structured = await llm(generate_structured_metadata, caption, media_type,
+                                   on_delta=on_delta, finalize=False)
+            title_task = done(structured["title"])
+            desc_task = done(structured["description"])
+            kw_task = done(structured["keywords"])
+        else:
+            title_task = asyncio.create_task(llm(generate_title, caption, media_type, on_token=delta("title")))
+            desc_task = asyncio.create_task(llm(generate_description, caption, media_type, on_token=delta("description")))
+            kw_task = asyncio.create_task(llm(generate_keywords, caption, media_type, on_token=delta("keywords"),
+                                              finalize=False))
+
+        async def title_stage():
+            _emit(results, callback, "title", await title_task)
+
+        async def description_stage() -> list[str]:
+            desc = await desc_task
+            themes = [t.strip().lower() for t in desc.split(",") if t.strip()]
+            _emit(results, callback, "description", enrich_description_with_holidays(desc, themes))
+            return themes
+
+        themes_task = asyncio.create_task(description_stage())
+
+        async def keywords_stage():
+            raw = await kw_task
+            themes = await themes_task
+            # ответ LLM + caption + праздники по темам описания → итоговые ключи, сразу по готовности файла
+            _emit(results, callback, "keywords", get_policy().apply_many([(caption, raw, themes)], holidays)[0])
+            # ключи → термины словаря Getty (LRU словаря общий для всех файлов)
+            results["disambiguations"] = (await asyncio.to_thread(disambiguate_many, [results["keywords"]]))[0]
+            # категории всех стоков считаются здесь один раз и дальше только переиспользуются
+            results["categories"] = stock_categories(results["keywords"])
+            _emit(results, callback, "category", results["categories"]["shutterstock"]["category"])
+
+        await asyncio.gather(title_stage(), themes_task, keywords_stage())
+    except Exception as e:
+        print(f"❌ Ошибка в LLM-стадии: {e}")
+
+    return results
+
+
+def _emit(results: dict, callback: Callback, field: str, value):
+    results[field] = value
+    if callback and value:
+        callback(field, ", ".join(value) if isinstance(value, list) else value)
+
+
+async def run_metadata_stage(jobs: list[tuple[str, str, Callback]],
+                             concurrency: int | None = None) -> list[dict]:
+    """jobs — (caption, media_type, callback); результаты в том же порядке."""
+    limit = asyncio.Semaphore(concurrency or get_config().llm_concurrency)
+    holidays: dict[tuple, list[str]] = {}
+    return list(await asyncio.gather(*(
+        _file_metadata(caption, media_type, callback, limit, holidays)
+        for caption, media_type, callback in jobs
+    )))
+
+
+def generate_metadata_many(jobs: list[tuple[str, str, Callback]],
+                           concurrency: int | None = None) -> list[dict]:
+    """Синхронная обёртка для воркеров (Qt, TaskQueue): своя event loop на вызов."""
+    if not jobs:
+        return []
+    return asyncio.run(run_metadata_stage(jobs, concurrency))
@@ -0,0 +1,179 @@
+"""
+Реестр моделей: ленивая загрузка при первом обращении, прогрев в фоне
+и выгрузка после простоя (models.idle_timeout в config.yaml).
+"""
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+from adapters.config_loader import get_config
+
+try:
+    import psutil
+except ImportError:  # psutil необязателен: без него просто не будет RSS
+    psutil = None
+
+
+def _rss_bytes() -> Optional[int]:
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+@dataclass
+class ModelSlot:
+    loader: Callable[[], Any]
+    unloader: Optional[Callable[[Any], None]] = None
+    instance: Any = None
+    users: int = 0
+    last_used: float = 0.0
+    load_time: Optional[float] = None
+    rss_bytes: Optional[int] = None
+    loads: int = 0
+    # один загрузчик на модель; общий замок реестра на время загрузки не держится
+    load_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class ModelRegistry:
+    """Держит модели в памяти только пока ими пользуются."""
+
+    def __init__(self, idle_timeout: float = 600):
+        self.idle_timeout = idle_timeout
+        self._slots: dict[str, ModelSlot] = {}
+        self._lock = threading.RLock()
+        self._reaper: threading.Thread | None = None
+
+    def register(self, name: str, loader: Callable[[], Any],
+                 unloader: Optional[Callable[[Any], None]] = None):
+        """Регистрируем загрузчик; сама модель не грузится."""
+        with self._lock:
+            self._slots[name] = ModelSlot(loader=loader, unloader=unloader)
+
+    def _acquire(self, name: str, hold: bool) -> Any:
+        """
+        Возвращает модель, загружая её при первом обращении; hold=True — ещё и
+        отмечает пользователя (под тем же замком, что и публикация, чтобы
+        reaper не выгрузил модель между загрузкой и use).
+        Загрузка идёт под замком слота, а не реестра: stats(), другие модели
+        и reaper не ждут, пока BLIP грузится несколько секунд.
+        """
+        with self._lock:
+            slot = self._slots[name]
+            if slot.instance is not None:
+                return self._touch(slot, hold)
+        with slot.load_lock:
+            with self._lock:
+                if slot.instance is not None:  # загрузил параллельный поток
+                    return self._touch(slot, hold)
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            instance = slot.loader()
+            load_time = time.perf_counter() - start
+            rss_after = _rss_bytes()
+            with self._lock:
+                slot.instance = instance
+                slot.load_time = load_time
+                slot.rss_bytes = rss_after - rss_before if rss_before is not None else None
+                slot.loads += 1
+                self._ensure_reaper()
+                instance = self._touch(slot, hold)
+        print(f"✅ Модель {name} загружена за {load_time:.1f} sec")
+        return instance
+
+    @staticmethod
+    def _touch(slot: ModelSlot, hold: bool) -> Any:
+        slot.last_used = time.monotonic()
+        if hold:
+            slot.users += 1
+        return slot.instance
+
+    def get(self, name: str) -> Any:
+        """Возвращает модель, загружая её при первом обращении."""
+        return self._acquire(name, hold=False)
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """Модель не будет выгружена, пока блок with не завершится."""
+        instance = self._acquire(name, hold=True)
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                slot = self._slots[name]
+                slot.users -= 1
+                slot.last_used = time.monotonic()
+
+    def prewarm(self, name: str) -> threading.Thread:
+        """Загружаем модель в фоне, не блокируя вызывающий поток."""
+        def warm():
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"⚠️ Не удалось прогреть модель {name}: {e}")
+
+        thread = threading.Thread(target=warm, name=f"prewarm-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, name: str) -> bool:
+        """Выгружает модель, если она сейчас никем не используется."""
+        with self._lock:
+            slot = self._slots[name]
+            if slot.instance is None or slot.users > 0:
+                return False
+            instance, slot.instance = slot.instance, None
+        if slot.unloader:
+            slot.unloader(instance)
+        del instance
+        gc.collect()
+        print(f"♻️ Модель {name} выгружена после простоя")
+        return True
+
+    def unload_idle(self):
+        """Выгружает все модели, простоявшие дольше idle_timeout."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                name for name, slot in self._slots.items()
+                if slot.instance is not None and slot.users == 0
+                and now - slot.last_used >= self.idle_timeout
+            ]
+        for name in idle:
+            self.unload(name)
+
+    def _ensure_reaper(self):
+        if self.idle_timeout <= 0 or self._reaper is not None:
+            return
+
+        def reap():
+            while True:
+                time.sleep(min(self.idle_timeout / 4, 30))
+                self.unload_idle()
+                with self._lock:
+                    if all(slot.instance is None for slot in self._slots.values()):
+                        self._reaper = None
+                        return
+
+        self._reaper = threading.Thread(target=reap, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> dict[str, dict]:
+        """Время загрузки и резидентная память (RSS) по каждой модели."""
+        with self._lock:
+            return {
+                name: {
+                    "loaded": slot.instance is not None,
+                    "in_use": slot.users,
+                    "loads": slot.loads,
+                    "load_time_sec": slot.load_time,
+                    "rss_mb": slot.rss_bytes / 2**20 if slot.rss_bytes is not None else None,
+                    "idle_sec": time.monotonic() - slot.last_used if slot.last_used else None,
+                }
+                for name, slot in self._slots.items()
+            }
+
+
+registry = ModelRegistry(idle_timeout=get_config().models_idle_timeout)
@@ -0,0 +1,63 @@
+"""
+OCR как отдельная стадия пайплайна: работает в пуле потоков параллельно с BLIP
+и пропускает Tesseract на картинках, где текста скорее всего нет.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageFilter
+
+from adapters.config_loader import get_config
+
+_config = get_config()
+if _config.ocr_tesseract_cmd:
+    pytesseract.pytesseract.tesseract_cmd = _config.ocr_tesseract_cmd
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def has_text(image: Image.Image) -> bool:
+    """
+    Дешёвая проверка на наличие текста: плотность контрастных границ
+    на уменьшенной ч/б копии. Текст даёт густые границы хотя бы в одном
+    фрагменте кадра, гладкие фото (небо, студийный фон, портрет) — нет.
+    """
+    size = _config.ocr_precheck_size
+    small = image.convert("L")
+    small.thumbnail((size, size))
+    edges = np.asarray(small.filter(ImageFilter.FIND_EDGES), dtype=np.uint8)
+    # рамка FIND_EDGES всегда яркая — отрезаем по пикселю с каждой стороны
+    mask = edges[1:-1, 1:-1] > _config.ocr_precheck_edge_threshold
+
+    h, w = mask.shape
+    tile = max(8, min(h, w) // 8)
+    best = 0.0
+    for y in range(0, h - tile + 1, tile):
+        for x in range(0, w - tile + 1, tile):
+            best = max(best, float(mask[y:y + tile, x:x + tile].mean()))
+    return best >= _config.ocr_precheck_min_density
+
+
+def run_ocr(image: Image.Image) -> str:
+    """Распознаём текст/цифры; без текста по pre-check возвращаем пустую строку."""
+    if not _config.ocr_enabled:
+        return ""
+    if _config.ocr_precheck_enabled and not has_text(image):
+        return ""
+    try:
+        return pytesseract.image_to_string(image, config=_config.ocr_tesseract_config).strip()
+    except Exception as e:
+        print(f"⚠️ OCR не сработал: {e}")
+        return ""
+
+
+def submit_ocr(image: Image.Image) -> Future:
+    """Ставит OCR картинки в пул; результат забираем после BLIP."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_config.ocr_workers, thread_name_prefix="ocr")
+    return _executor.submit(run_ocr, image)
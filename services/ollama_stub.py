@@ -0,0 +1,120 @@
+"""
+Локальная подмена Ollama HTTP API для тестов и отладки без модели.
+Отвечает на /api/generate (обычный и stream-режим) и /api/tags
+детерминированными ответами по типу промпта: title / description / keywords.
+
+Запуск:
+    python -m services.ollama_stub --port 11434
+В коде:
+    server, url = start_stub_server()   # порт выбирается свободный
+    ...
+    server.shutdown()
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_KEYWORDS = [
+    "dog", "puppy", "pet", "animal", "cute", "domestic", "home", "cozy", "sofa",
+    "christmas", "holiday", "festive", "winter", "celebration", "decoration",
+    "santa hat", "living room", "happy pet", "family", "warm", "indoor", "comfort",
+]
+
+
+def stub_response(prompt: str) -> str:
+    """Ответ-заглушка, похожий по форме на то, что возвращает gemma."""
+    caption = re.search(r"Caption[^:]*:\s*(.+)", prompt)
+    caption = caption.group(1).strip() if caption else "dog sitting on sofa"
+    lowered = prompt.lower()
+    if "json" in lowered:
+        return json.dumps({
+            "title": "Cute dog resting on cozy sofa at home during winter holidays",
+            "description": f"{caption}, pet at home, cozy interior, winter holidays",
+            "keywords": STUB_KEYWORDS,
+        })
+    if "keywords" in lowered:
+        return ", ".join(STUB_KEYWORDS)
+    if "description" in lowered:
+        return f"{caption}, pet at home, cozy interior, winter holidays"
+    if "title" in lowered:
+        return "Cute dog resting on cozy sofa at home during winter holidays"
+    return caption
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего Ollama
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict | None = None, raw: bytes | None = None,
+                   content_type: str = "application/json"):
+        data = raw if raw is not None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "gemma2:2b"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests.append(request)
+        self.server.connections.add(self.client_address)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        text = stub_response(request.get("prompt", ""))
+        model = request.get("model", "")
+        if not request.get("stream", True):
+            self._send_json(200, {"model": model, "response": text, "done": True})
+            return
+
+        # stream: NDJSON по токену (слову) на строку, как /api/generate у Ollama
+        tokens = re.findall(r"\S+\s*", text)
+        lines = [json.dumps({"model": model, "response": t, "done": False}) for t in tokens]
+        lines.append(json.dumps({"model": model, "response": "", "done": True}))
+        self._send_json(200, raw=("\n".join(lines) + "\n").encode("utf-8"),
+                        content_type="application/x-ndjson")
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0,
+                      delay: float = 0.0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Поднимает заглушку в фоновом потоке.
+    server.requests — все принятые запросы, server.connections — уникальные
+    (host, port) клиентов: по нему видно, переиспользуются ли соединения.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.connections = set()
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Ollama HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--delay", type=float, default=0.0, help="искусственная задержка ответа, сек")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.host, args.port, args.delay)
+    print(f"🧪 Заглушка Ollama слушает {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,361 @@
+"""
+BLIP-base в ONNX Runtime для CPU: экспорт vision-энкодера и текстового декодера
+в ONNX, int8 dynamic quantization и своё декодирование (greedy / beam search).
+Декодер экспортируется с KV-кэшем: каждый шаг считает только новый токен,
+K/V картинки для cross-attention считаются один раз; лучи beam search
+всех картинок пачки идут через декодер одним батчем.
+
+Экспорт (нужен torch, делается один раз):
+    python -m services.onnx_caption export
+"""
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from adapters.config_loader import get_config
+
+VISION_FILE = "vision_encoder.onnx"
+# текстовый декодер с KV-кэшем: prefill считает K/V картинки для cross-attention
+# и первый токен, step — один новый токен поверх прошлых K/V (без пересчёта префикса)
+PREFILL_FILE = "text_decoder_prefill.onnx"
+STEP_FILE = "text_decoder_step.onnx"
+
+
+def _quantized(path: Path) -> Path:
+    return path.with_name(path.stem + ".int8.onnx")
+
+
+def _decoder_step_module(decoder):
+    """
+    Шаг текстового декодера BLIP (BlipTextLMHeadModel), собранный из его же слоёв,
+    с явным KV-кэшем в виде тензоров — такой граф экспортируется в ONNX одинаково
+    на любых версиях transformers.
+
+    past  — [слои, 2 (K/V), строки, головы, прошлые токены, размер головы];
+    cross — K/V cross-attention [слои, 2, картинки, головы, патчи, размер головы],
+    одна копия на картинку: строки картинки (лучи beam search) идут подряд.
+    """
+    import math
+    import torch
+
+    if getattr(decoder.config, "position_embedding_type", "absolute") != "absolute":
+        raise ValueError("экспорт с KV-кэшем поддерживает только absolute position embeddings")
+
+    class DecoderStep(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.bert = decoder.bert
+            self.cls = decoder.cls
+            attention = self.bert.encoder.layer[0].attention.self
+            self.heads = attention.num_attention_heads
+            self.head_size = attention.attention_head_size
+
+        def split(self, x):
+            # [N, T, H*D] → [N, H, T, D]
+            return x.reshape(x.size(0), x.size(1), self.heads, self.head_size).transpose(1, 2)
+
+        def attend(self, query, key, value):
+            scores = query @ key.transpose(-1, -2) / math.sqrt(self.head_size)
+            return torch.softmax(scores, dim=-1) @ value
+
+        def cross_kv(self, encoder_hidden_states):
+            return torch.stack([
+                torch.stack([
+                    self.split(layer.crossattention.self.key(encoder_hidden_states)),
+                    self.split(layer.crossattention.self.value(encoder_hidden_states)),
+                ])
+                for layer in self.bert.encoder.layer
+            ])
+
+        def forward(self, input_ids, position_ids, past, cross):
+            embeddings = self.bert.embeddings
+            hidden = embeddings.LayerNorm(
+                embeddings.word_embeddings(input_ids) + embeddings.position_embeddings(position_ids)
+            )
+            rows, images = input_ids.size(0), cross.size(2)
+            presents = []
+            for i, layer in enumerate(self.bert.encoder.layer):
+                attention = layer.attention.self
+                query = self.split(attention.query(hidden))
+                key = self.split(attention.key(hidden))
+                value = self.split(attention.value(hidden))
+                if past is not None:
+                    key = torch.cat([past[i, 0], key], dim=2)
+                    value = torch.cat([past[i, 1], value], dim=2)
+                presents.append(torch.stack([key, value]))
+                context = self.attend(query, key, value).transpose(1, 2).reshape(rows, 1, -1)
+                hidden = layer.attention.output(context, hidden)
+
+                # cross-attention: строки одной картинки — одним запросом к её K/V
+                query = self.split(layer.crossattention.self.query(hidden))
+                query = query.reshape(images, -1, self.heads, self.head_size).transpose(1, 2)
+                context = self.attend(query, cross[i, 0], cross[i, 1]).transpose(1, 2).reshape(rows, 1, -1)
+                hidden = layer.crossattention.output(context, hidden)
+
+                hidden = layer.output(layer.intermediate(hidden), hidden)
+            return self.cls(hidden)[:, -1, :], torch.stack(presents)
+
+    return DecoderStep()
+
+
+def export_blip_onnx(model_name: str, out_dir: str | Path, quantize: bool = True) -> Path:
+    """Экспортирует BLIP в три ONNX-графа (+ int8-копии) и сохраняет processor рядом."""
+    import torch
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    processor = BlipProcessor.from_pretrained(model_name)
+    model = BlipForConditionalGeneration.from_pretrained(model_name, torch_dtype=torch.float32).eval()
+
+    class VisionEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.vision = model.vision_model
+
+        def forward(self, pixel_values):
+            return self.vision(pixel_values=pixel_values, return_dict=False)[0]
+
+    step = _decoder_step_module(model.text_decoder).eval()
+
+    class Prefill(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.step = step
+
+        def forward(self, input_ids, encoder_hidden_states):
+            cross = self.step.cross_kv(encoder_hidden_states)
+            logits, present = self.step(input_ids, torch.zeros_like(input_ids), None, cross)
+            return logits, present, cross
+
+    class Step(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.step = step
+
+        def forward(self, input_ids, position_ids, past, cross):
+            return self.step(input_ids, position_ids, past, cross)
+
+    size = processor.image_processor.size["height"]
+    pixel_values = torch.zeros(1, 3, size, size)
+    bos_id = model.config.text_config.bos_token_id
+    with torch.no_grad():
+        image_embeds = model.vision_model(pixel_values=pixel_values, return_dict=False)[0]
+
+        # шаги с кэшем должны давать те же logits, что полный проход декодера transformers
+        prefix = torch.tensor([[bos_id, 1000, 2000]])
+        reference = model.text_decoder(input_ids=prefix, attention_mask=torch.ones_like(prefix),
+                                       encoder_hidden_states=image_embeds, return_dict=False)[0]
+        logits, past, cross = Prefill()(prefix[:, :1], image_embeds)
+        steps = [logits]
+        for position in (1, 2):
+            logits, past = Step()(prefix[:, position:position + 1], torch.tensor([[position]]), past, cross)
+            steps.append(logits)
+        error = (torch.stack(steps, dim=1) - reference).abs().max().item()
+        if error > 1e-3:
+            raise RuntimeError(f"декодер с KV-кэшем расходится с transformers (max |Δlogit| = {error:.2e})")
+
+        torch.onnx.export(
+            VisionEncoder(), (pixel_values,), out_dir / VISION_FILE,
+            input_names=["pixel_values"], output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=17,
+        )
+        torch.onnx.export(
+            Prefill(), (prefix[:, :1], image_embeds), out_dir / PREFILL_FILE,
+            input_names=["input_ids", "encoder_hidden_states"], output_names=["logits", "present", "cross"],
+            dynamic_axes={
+                "input_ids": {0: "images"},
+                "encoder_hidden_states": {0: "images", 1: "patches"},
+                "logits": {0: "images"},
+                "present": {2: "images"},
+                "cross": {2: "images", 4: "patches"},
+            },
+            opset_version=17,
+        )
+        # пример с двумя строками на картинку, чтобы reshape строк по картинкам не свернулся в константу
+        rows = 2
+        torch.onnx.export(
+            Step(),
+            (prefix[:, 1:2].repeat(rows, 1), torch.ones(rows, 1, dtype=torch.long),
+             past.repeat(1, 1, rows, 1, 1, 1), cross),
+            out_dir / STEP_FILE,
+            input_names=["input_ids", "position_ids", "past", "cross"], output_names=["logits", "present"],
+            dynamic_axes={
+                "input_ids": {0: "rows"},
+                "position_ids": {0: "rows"},
+                "past": {2: "rows", 4: "past"},
+                "cross": {2: "images", 4: "patches"},
+                "logits": {0: "rows"},
+                "present": {2: "rows", 4: "seq"},
+            },
+            opset_version=17,
+        )
+    processor.save_pretrained(out_dir)
+    model.config.text_config.save_pretrained(out_dir / "text_config")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        for name in (VISION_FILE, PREFILL_FILE, STEP_FILE):
+            quantize_dynamic(out_dir / name, _quantized(out_dir / name), weight_type=QuantType.QInt8)
+    print(f"✔ BLIP экспортирован в {out_dir}")
+    return out_dir
+
+
+def _log_softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    return logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+
+
+class OnnxBlipCaptioner:
+    """Тот же BLIP, но vision/decoder крутятся в onnxruntime на CPU."""
+
+    def __init__(self, model_dir: str | Path, quantize: bool = True, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import BlipProcessor
+
+        model_dir = Path(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        def session(name: str):
+            path = _quantized(model_dir / name) if quantize else model_dir / name
+            return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+        self.vision = session(VISION_FILE)
+        self.prefill = session(PREFILL_FILE)
+        self.step = session(STEP_FILE)
+        self.processor = BlipProcessor.from_pretrained(model_dir)
+        text_config = json.loads((model_dir / "text_config" / "config.json").read_text(encoding="utf-8"))
+        self.bos_id = text_config["bos_token_id"]
+        self.eos_id = text_config["sep_token_id"]
+        self.pad_id = text_config["pad_token_id"]
+
+    def _start(self, embeds: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Первый токен (bos) для каждой картинки → (log-вероятности, self K/V, cross K/V)."""
+        logits, past, cross = self.prefill.run(None, {
+            "input_ids": np.full((len(embeds), 1), self.bos_id, dtype=np.int64),
+            "encoder_hidden_states": embeds,
+        })
+        return _log_softmax(logits.astype(np.float32)), past, cross
+
+    def _next(self, tokens: np.ndarray, position: int, past: np.ndarray,
+              cross: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Один новый токен на строку поверх кэша → (log-вероятности следующего, новый кэш)."""
+        logits, past = self.step.run(None, {
+            "input_ids": tokens.astype(np.int64)[:, None],
+            "position_ids": np.full((len(tokens), 1), position, dtype=np.int64),
+            "past": np.ascontiguousarray(past),
+            "cross": np.ascontiguousarray(cross),
+        })
+        return _log_softmax(logits.astype(np.float32)), past
+
+    def _greedy(self, embeds: np.ndarray, max_length: int, min_length: int) -> list[list[int]]:
+        logprobs, past, cross = self._start(embeds)
+        sequences = [[self.bos_id] for _ in range(len(embeds))]
+        alive = np.arange(len(embeds))  # картинки, чей caption ещё не закончился
+        length = 1
+        while True:
+            if length < min_length:
+                logprobs[:, self.eos_id] = -np.inf
+            next_ids = logprobs.argmax(axis=-1)
+            for image, token in zip(alive, next_ids):
+                sequences[image].append(int(token))
+            length += 1
+            keep = next_ids != self.eos_id
+            if length >= max_length or not keep.any():
+                return sequences
+            # дописавшие caption выходят из батча вместе со своим кэшем
+            alive, next_ids = alive[keep], next_ids[keep]
+            past, cross = past[:, :, keep], cross[:, :, keep]
+            logprobs, past = self._next(next_ids, length - 1, past, cross)
+
+    def _beam(self, embeds: np.ndarray, num_beams: int, max_length: int,
+              min_length: int, length_penalty: float) -> list[list[int]]:
+        """
+        Beam search всей пачки: лучи всех картинок идут через декодер одним батчем
+        (строки картинки подряд), закончившие картинки выходят из батча.
+        """
+        logprobs, past, cross = self._start(embeds)
+        ids = np.full((len(embeds), 1), self.bos_id, dtype=np.int64)
+        scores = np.zeros(len(embeds), dtype=np.float32)
+        beams = 1  # на старте все лучи одинаковые — у картинки один живой луч
+        active = list(range(len(embeds)))
+        finished: list[list[tuple[float, list[int]]]] = [[] for _ in embeds]
+
+        while True:
+            length = ids.shape[1]
+            if length < min_length:
+                logprobs[:, self.eos_id] = -np.inf
+            vocab = logprobs.shape[1]
+            total = (scores[:, None] + logprobs).reshape(len(active), beams * vocab)
+            top = np.argpartition(-total, 2 * num_beams, axis=1)[:, :2 * num_beams]
+
+            rows, tokens, new_scores, still = [], [], [], []
+            for a, image in enumerate(active):
+                alive = []
+                for flat in top[a][np.argsort(-total[a, top[a]])]:
+                    beam, token = divmod(int(flat), vocab)
+                    row, score = a * beams + beam, float(total[a, flat])
+                    if token == self.eos_id:
+                        finished[image].append((score / (length + 1) ** length_penalty, ids[row].tolist() + [token]))
+                    else:
+                        alive.append((row, token, score))
+                    if len(alive) == num_beams:
+                        break
+
+                best_alive = alive[0][2] / (length + 1) ** length_penalty if alive else -np.inf
+                done = len(finished[image]) >= num_beams and max(f[0] for f in finished[image]) >= best_alive
+                if done or length + 1 >= max_length or len(alive) < num_beams:
+                    if not finished[image]:
+                        finished[image] = [(s / (length + 1) ** length_penalty, ids[r].tolist() + [t])
+                                           for r, t, s in alive]
+                    continue
+                still.append(a)
+                for row, token, score in alive:
+                    rows.append(row)
+                    tokens.append(token)
+                    new_scores.append(score)
+
+            if not still:
+                return [max(candidates, key=lambda c: c[0])[1] for candidates in finished]
+            active = [active[a] for a in still]
+            ids = np.concatenate([ids[rows], np.array(tokens, dtype=np.int64)[:, None]], axis=1)
+            scores = np.array(new_scores, dtype=np.float32)
+            past, cross = past[:, :, rows], cross[:, :, still]
+            beams = num_beams
+            logprobs, past = self._next(ids[:, -1], length, past, cross)
+
+    def generate(self, images: list, num_beams: int = 1, max_length: int = 150,
+                 min_length: int = 20, length_penalty: float = 1.0) -> list[str]:
+        pixel_values = self.processor(images=images, return_tensors="np")["pixel_values"].astype(np.float32)
+        embeds = self.vision.run(None, {"pixel_values": pixel_values})[0]
+        if num_beams <= 1:
+            sequences = self._greedy(embeds, max_length, min_length)
+        else:
+            sequences = self._beam(embeds, num_beams, max_length, min_length, length_penalty)
+        return self.processor.batch_decode(sequences, skip_special_tokens=True)
+
+
+def load_onnx_captioner(model_name: str) -> OnnxBlipCaptioner:
+    """Загрузчик для реестра моделей; при первом запуске экспортирует модель."""
+    config = get_config()
+    model_dir = Path(config.caption_onnx_dir)
+    if not (model_dir / STEP_FILE).exists():  # в том числе старый экспорт без KV-кэша
+        print(f"⚠️ ONNX-модель не найдена в {model_dir}, экспортируем (нужен torch)...")
+        export_blip_onnx(model_name, model_dir, quantize=config.caption_onnx_quantize)
+    return OnnxBlipCaptioner(model_dir, quantize=config.caption_onnx_quantize,
+                             threads=config.caption_onnx_threads)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["export"]:
+        from services.caption_service import BLIP_MODEL
+        cfg = get_config()
+        export_blip_onnx(BLIP_MODEL, cfg.caption_onnx_dir, quantize=cfg.caption_onnx_quantize)
+    else:
+        print("Использование: python -m services.onnx_caption export")
@@ -0,0 +1,128 @@
+"""
+Метаданные роликов (длительность, размер, fps, кодек, поворот) для многих файлов сразу.
+
+Результаты ffprobe лежат в SQLite-индексе по path+size+mtime: повторный запуск
+и UI читают их одним запросом, без процессов. Промахи пробуются параллельно
+пулом из video.probe_workers потоков — каждый ждёт свой ffprobe, так что
+одновременно запущено не больше probe_workers процессов.
+Ошибки тоже запоминаются: битый файл не пробуется заново, пока не изменится.
+"""
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+
+from adapters.config_loader import get_config
+from adapters.video_loader import VideoDecodeError, VideoInfo, probe
+
+MAX_PATHS_PER_QUERY = 500
+
+
+class ProbeIndex:
+    """path+size+mtime → VideoInfo (или текст ошибки ffprobe)."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS probe (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            info TEXT,
+            error TEXT
+        )
+        """)
+        self.conn.commit()
+
+    def get_many(self, stats: dict[str, os.stat_result]) -> dict[str, VideoInfo | VideoDecodeError]:
+        """Записи, совпадающие по size и mtime; устаревшие и отсутствующие не возвращаются."""
+        found = {}
+        paths = list(stats)
+        for start in range(0, len(paths), MAX_PATHS_PER_QUERY):
+            chunk = paths[start:start + MAX_PATHS_PER_QUERY]
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT path, size, mtime_ns, info, error FROM probe "
+                    "WHERE path IN (SELECT value FROM json_each(?))",
+                    (json.dumps(chunk),)
+                ).fetchall()
+            for path, size, mtime_ns, info, error in rows:
+                st = stats[path]
+                if (size, mtime_ns) != (st.st_size, st.st_mtime_ns):
+                    continue
+                found[path] = VideoDecodeError(error) if error is not None else VideoInfo(**json.loads(info))
+        return found
+
+    def put_many(self, results: dict[str, tuple[os.stat_result, VideoInfo | VideoDecodeError]]):
+        rows = [
+            (path, st.st_size, st.st_mtime_ns,
+             json.dumps(asdict(result)) if isinstance(result, VideoInfo) else None,
+             str(result) if isinstance(result, VideoDecodeError) else None)
+            for path, (st, result) in results.items()
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO probe(path, size, mtime_ns, info, error) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+
+def _probe(path: str) -> VideoInfo | VideoDecodeError:
+    try:
+        return probe(path)
+    except VideoDecodeError as e:
+        return e
+    except (ValueError, KeyError) as e:
+        return VideoDecodeError(f"{Path(path).name}: непонятный ответ ffprobe ({e})")
+
+
+def _probe_all(paths: list[Path], workers: int) -> dict[Path, VideoInfo | VideoDecodeError]:
+    stats: dict[str, os.stat_result] = {}
+    result: dict[Path, VideoInfo | VideoDecodeError] = {}
+    for path in paths:
+        try:
+            stats[os.path.abspath(path)] = os.stat(path)
+        except OSError as e:
+            result[path] = VideoDecodeError(f"{Path(path).name}: {e}")
+
+    found = probe_index.get_many(stats) if probe_index is not None else {}
+    missing = [path for path in stats if path not in found]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as pool:
+            probed = dict(zip(missing, pool.map(_probe, missing)))
+        if probe_index is not None:
+            probe_index.put_many({path: (stats[path], info) for path, info in probed.items()})
+        found.update(probed)
+
+    for path in paths:
+        result.setdefault(path, found.get(os.path.abspath(path)))
+    return result
+
+
+def probe_many(paths: list[Path], workers: int | None = None) -> dict[Path, VideoInfo | None]:
+    """
+    VideoInfo для каждого ролика (None — не читается ffprobe или файла нет).
+    Из индекса — сразу, остальные — параллельно, с записью в индекс.
+    """
+    probed = _probe_all(paths, workers or get_config().video_probe_workers)
+    return {path: info if isinstance(info, VideoInfo) else None for path, info in probed.items()}
+
+
+def probe_cached(path: Path) -> VideoInfo:
+    """Один ролик через индекс; ошибки ffprobe (в том числе запомненные) — VideoDecodeError."""
+    info = _probe_all([path], workers=1)[path]
+    if isinstance(info, VideoDecodeError):
+        raise info
+    return info
+
+
+_config = get_config()
+probe_index = ProbeIndex(_config.probe_cache_path) if _config.probe_cache_enabled else None
@@ -0,0 +1,214 @@
+"""
+Серии: почти одинаковые кадры (бёрсты, дубли) находим по перцептивному хэшу,
+кладём хэши в BK-дерево и кластеризуем соседей в пределах порога Хэмминга.
+Тяжёлая работа (caption + LLM) может выполняться один раз на серию,
+остальным файлам метаданные копируются с небольшой вариацией.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+
+from adapters.config_loader import get_config
+from adapters.image_loader import load_image
+from domain.models import MetadataEntity
+
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+VIDEO_EXT = {".mp4", ".mov", ".avi", ".mkv"}
+
+HASH_SIZE = 8
+_DCT_SIZE = HASH_SIZE * 4
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    m[0] /= np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def phash(image) -> int:
+    """64-битный pHash: DCT уменьшенной ч/б копии, биты — выше/ниже медианы."""
+    small = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE))
+    pixels = np.asarray(small, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """BK-дерево по расстоянию Хэмминга: поиск соседей без перебора всех хэшей."""
+
+    def __init__(self):
+        self.root = None  # (hash, [items], {distance: child})
+
+    def add(self, h: int, item):
+        if self.root is None:
+            self.root = (h, [item], {})
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, [item], {})
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> list:
+        """Все элементы с расстоянием ≤ radius."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                found.extend(node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return found
+
+
+@dataclass
+class SeriesMember:
+    series_id: str
+    leader: Path
+    index: int  # 0 — лидер серии (обрабатывается полностью)
+
+
+def media_hash(path: Path) -> int | None:
+    """pHash картинки или главного ключевого кадра видео."""
+    try:
+        if path.suffix.lower() in IMAGE_EXT:
+            return phash(load_image(path, 64))
+        if path.suffix.lower() in VIDEO_EXT:
+            # превью главного ключевого кадра; сцены остаются в LRU и при caption второй раз не ищутся
+            from services.keyframe_service import keyframes
+            main = keyframes(path).main
+            return phash(main.preview) if main else None
+    except Exception as e:
+        print(f"⚠️ Не удалось посчитать хэш {path.name}: {e}")
+    return None
+
+
+def detect_series(paths: list[Path], threshold: int | None = None) -> dict[Path, SeriesMember]:
+    """
+    Кластеризует почти-дубликаты (union-find по соседям из BK-дерева).
+    Возвращает только файлы из серий размером ≥ 2; лидер — первый файл серии по порядку.
+    Картинки и видео в одну серию не попадают.
+    Новый запуск — новые серии: лидеры прошлого запуска забываются.
+    """
+    with _leaders_lock:
+        _leaders.clear()
+    config = get_config()
+    if not config.series_enabled:
+        return {}
+    threshold = config.series_threshold if threshold is None else threshold
+
+    from services.probe_service import probe_many
+    probe_many([p for p in paths if p.suffix.lower() in VIDEO_EXT])  # все ffprobe разом, а не по одному в media_hash
+
+    parent = list(range(len(paths)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    trees = {"image": BKTree(), "video": BKTree()}
+    for i, path in enumerate(paths):
+        h = media_hash(path)
+        if h is None:
+            continue
+        tree = trees["video" if path.suffix.lower() in VIDEO_EXT else "image"]
+        for j in tree.search(h, threshold):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+        tree.add(h, i)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(paths)):
+        groups.setdefault(find(i), []).append(i)
+
+    members = {}
+    for root, idx in groups.items():
+        if len(idx) < 2:
+            continue
+        leader = paths[idx[0]]
+        series_id = "S" + hashlib.sha1(str(leader.resolve()).encode("utf-8")).hexdigest()[:8]
+        for n, i in enumerate(idx):
+            members[paths[i]] = SeriesMember(series_id=series_id, leader=leader, index=n)
+    print(f"🔗 Серий: {len({m.series_id for m in members.values()})}, файлов в сериях: {len(members)}")
+    return members
+
+
+# лидеры серий текущего запуска (detect_series очищает) — series_id по пути лидера
+# повторяется между запусками, и устаревший лидер иначе подменил бы упавший
+_leaders: dict[str, MetadataEntity] = {}
+_leaders_lock = threading.Lock()
+
+
+def remember_leader(series_id: str, meta: MetadataEntity):
+    if not meta.title:  # лидер упал — копировать нечего
+        return
+    with _leaders_lock:
+        _leaders[series_id] = meta
+
+
+def series_leader(series_id: str) -> MetadataEntity | None:
+    with _leaders_lock:
+        return _leaders.get(series_id)
+
+
+def is_copy(member: SeriesMember | None) -> bool:
+    """Файл — не лидер серии, и метаданные разрешено брать у лидера."""
+    return member is not None and member.index > 0 and get_config().series_share_metadata
+
+
+def propagate(member: SeriesMember, path: Path, callback=None) -> MetadataEntity | None:
+    """
+    Метаданные лидера для остальных файлов серии. Вариация: хвост ключевых
+    слов (после первых 10, самых релевантных) сдвигается на номер файла,
+    чтобы файлы серии не были полными клонами друг друга.
+    None — лидер не обработан (ошибка), файл надо обработать самостоятельно.
+    """
+    leader = series_leader(member.series_id)
+    if leader is None:
+        return None
+    keywords = leader.keywords or []
+    head, tail = keywords[:10], keywords[10:]
+    if tail:
+        shift = member.index % len(tail)
+        tail = tail[shift:] + tail[:shift]
+    meta = replace(
+        leader,
+        file=str(path),
+        keywords=head + tail,
+        flags=dict(leader.flags or {}),
+        series_id=member.series_id,
+    )
+    if callback:
+        for field in ("captions", "title", "description"):
+            value = "\n".join(meta.captions or []) if field == "captions" else getattr(meta, field)
+            if value:
+                callback(field, value)
+        callback("keywords", ", ".join(meta.keywords))
+        if meta.category:
+            callback("category", meta.category)
+        callback("flags", str(meta.flags))
+    return meta
@@ -3,15 +3,21 @@ import threading
 from pathlib import Path
 from typing import Callable
 
-from services.image_service import process_image
-from services.video_service import process_video
+from services.image_service import process_images
+from services.video_service import process_videos
+from services.caption_service import DEFAULT_BATCH_SIZE
+from services.series_service import detect_series
 from domain.models import MetadataEntity
 
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+VIDEO_EXT = {".mp4", ".mov", ".avi", ".mkv"}
+
 class TaskQueue:
     """Очередь задач атрибуции (последовательная работа с Ollama)."""
 
-    def __init__(self):
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
         self.queue = queue.Queue()
+        self.batch_size = batch_size
         self.results: list[MetadataEntity] = []
         self._worker_thread: threading.Thread | None = None
         self._running = False
@@ -29,22 +35,34 @@ class TaskQueue:
             return
         self._running = True
 
-        def worker():
-            while not self.queue.empty():
-                i, f = self.queue.get()
+        def next_batch() -> list[tuple[int, Path]]:
+            """Забираем из очереди до batch_size задач (микро-пачка для BLIP)."""
+            batch = []
+            while len(batch) < self.batch_size:
                 try:
-                    if f.suffix.lower() in [".jpg", ".jpeg", ".png", ".webp"]:
-                        meta = process_image(f)
-                    elif f.suffix.lower() in [".mp4", ".mov", ".avi", ".mkv"]:
-                        meta = process_video(f)
-                    else:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            return batch
+
+        def worker():
+            # серии ищем по всему, что уже стоит в очереди, до первой пачки
+            series = detect_series([f for _, f in list(self.queue.queue)])
+            while batch := next_batch():
+                images = [(i, f) for i, f in batch if f.suffix.lower() in IMAGE_EXT]
+                videos = [(i, f) for i, f in batch if f.suffix.lower() in VIDEO_EXT]
+                for tasks, process in ((images, process_images), (videos, process_videos)):
+                    if not tasks:
+                        continue
+                    try:
+                        metas = process([f for _, f in tasks], batch_size=self.batch_size, series=series)
+                    except Exception as e:
+                        print(f"❌ Ошибка при обработке пачки ({len(tasks)} файлов): {e}")
                         continue
-                except Exception as e:
-                    print(f"❌ Ошибка при обработке {f.name}: {e}")
-                    continue
 
-                self.results.append(meta)
-                callback(i, f.name, meta)
+                    for (i, f), meta in zip(tasks, metas):
+                        self.results.append(meta)
+                        callback(i, f.name, meta)
 
             self._running = False
 
@@ -1,26 +1,21 @@
-import subprocess
 import textwrap
 import datetime
 import re
 
+import requests
+
+from services.llm_client import OllamaError, get_client
+
 
 def call_ollama(model: str, prompt: str, timeout: int = 120) -> str:
     """Вызывает локальную модель Ollama и возвращает строковый ответ."""
     try:
-        result = subprocess.run(
-            ["ollama", "run", model],
-            input=prompt.encode("utf-8"),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=timeout,
-            check=True
-        )
-        return result.stdout.decode("utf-8").strip()
-    except subprocess.TimeoutExpired:
-        print("⚠️ Таймаут генерации, повтор...")
-        return ""
-    except subprocess.CalledProcessError as e:
-        print("❌ Ошибка Ollama:", e.stderr.decode("utf-8"))
+        return get_client().generate(model, prompt, timeout=timeout)
+    except OllamaError as e:
+        if isinstance(e.__cause__, requests.Timeout):
+            print("⚠️ Таймаут генерации, повтор...")
+        else:
+            print("❌ Ошибка Ollama:", e)
         return ""
 
 
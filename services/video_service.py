@@ -1,67 +1,103 @@
 from pathlib import Path
-import subprocess
 from domain.models import MetadataEntity
-from services.caption_service import generate_caption
+from services.caption_service import (
+    DEFAULT_BATCH_SIZE,
+    cached_caption,
+    generate_captions_for_images,
+    merge_captions,
+    store_caption,
+    video_cache_key,
+)
+from services.keyframe_service import caption_images, discard
+from services.probe_service import probe_many
 from services.keyword_service import generate_metadata_with_prompt
-from services.category_service import detect_category
+from services.llm_stage import generate_metadata_many
+from services.category_service import stock_categories
+from services.series_service import SeriesMember, is_copy, propagate, remember_leader
 
-CACHE_DIR = Path(".cache/frames")
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-
-def get_video_duration(path: Path) -> float:
-    try:
-        result = subprocess.run(
-            [
-                "ffprobe", "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                str(path)
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True
-        )
-        return float(result.stdout.strip())
-    except Exception:
-        return 0.0
-
-
-def extract_frames(path: Path, num_frames: int = 3) -> list[Path]:
-    duration = get_video_duration(path)
-    if duration <= 0:
-        return []
-    timestamps = [duration * i / (num_frames + 1) for i in range(1, num_frames + 1)]
-    frame_paths = []
-    for idx, ts in enumerate(timestamps, start=1):
-        frame_file = CACHE_DIR / f"{path.stem}_frame_{idx}.jpg"
+def caption_videos(paths: list[Path], batch_size: int = DEFAULT_BATCH_SIZE) -> dict[Path, str]:
+    """
+    Caption ролика по его ключевым кадрам (по кадру на сцену, см. keyframe_service):
+    кадры всех роликов пачки идут в BLIP вместе, caption кадров сливаются в один,
+    главная сцена первой. Моменты сцен берутся из LRU превью, если ролик уже показывали,
+    и в разрешении caption ролик декодируется один раз.
+    Ролики, которые не удалось прочитать, получают пустой caption.
+    """
+    captions: dict[Path, str] = {}
+    pending: list[tuple[Path, str | None, int]] = []
+    frames = []
+    probe_many(paths)  # метаданные всей пачки параллельно (или из индекса)
+    for path in paths:
+        key = video_cache_key(str(path))
+        cached = cached_caption(key)
+        if cached is not None:
+            captions[path] = cached
+            discard(path)
+            continue
         try:
-            subprocess.run(
-                [
-                    "ffmpeg", "-y",
-                    "-ss", str(ts),
-                    "-i", str(path),
-                    "-frames:v", "1",
-                    "-q:v", "2",
-                    str(frame_file)
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=True
-            )
-            if frame_file.exists():
-                frame_paths.append(frame_file)
+            frames_of_clip = caption_images(path)
         except Exception as e:
-            print(f"⚠️ Ошибка при извлечении кадра {idx}: {e}")
-    return frame_paths
+            print(f"⚠️ Ошибка при извлечении кадров {path.name}: {e}")
+            captions[path] = ""
+            continue
+        finally:
+            discard(path)
+        if not frames_of_clip:
+            captions[path] = ""
+            continue
+        # главная сцена первой — её caption открывает общий
+        ordered = sorted(frames_of_clip, key=lambda pair: -pair[0].weight)
+        pending.append((path, key, len(ordered)))
+        frames.extend(image for _, image in ordered)
+
+    if pending:
+        generated = iter(generate_captions_for_images(frames, batch_size=batch_size))
+        for path, key, count in pending:
+            captions[path] = merge_captions([next(generated) for _ in range(count)])
+            store_caption(key, captions[path])
+    return captions
+
+
+def _build_entity(path: Path, caption: str, enriched: dict, callback=None) -> MetadataEntity:
+    """metadata от LLM → category/flags → MetadataEntity"""
+    categories = enriched.get("categories")
+    if categories is None:
+        categories = stock_categories(enriched.get("keywords") or [])
+        if callback:
+            callback("category", categories["shutterstock"]["category"])
+
+    flags = {"video": True}
+    if callback:
+        callback("flags", str(flags))
+
+    return MetadataEntity(
+        file=str(path),
+        title=enriched.get("title"),
+        description=enriched.get("description"),
+        keywords=enriched.get("keywords"),
+        category=categories["shutterstock"]["category"],
+        secondary_category=categories["shutterstock"]["secondary_category"],
+        categories=categories,
+        flags=flags,
+        captions=[caption] if caption else [],
+        disambiguations=enriched.get("disambiguations") or {}
+    )
+
 
+def _failed_entity(path: Path, e: Exception) -> MetadataEntity:
+    print(f"❌ Ошибка при обработке видео {path}: {e}")
+    return MetadataEntity(file=str(path), title="", description="", keywords=[], disambiguations={})
 
-def process_video(path: Path, callback=None) -> MetadataEntity:
-    """Обработка видео: извлекаем кадр → caption → metadata → category/flags"""
+
+def process_video(path: Path, callback=None, caption: str | None = None) -> MetadataEntity:
+    """
+    Обработка видео: ключевые кадры → caption → metadata → category/flags.
+    caption можно передать заранее (посчитан пачкой в process_videos).
+    """
     try:
-        frames = extract_frames(path, num_frames=1)
-        caption = generate_caption(str(frames[0])) if frames else ""
+        if caption is None:
+            caption = caption_videos([path], batch_size=1)[path]
         if callback and caption:
             callback("captions", caption)
 
@@ -70,25 +106,64 @@ def process_video(path: Path, callback=None) -> MetadataEntity:
             media_type="video",
             callback=callback
         )
+        return _build_entity(path, caption, enriched, callback)
+    except Exception as e:
+        return _failed_entity(path, e)
 
-        category = detect_category(enriched.get("keywords", []))
-        if callback and category:
-            callback("category", category)
 
-        flags = {"video": True}
-        if callback:
-            callback("flags", str(flags))
-
-        return MetadataEntity(
-            file=str(path),
-            title=enriched.get("title"),
-            description=enriched.get("description"),
-            keywords=enriched.get("keywords"),
-            category=category,
-            flags=flags,
-            captions=[caption] if caption else [],
-            disambiguations=[]
-        )
-    except Exception as e:
-        print(f"❌ Ошибка при обработке видео {path}: {e}")
-        return MetadataEntity(file=str(path), title="", description="", keywords=[], disambiguations=[])
+def process_videos(paths: list[Path], callbacks: list | None = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE,
+                   series: dict[Path, SeriesMember] | None = None) -> list[MetadataEntity]:
+    """
+    Пакетная обработка видео: ключевые кадры всех роликов (caption_videos)
+    идут в caption одной пачкой, LLM-запросы всех роликов пачки идут одновременно.
+    series — как в process_images: копии серии не проходят caption/LLM.
+    """
+    callbacks = callbacks or [None] * len(paths)
+    series = series or {}
+    results = []
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        callback_of = dict(zip(chunk, callbacks[start:start + batch_size]))
+        own = [p for p in chunk if not is_copy(series.get(p))]
+        entities: dict[Path, MetadataEntity] = {}
+        try:
+            captions = caption_videos(own, batch_size=batch_size)
+        except Exception as e:
+            print(f"❌ Ошибка пакетного caption ({len(own)} видео): {e}")
+            captions = {}
+
+        ready = []
+        for path in own:
+            if path not in captions:
+                entities[path] = _failed_entity(path, RuntimeError("caption не получен"))
+                continue
+            caption = captions[path]
+            if callback_of[path] and caption:
+                callback_of[path]("captions", caption)
+            ready.append((path, caption))
+
+        enriched_list = generate_metadata_many([(caption, "video", callback_of[path]) for path, caption in ready])
+        for (path, caption), enriched in zip(ready, enriched_list):
+            try:
+                entities[path] = _build_entity(path, caption, enriched, callback_of[path])
+            except Exception as e:
+                entities[path] = _failed_entity(path, e)
+            member = series.get(path)
+            if member:
+                entities[path].series_id = member.series_id
+                if member.index == 0:
+                    remember_leader(member.series_id, entities[path])
+
+        for path in chunk:
+            if path in entities:
+                continue
+            member = series.get(path)
+            shared = propagate(member, path, callback_of[path])
+            if shared is None:
+                # лидер серии не обработался — ролик идёт сам по себе
+                shared = process_video(path, callback=callback_of[path])
+                shared.series_id = member.series_id
+            entities[path] = shared
+        results.extend(entities[p] for p in chunk)
+    return results
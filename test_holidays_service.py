@@ -0,0 +1,16 @@
+from datetime import date
+
+from services.holidays_service import find_all_related, get_matcher
+
+
+def test_keyword_must_cover_holiday_name():
+    # 'dog' — не 'hot dog', 'pet at home' — не любой праздник со словом 'home'
+    found = find_all_related(["dog", "sofa", "pet at home"], on=date(2024, 8, 26))
+    assert "World Hot Dog Day" not in found
+    assert "Stay at Home Day" not in found
+    assert "National Home Day" not in found
+
+
+def test_plural_keyword_matches_holiday():
+    assert "World Dog Day" in get_matcher().match(["dogs"])
+    assert "World Rescue Dog Day" in get_matcher().match(["rescue dog"])
@@ -6,8 +6,13 @@ import faulthandler
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning, module="transformers.tokenization_utils_base")
 
-from services.image_service import process_image
-from services.video_service import process_video
+from services.image_service import process_images
+from services.video_service import process_videos
+from services.caption_service import DEFAULT_BATCH_SIZE, prewarm
+from services.series_service import detect_series
+from adapters.config_loader import get_config
+from adapters.image_loader import THUMB_SIZE, load_image
+from adapters.media_cache import cached_image
 from domain.models import MetadataEntity
 
 faulthandler.enable()
@@ -29,6 +34,26 @@ def get_video_preview(path: Path, size=(96, 96)):
         return None
 
 
+def load_thumbnail(path: Path, size: int = 120) -> QtGui.QPixmap | None:
+    """Превью через общий загрузчик (JPEG декодируется сразу в уменьшенном виде) и кэш превью"""
+    try:
+        image = cached_image(path, "thumb", {"side": THUMB_SIZE}, lambda: load_image(path, THUMB_SIZE), quality=85)
+    except Exception as e:
+        print(f"⚠️ Не удалось открыть {path.name}: {e}")
+        return None
+    return image_to_pixmap(image, size)
+
+
+def image_to_pixmap(image, size: int = 120) -> QtGui.QPixmap:
+    """RGB-картинка PIL → QPixmap превью"""
+    data = image.tobytes("raw", "RGB")
+    qimg = QtGui.QImage(data, image.width, image.height, image.width * 3, QtGui.QImage.Format.Format_RGB888)
+    pixmap = QtGui.QPixmap.fromImage(qimg.copy())
+    return pixmap.scaled(size, size,
+                         QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                         QtCore.Qt.TransformationMode.SmoothTransformation)
+
+
 class AttribApp(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -41,12 +66,12 @@ class AttribApp(QtWidgets.QMainWindow):
         # веса колонок
         self._col_weights = [1, 1, 1, 2, 0.5, 0.5, 1]
 
-        # очередь печати и таймер
-        self._print_queue = []
-        self._pending_tasks = {}
-        self._print_timer = QtCore.QTimer(self)
-        self._print_timer.timeout.connect(self._process_print_queue)
-        self._print_timer.start(30)
+        # ячейки, получившие итоговое значение (для прогресса)
+        self._done_cells: set[tuple[int, int]] = set()
+        self._streaming_cells: set[tuple[int, int]] = set()  # (row, col), в которые уже пошёл поток этого прогона
+        # превью видео строятся в фоне; поколение отсекает ответы для уже закрытой папки
+        self._preview_generation = 0
+        self._video_labels: dict[int, QtWidgets.QLabel] = {}
 
         # Центральный виджет
         central = QtWidgets.QWidget()
@@ -99,15 +124,15 @@ class AttribApp(QtWidgets.QMainWindow):
         self.export_btn.setFixedWidth(150)
         bottom_layout.addWidget(self.export_btn)
 
-        self.animate_checkbox = QtWidgets.QCheckBox("Печатать")
-        self.animate_checkbox.setChecked(False)
-        bottom_layout.addWidget(self.animate_checkbox)
-
         bottom_layout.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
 
         # 👉 пересчёт ширины сразу после первого показа
         QtCore.QTimer.singleShot(0, self.adjust_column_widths)
 
+        # BLIP грузим в фоне: окно открывается сразу, модель готова к «Старт»
+        if get_config().models_prewarm:
+            prewarm()
+
     def adjust_column_widths(self):
         """Пересчёт ширины колонок по весам"""
         total_width = self.table.viewport().width()
@@ -136,6 +161,9 @@ class AttribApp(QtWidgets.QMainWindow):
     def populate_table(self):
         """Добавляем файлы в таблицу"""
         self.table.setRowCount(0)
+        self._preview_generation += 1
+        self._video_labels = {}
+        videos = []
 
         for f in self.files:
             row = self.table.rowCount()
@@ -150,51 +178,16 @@ class AttribApp(QtWidgets.QMainWindow):
             preview_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
 
             if f.suffix.lower() in [".jpg", ".jpeg", ".png", ".webp"]:
-                pixmap = QtGui.QPixmap(str(f))
-                if not pixmap.isNull():
-                    preview_label.setPixmap(
-                        pixmap.scaled(120, 120,
-                                      QtCore.Qt.AspectRatioMode.KeepAspectRatio,
-                                      QtCore.Qt.TransformationMode.SmoothTransformation)
-                    )
+                pixmap = load_thumbnail(f)
+                if pixmap is not None:
+                    preview_label.setPixmap(pixmap)
             elif f.suffix.lower() in [".mp4", ".mov", ".avi", ".mkv"]:
-                from services.video_service import extract_frames, get_video_duration
-                try:
-                    duration = get_video_duration(f)
-                    num_frames = 3 if duration <= 10 else 5
-                    frame_paths = extract_frames(f, num_frames)
-                    frames = []
-                    for frame_path in frame_paths:
-                        pixmap = QtGui.QPixmap(str(frame_path))
-                        if not pixmap.isNull():
-                            frames.append(
-                                pixmap.scaled(120, 120,
-                                              QtCore.Qt.AspectRatioMode.KeepAspectRatio,
-                                              QtCore.Qt.TransformationMode.SmoothTransformation)
-                            )
-                    if frames:
-                        preview_label.setPixmap(frames[0])
-
-                        def cycle_frames(label=preview_label, frames=frames):
-                            current = getattr(label, "_frame_index", 0)
-                            next_index = (current + 1) % len(frames)
-                            label.setPixmap(frames[next_index])
-                            label._frame_index = next_index
-
-                        timer = QtCore.QTimer(preview_label)
-                        timer.timeout.connect(cycle_frames)
-                        timer.start(500)
-                        preview_label._frame_index = 0
-                        preview_label._timer = timer
-                    else:
-                        preview_label.setPixmap(
-                            self.style().standardIcon(QtWidgets.QStyle.StandardPixmap.SP_MediaPlay).pixmap(96, 96)
-                        )
-                except Exception as e:
-                    print(f"⚠️ Ошибка при создании превью видео {f}: {e}")
-                    preview_label.setPixmap(
-                        self.style().standardIcon(QtWidgets.QStyle.StandardPixmap.SP_MediaPlay).pixmap(96, 96)
-                    )
+                # кадры придут из фонового потока (load_video_previews)
+                preview_label.setPixmap(
+                    self.style().standardIcon(QtWidgets.QStyle.StandardPixmap.SP_MediaPlay).pixmap(96, 96)
+                )
+                self._video_labels[row] = preview_label
+                videos.append((row, f))
             else:
                 icon = self.style().standardIcon(QtWidgets.QStyle.StandardPixmap.SP_FileIcon)
                 preview_label.setPixmap(icon.pixmap(96, 96))
@@ -208,12 +201,64 @@ class AttribApp(QtWidgets.QMainWindow):
 
             self.table.setCellWidget(row, 0, cell_widget)
 
+        if videos:
+            threading.Thread(target=self.load_video_previews,
+                             args=(self._preview_generation, videos), daemon=True).start()
+
+    def load_video_previews(self, generation: int, videos: list[tuple[int, Path]]):
+        """
+        Фоновый поток: ffprobe всех роликов пулом (повторное открытие — из индекса),
+        затем сцены каждого ролика. Превью ключевых кадров уходят в GUI-поток,
+        а моменты сцен остаются в LRU keyframe_service — при caption сцены второй раз не ищутся.
+        """
+        from services.keyframe_service import keyframes
+        from services.probe_service import probe_many
+
+        probe_many([f for _, f in videos])
+        for row, f in videos:
+            if generation != self._preview_generation:
+                return  # открыли другую папку
+            try:
+                previews = [k.preview for k in keyframes(f).keyframes]
+            except Exception as e:
+                print(f"⚠️ Ошибка при создании превью видео {f}: {e}")
+                continue
+            if previews:
+                QtCore.QMetaObject.invokeMethod(
+                    self, "show_video_preview", QtCore.Qt.ConnectionType.QueuedConnection,
+                    QtCore.Q_ARG(int, generation), QtCore.Q_ARG(int, row), QtCore.Q_ARG(object, previews)
+                )
+
+    @QtCore.pyqtSlot(int, int, object)
+    def show_video_preview(self, generation: int, row: int, previews: list):
+        label = self._video_labels.get(row)
+        if generation != self._preview_generation or label is None:
+            return
+        frames = [image_to_pixmap(image) for image in previews]
+        label.setPixmap(frames[0])
+        if len(frames) < 2:
+            return
+
+        def cycle_frames(label=label, frames=frames):
+            current = getattr(label, "_frame_index", 0)
+            next_index = (current + 1) % len(frames)
+            label.setPixmap(frames[next_index])
+            label._frame_index = next_index
+
+        timer = QtCore.QTimer(label)
+        timer.timeout.connect(cycle_frames)
+        timer.start(500)
+        label._frame_index = 0
+        label._timer = timer
+
     def start_processing(self):
         if not self.files:
             return
         self.progress.setValue(0)
+        self._done_cells.clear()
+        self._streaming_cells.clear()
 
-        steps_per_file = self.table.columnCount() - 1  # исключаем превью
+        steps_per_file = self.table.columnCount() - 2  # исключаем превью и captions
         self.progress.setMaximum(len(self.files) * steps_per_file)
 
         self.status_label.setText("Начинаем обработку...")
@@ -222,26 +267,38 @@ class AttribApp(QtWidgets.QMainWindow):
         thread.start()
 
     def process_files(self):
-        for i, f in enumerate(self.files, start=1):
-            try:
-                if f.suffix.lower() in [".jpg", ".jpeg", ".png", ".webp"]:
-                    meta = process_image(f, callback=lambda field, value, row=i-1: self.partial_update(row, field, value))
-                elif f.suffix.lower() in [".mp4", ".mov", ".avi", ".mkv"]:
-                    meta = process_video(f, callback=lambda field, value, row=i-1: self.partial_update(row, field, value))
-                else:
+        image_ext = {".jpg", ".jpeg", ".png", ".webp"}
+        video_ext = {".mp4", ".mov", ".avi", ".mkv"}
+        done = 0
+        self.status_label.setText("Ищем серии похожих кадров...")
+        series = detect_series(self.files)
+        # микро-пачки: captions считаются одной пачкой BLIP на batch файлов
+        for start in range(0, len(self.files), DEFAULT_BATCH_SIZE):
+            rows = list(enumerate(self.files[start:start + DEFAULT_BATCH_SIZE], start=start))
+            for ext, process in ((image_ext, process_images), (video_ext, process_videos)):
+                tasks = [(row, f) for row, f in rows if f.suffix.lower() in ext]
+                if not tasks:
+                    continue
+                callbacks = [
+                    lambda field, value, row=row: self.partial_update(row, field, value)
+                    for row, _ in tasks
+                ]
+                try:
+                    metas = process([f for _, f in tasks], callbacks=callbacks, series=series)
+                except Exception as e:
+                    print(f"❌ Ошибка пачки {', '.join(f.name for _, f in tasks)}: {e}")
                     continue
-            except Exception as e:
-                print(f"❌ Ошибка {f.name}: {e}")
-                continue
 
-            self.results.append(meta)
+                for (row, f), meta in zip(tasks, metas):
+                    self.results.append(meta)
 
-            QtCore.QMetaObject.invokeMethod(
-                self, "update_table_row", QtCore.Qt.ConnectionType.QueuedConnection,
-                QtCore.Q_ARG(int, i - 1), QtCore.Q_ARG(str, f.name), QtCore.Q_ARG(object, meta)
-            )
+                    QtCore.QMetaObject.invokeMethod(
+                        self, "update_table_row", QtCore.Qt.ConnectionType.QueuedConnection,
+                        QtCore.Q_ARG(int, row), QtCore.Q_ARG(str, f.name), QtCore.Q_ARG(object, meta)
+                    )
 
-            self.status_label.setText(f"Обрабатываю {i}/{len(self.files)}: {f.name}")
+                    done += 1
+                    self.status_label.setText(f"Обрабатываю {done}/{len(self.files)}: {f.name}")
 
         self.status_label.setText("✅ Обработка завершена")
 
@@ -253,65 +310,41 @@ class AttribApp(QtWidgets.QMainWindow):
         else:
             self.table.setItem(row, 6, QtWidgets.QTableWidgetItem(""))
 
-        # остальные поля – создаём только если пустые (чтобы не затирать очередь печати)
+        # остальные поля – создаём только если пустые (чтобы не затирать текст из потока)
         for col in range(1, 6):
             if not self.table.item(row, col):
                 self.table.setItem(row, col, QtWidgets.QTableWidgetItem(""))
 
     @QtCore.pyqtSlot(int, str, str)
     def update_table_cell(self, row: int, field: str, value: str):
+        """field.delta — дописываем кусок прямо из потока модели, field — итоговое значение"""
         col_map = {"title": 1, "description": 2, "keywords": 3,
                    "category": 4, "flags": 5}
-        if field not in col_map:
-            return
-
-        col = col_map[field]
-        if row not in self._pending_tasks:
-            self._pending_tasks[row] = []
-        self._pending_tasks[row].append((col, value))
-
-        if not self._print_queue:
-            self._start_next_task(row)
-
-    def _start_next_task(self, row: int) -> bool:
-        if row in self._pending_tasks and self._pending_tasks[row]:
-            col, value = self._pending_tasks[row].pop(0)
-            item = self.table.item(row, col) or QtWidgets.QTableWidgetItem("")
-            self.table.setItem(row, col, item)
-            self._print_queue.append((row, col, value, 0))
-            return True
-        return False
-
-    def _process_print_queue(self):
-        if not self._print_queue:
+        name, _, kind = field.partition(".")
+        if name not in col_map:
             return
 
-        row, col, text, index = self._print_queue[0]
+        col = col_map[name]
         item = self.table.item(row, col)
         if not item:
             item = QtWidgets.QTableWidgetItem("")
             self.table.setItem(row, col, item)
 
-        if self.animate_checkbox.isChecked():
-            if index < len(text):
-                item.setText(text[:index + 1])
-                self._print_queue[0] = (row, col, text, index + 1)
-                return
-        else:
-            # фикс: сразу выставляем весь текст
-            item.setText(text)
-
-        # завершение задачи
-        self._print_queue.pop(0)
-        self.progress.setValue(self.progress.value() + 1)
-        if self.progress.value() >= self.progress.maximum():
-            self.status_label.setText("✅ Обработка завершена")
-
-        if not self._start_next_task(row):
-            for other_row, tasks in self._pending_tasks.items():
-                if tasks:
-                    self._start_next_task(other_row)
-                    break
+        if kind == "delta":
+            # первый кусок поля в этом прогоне заменяет текст прошлого прогона
+            if (row, col) in self._streaming_cells:
+                item.setText(item.text() + value)
+            else:
+                self._streaming_cells.add((row, col))
+                item.setText(value)
+            return
+
+        item.setText(value)
+        if (row, col) not in self._done_cells:
+            self._done_cells.add((row, col))
+            self.progress.setValue(self.progress.value() + 1)
+            if self.progress.value() >= self.progress.maximum():
+                self.status_label.setText("✅ Обработка завершена")
 
     def partial_update(self, row: int, field: str, value: str):
         QtCore.QMetaObject.invokeMethod(
@@ -1,16 +1,79 @@
 """
 Модуль для загрузки словаря Getty (AAT/TGN/ULAN) в локальную SQLite базу.
 Работает только с английскими терминами.
+
+Импорт потоковый: N-Triples читаются построчно, RDF/XML — через iterparse,
+метки копятся по субъектам в ограниченном буфере и пишутся пачками executemany
+в больших транзакциях (WAL, synchronous=NORMAL). Индексы поиска строятся после загрузки.
+Повторный импорт того же файла ничего не дублирует (upsert по uri), а прерванный
+продолжается с сохранённой позиции (таблица import_state).
+После загрузки пересобирается и FTS5-индекс меток для нечёткого/префиксного поиска.
+
+Запуск:
+    python -m vocab.vocab_loader AATOut_Full.nt AAT
+    python -m vocab.vocab_loader TGNOut_Full.nt.gz TGN --force
 """
 
+import argparse
+import gzip
+import os
+import re
 import sqlite3
+import time
+import xml.etree.ElementTree as ET
 from pathlib import Path
-from rdflib import Graph, Namespace
+from typing import Iterator
 
 DB_PATH = Path("output/vocab.db")
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+PREF_LABEL = SKOS + "prefLabel"
+ALT_LABEL = SKOS + "altLabel"
+
+BATCH_SUBJECTS = 50_000   # субъектов в буфере до записи (и в одной транзакции)
+
+# индексы поиска: строятся после загрузки, на время импорта снимаются
+LOOKUP_INDEXES = {
+    "vocab_entry_term": "CREATE INDEX IF NOT EXISTS vocab_entry_term ON vocab_entry(term COLLATE NOCASE)",
+    "alt_label_alt": "CREATE INDEX IF NOT EXISTS alt_label_alt ON alt_label(alt COLLATE NOCASE, entry_id)",
+}
+
+# полнотекстовый поиск (vocab_lookup.search / suggest): все метки в vocab_label и два FTS5-индекса
+# поверх неё — по словам со стеммингом (плюрали, фразы, префиксы) и по триграммам (опечатки)
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vocab_label (
+    id INTEGER PRIMARY KEY,
+    entry_id INTEGER,
+    label TEXT,
+    is_alt INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS label_words USING fts5(
+    label, content='vocab_label', content_rowid='id', tokenize='porter unicode61', prefix='2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS label_trigram USING fts5(
+    label, content='vocab_label', content_rowid='id', tokenize='trigram'
+);
+"""
+
+# <s> <p> "literal"@lang .
+_NT_LITERAL = re.compile(
+    r'^<([^>]*)>\s+<([^>]*)>\s+"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<[^>]*>)?\s*\.\s*$'
+)
+_NT_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+_NT_SIMPLE_ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_db(db_path: Path = DB_PATH):
+    conn = _connect(db_path)
     cur = conn.cursor()
     cur.execute("""
     CREATE TABLE IF NOT EXISTS vocab_entry (
@@ -28,41 +91,252 @@ def init_db():
         FOREIGN KEY(entry_id) REFERENCES vocab_entry(id)
     )
     """)
+    # altLabel, чей субъект может прийти позже; переносятся в alt_label в конце импорта
+    cur.execute("CREATE TABLE IF NOT EXISTS alt_stage (uri TEXT, alt TEXT)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS import_state (
+        source TEXT PRIMARY KEY,
+        vocabulary TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        position INTEGER,
+        done INTEGER DEFAULT 0
+    )
+    """)
+    _ensure_unique_keys(cur)
     conn.commit()
     conn.close()
 
-def load_rdf_to_db(rdf_file: str, vocab_name: str = "AAT"):
+
+def _ensure_unique_keys(cur: sqlite3.Cursor):
+    """Уникальность uri и (entry_id, alt); базы прежнего загрузчика сперва очищаются от дублей."""
+    existing = {row[0] for row in cur.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    if "vocab_entry_uri" not in existing:
+        cur.execute("""
+            UPDATE alt_label SET entry_id = (
+                SELECT MIN(v2.id) FROM vocab_entry v1 JOIN vocab_entry v2 ON v2.uri = v1.uri
+                 WHERE v1.id = alt_label.entry_id)
+        """)
+        cur.execute("DELETE FROM vocab_entry WHERE id NOT IN (SELECT MIN(id) FROM vocab_entry GROUP BY uri)")
+        cur.execute("CREATE UNIQUE INDEX vocab_entry_uri ON vocab_entry(uri)")
+    if "alt_label_entry_alt" not in existing:
+        cur.execute("""
+            DELETE FROM alt_label WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM alt_label GROUP BY entry_id, alt)
+        """)
+        cur.execute("CREATE UNIQUE INDEX alt_label_entry_alt ON alt_label(entry_id, alt)")
+
+
+def build_indexes(conn: sqlite3.Connection):
+    """Индексы для поиска по term/alt (после загрузки это быстрее, чем поддерживать их на вставках)."""
+    for sql in LOOKUP_INDEXES.values():
+        conn.execute(sql)
+    build_search_index(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def build_search_index(conn: sqlite3.Connection):
+    """Пересобирает vocab_label и FTS5-индексы над ней из vocab_entry/alt_label."""
+    conn.executescript(SEARCH_SCHEMA)
+    conn.execute("DELETE FROM vocab_label")
+    conn.execute("""
+        INSERT INTO vocab_label(entry_id, label, is_alt)
+        SELECT id, preferred_label, 0 FROM vocab_entry
+        UNION ALL
+        SELECT entry_id, alt, 1 FROM alt_label
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS vocab_label_entry ON vocab_label(entry_id)")
+    for table in ("label_words", "label_trigram"):
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    conn.commit()
+
+
+def _unescape_nt(literal: str) -> str:
+    if "\\" not in literal:
+        return literal
+
+    def repl(m: re.Match) -> str:
+        code = m.group(1) or m.group(2)
+        return chr(int(code, 16)) if code else _NT_SIMPLE_ESCAPES.get(m.group(3), m.group(3))
+
+    return _NT_ESCAPE.sub(repl, literal)
+
+
+def _open_binary(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _is_rdf_xml(path: Path) -> bool:
+    name = path.name.lower().removesuffix(".gz")
+    if name.endswith((".rdf", ".xml", ".owl")):
+        return True
+    if name.endswith((".nt", ".ntriples")):
+        return False
+    with _open_binary(path) as f:
+        head = f.read(4096)
+    return head.lstrip().startswith(b"<?xml") or b"<rdf:RDF" in head
+
+
+def iter_ntriples(path: Path, start: int = 0) -> Iterator[tuple[int, str, str, str]]:
+    """(позиция после строки в байтах, субъект, предикат, текст) английских prefLabel/altLabel."""
+    with _open_binary(path) as f:
+        if start:
+            f.seek(start)
+        position = start
+        for raw in f:
+            position += len(raw)
+            # быстрый отсев: в дампах Getty меток — малая доля строк
+            if b"Label>" not in raw:
+                continue
+            m = _NT_LITERAL.match(raw.decode("utf-8", "replace"))
+            if not m:
+                continue
+            subject, predicate, literal, lang = m.groups()
+            if predicate in (PREF_LABEL, ALT_LABEL) and lang == "en":
+                yield position, subject, predicate, _unescape_nt(literal)
+
+
+def iter_rdf_xml(path: Path, start: int = 0) -> Iterator[tuple[int, str, str, str]]:
+    """
+    То же для RDF/XML. Позиция — номер описания субъекта верхнего уровня:
+    при продолжении импорта первые start описаний только разбираются, без записи.
+    """
+    about = f"{{{RDF}}}about"
+    labels = {f"{{{SKOS}}}prefLabel": PREF_LABEL, f"{{{SKOS}}}altLabel": ALT_LABEL}
+    depth, subject, subject_lang, position, root = 0, None, None, 0, None
+    with _open_binary(path) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = elem
+                elif depth == 2:
+                    subject, subject_lang = elem.get(about), elem.get(XML_LANG)
+                continue
+            depth -= 1
+            if depth == 2 and elem.tag in labels and subject and position >= start:
+                if (elem.get(XML_LANG) or subject_lang) == "en" and elem.text:
+                    yield position + 1, subject, labels[elem.tag], elem.text.strip()
+            elif depth == 1:
+                position += 1
+                subject = None
+                root.clear()  # разобранные описания не копятся в дереве
+
+
+class _SubjectBuffer:
+    """Метки, сгруппированные по субъекту; пишется в базу при заполнении."""
+
+    def __init__(self, vocab_name: str):
+        self.vocab_name = vocab_name
+        self.subjects: dict[str, list] = {}   # uri → [prefLabel | None, {altLabel: None}]
+
+    def add(self, subject: str, predicate: str, text: str):
+        labels = self.subjects.setdefault(subject, [None, {}])
+        if predicate == PREF_LABEL:
+            if labels[0] is None:
+                labels[0] = text
+        else:
+            labels[1][text] = None
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def flush(self, cur: sqlite3.Cursor) -> tuple[int, int]:
+        entries = [(pref, pref, uri, self.vocab_name)
+                   for uri, (pref, _) in self.subjects.items() if pref is not None]
+        alts = [(uri, alt) for uri, (_, alt_labels) in self.subjects.items() for alt in alt_labels]
+        cur.executemany("""
+            INSERT INTO vocab_entry(term, preferred_label, uri, vocabulary) VALUES (?, ?, ?, ?)
+            ON CONFLICT(uri) DO UPDATE SET
+                term = excluded.term, preferred_label = excluded.preferred_label, vocabulary = excluded.vocabulary
+        """, entries)
+        cur.executemany("INSERT INTO alt_stage(uri, alt) VALUES (?, ?)", alts)
+        self.subjects.clear()
+        return len(entries), len(alts)
+
+
+def load_rdf_to_db(rdf_file: str, vocab_name: str = "AAT", db_path: Path = DB_PATH,
+                   batch_subjects: int = BATCH_SUBJECTS, force: bool = False) -> dict:
     """
-    Загружает RDF/XML или N-Triples файл в SQLite.
+    Загружает RDF/XML или N-Triples файл (можно .gz) в SQLite.
     Берём только английские prefLabel/altLabel.
+    force=True — импортировать заново, даже если файл уже загружен.
     """
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
+    path = Path(rdf_file)
+    init_db(db_path)
+    conn = _connect(db_path)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 МБ страничного кэша на время импорта
     cur = conn.cursor()
 
-    g = Graph()
-    g.parse(rdf_file)
-
-    SKOS = Namespace("http://www.w3.org/2004/02/skos/core#")
-
-    for s, p, o in g.triples((None, SKOS.prefLabel, None)):
-        if getattr(o, "language", None) == "en":
-            uri = str(s)
-            preferred = str(o)
-            cur.execute(
-                "INSERT INTO vocab_entry(term, preferred_label, uri, vocabulary) VALUES (?, ?, ?, ?)",
-                (preferred, preferred, uri, vocab_name)
-            )
-            entry_id = cur.lastrowid
-
-            # altLabels
-            for _, _, alt in g.triples((s, SKOS.altLabel, None)):
-                if getattr(alt, "language", None) == "en":
-                    cur.execute(
-                        "INSERT INTO alt_label(entry_id, alt) VALUES (?, ?)",
-                        (entry_id, str(alt))
-                    )
+    source = str(path.resolve())
+    st = os.stat(path)
+    row = cur.execute("SELECT vocabulary, size, mtime_ns, position, done FROM import_state WHERE source = ?",
+                      (source,)).fetchone()
+    same_file = row is not None and row[:3] == (vocab_name, st.st_size, st.st_mtime_ns)
+    if same_file and row[4] and not force:
+        conn.close()
+        print(f"✔ {rdf_file} уже загружен в {db_path}")
+        return {"entries": 0, "alt_labels": 0, "skipped": True}
+    start = row[3] if same_file and not force else 0
+    if start:
+        print(f"↻ Продолжаем импорт {rdf_file} с позиции {start}")
+    else:
+        cur.execute("DELETE FROM alt_stage")
+    cur.execute("""
+        INSERT INTO import_state(source, vocabulary, size, mtime_ns, position, done) VALUES (?, ?, ?, ?, ?, 0)
+        ON CONFLICT(source) DO UPDATE SET vocabulary = excluded.vocabulary, size = excluded.size,
+            mtime_ns = excluded.mtime_ns, position = excluded.position, done = 0
+    """, (source, vocab_name, st.st_size, st.st_mtime_ns, start))
+    for name in LOOKUP_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+    started = time.perf_counter()
+    triples = iter_rdf_xml(path, start) if _is_rdf_xml(path) else iter_ntriples(path, start)
+    buffer = _SubjectBuffer(vocab_name)
+    entries = alts = 0
 
+    def flush(position: int):
+        nonlocal entries, alts
+        added_entries, added_alts = buffer.flush(cur)
+        entries += added_entries
+        alts += added_alts
+        # позиция пишется в той же транзакции, что и данные до неё
+        cur.execute("UPDATE import_state SET position = ? WHERE source = ?", (position, source))
+        conn.commit()
+
+    done = start  # позиция, до которой всё уже в буфере
+    for position, subject, predicate, text in triples:
+        if subject not in buffer.subjects and len(buffer) >= batch_subjects:
+            flush(done)
+        buffer.add(subject, predicate, text)
+        done = position
+    flush(done)
+
+    cur.execute("""
+        INSERT OR IGNORE INTO alt_label(entry_id, alt)
+        SELECT v.id, s.alt FROM alt_stage s JOIN vocab_entry v ON v.uri = s.uri
+    """)
+    cur.execute("DELETE FROM alt_stage")
+    cur.execute("UPDATE import_state SET done = 1 WHERE source = ?", (source,))
     conn.commit()
+    build_indexes(conn)
     conn.close()
-    print(f"✔ Loaded vocabulary from {rdf_file} into {DB_PATH}")
+    print(f"✔ Loaded vocabulary from {rdf_file} into {db_path}: "
+          f"{entries} entries, {alts} alt labels, {time.perf_counter() - started:.1f} s")
+    return {"entries": entries, "alt_labels": alts, "skipped": False}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт словаря Getty (N-Triples / RDF-XML) в SQLite")
+    parser.add_argument("rdf_file")
+    parser.add_argument("vocabulary", nargs="?", default="AAT")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--batch", type=int, default=BATCH_SUBJECTS, help="субъектов на транзакцию")
+    parser.add_argument("--force", action="store_true", help="загрузить заново, даже если файл уже импортирован")
+    args = parser.parse_args()
+    load_rdf_to_db(args.rdf_file, args.vocabulary, Path(args.db), args.batch, args.force)
@@ -1,44 +1,188 @@
 """
 Быстрый поиск по словарю Getty (локальный SQLite).
+
+lookup_many разрешает весь список ключей одним запросом по индексам
+vocab_entry(term) / alt_label(alt); частые термины (и промахи) держит LRU.
+Соединения read-only и свои у каждого потока, поэтому один GettyVocab
+можно звать из воркеров TaskQueue и UI одновременно.
+
+search — нечёткий поиск (плюрали, опечатки, фразы LLM) и suggest — подсказки
+по префиксу; оба идут по FTS5-индексам меток, которые строит vocab_loader.
 """
 
+import difflib
+import json
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+
+from vocab.vocab_loader import LOOKUP_INDEXES, build_search_index
 
 DB_PATH = Path("output/vocab.db")
 
+MAX_TERMS_PER_QUERY = 500
+SEARCH_CANDIDATES = 50      # кандидатов из FTS5 на переранжирование
+TRIGRAM_FALLBACK = 0.9      # поиск по триграммам, если лучшее совпадение по словам слабее
+
+# на термин — одна строка: сначала совпадение с preferred_label, иначе по altLabel
+# (оба подзапроса — поиск по индексу с LIMIT 1, сколько бы совпадений ни было)
+_LOOKUP_SQL = """
+WITH q(term) AS (SELECT value FROM json_each(?)),
+hit(term, entry_id) AS (
+    SELECT q.term, COALESCE(
+        (SELECT v.id FROM vocab_entry v WHERE v.term = q.term ORDER BY v.id LIMIT 1),
+        (SELECT a.entry_id FROM alt_label a WHERE a.alt = q.term ORDER BY a.entry_id LIMIT 1)
+    ) FROM q
+)
+SELECT hit.term, v.preferred_label, v.uri
+  FROM hit JOIN vocab_entry v ON v.id = hit.entry_id
+"""
+
+
 class GettyVocab:
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, cache_size: int = 4096):
         if not Path(db_path).exists():
             raise RuntimeError("Vocabulary DB not found. Run vocab_loader first.")
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = Path(db_path)
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, Optional[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        """Базы, собранные прежним загрузчиком, без индексов поиска — достраиваем один раз."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+            missing = [sql for name, sql in LOOKUP_INDEXES.items() if name not in existing]
+            for sql in missing:
+                conn.execute(sql)
+            conn.commit()
+            if "label_trigram" not in existing:
+                build_search_index(conn)
+        finally:
+            conn.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Read-only соединение текущего потока."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+        return conn
 
     def lookup(self, term: str) -> Optional[dict]:
         """
         Ищет термин или его альтернативы.
         Возвращает dict с preferred_label и uri, если найдено.
         """
-        cur = self.conn.cursor()
-
-        # точное совпадение с preferred_label
-        cur.execute(
-            "SELECT preferred_label, uri FROM vocab_entry WHERE term = ? COLLATE NOCASE",
-            (term,)
-        )
-        row = cur.fetchone()
-        if row:
-            return {"preferred": row[0], "uri": row[1]}
-
-        # поиск по alt_label
-        cur.execute("""
-            SELECT v.preferred_label, v.uri
-              FROM vocab_entry v
-              JOIN alt_label a ON a.entry_id = v.id
-             WHERE a.alt = ? COLLATE NOCASE
-        """, (term,))
-        row2 = cur.fetchone()
-        if row2:
-            return {"preferred": row2[0], "uri": row2[1]}
-
-        return None
+        return self.lookup_many([term])[term]
+
+    def lookup_many(self, terms: Iterable[str]) -> dict[str, Optional[dict]]:
+        """Термин → {"preferred", "uri"} или None, для всего списка сразу (порядок сохраняется)."""
+        terms = list(dict.fromkeys(terms))
+        found: dict[str, Optional[dict]] = {}
+        pending = []
+        with self._lock:
+            for term in terms:
+                key = term.lower()
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+                    self.hits += 1
+                elif key not in found:
+                    found[key] = None
+                    pending.append(key)
+            self.misses += len(pending)
+
+        for start in range(0, len(pending), MAX_TERMS_PER_QUERY):
+            chunk = pending[start:start + MAX_TERMS_PER_QUERY]
+            resolved: dict[str, dict] = {}
+            for term, preferred, uri in self.conn.execute(_LOOKUP_SQL, (json.dumps(chunk),)):
+                resolved[term] = {"preferred": preferred, "uri": uri}
+            with self._lock:
+                for term in chunk:
+                    found[term] = resolved.get(term)
+                    self._cache[term] = found[term]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return {term: found[term.lower()] for term in terms}
+
+    def _fts(self, table: str, match: str, order: str, limit: int) -> list[tuple]:
+        return self.conn.execute(f"""
+            SELECT l.entry_id, l.label, l.is_alt, v.preferred_label, v.uri
+              FROM {table} f
+              JOIN vocab_label l ON l.id = f.rowid
+              JOIN vocab_entry v ON v.id = l.entry_id
+             WHERE {table} MATCH ?
+             ORDER BY {order}
+             LIMIT ?
+        """, (match, limit)).fetchall()
+
+    @staticmethod
+    def _ranked(query: str, rows: list[tuple], limit: int, min_score: float) -> list[dict]:
+        """Одна запись на концепт: лучшая из его меток по сходству с запросом."""
+        best: dict[int, dict] = {}
+        for entry_id, label, is_alt, preferred, uri in rows:
+            score = difflib.SequenceMatcher(None, query, label.lower()).ratio() * (0.98 if is_alt else 1.0)
+            if score >= min_score and score > best.get(entry_id, {}).get("score", -1):
+                best[entry_id] = {"preferred": preferred, "uri": uri, "label": label, "score": round(score, 3)}
+        return sorted(best.values(), key=lambda r: -r["score"])[:limit]
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.5) -> list[dict]:
+        """
+        Нечёткий поиск: [{"preferred", "uri", "label", "score"}] по убыванию score.
+        Сначала по словам со стеммингом ('red dogs' → 'red dog'), при слабом результате —
+        по триграммному индексу подстрок ('elefant' → 'elephant');
+        кандидаты ранжируются по сходству с запросом.
+        """
+        query = " ".join(re.findall(r"\w+", query.lower()))
+        if not query:
+            return []
+        words = query.split()
+        # все слова запроса, затем без одного ('red dog photo' → 'red dog', 'dog photo', ...):
+        # AND по словам селективен, а OR по частому слову ранжировал бы пол-словаря
+        rows = self._fts("label_words", " ".join(f'"{w}"' for w in words), "rank", SEARCH_CANDIDATES)
+        result = self._ranked(query, rows, limit, min_score)
+        if len(words) > 1 and (not result or result[0]["score"] < TRIGRAM_FALLBACK):
+            for skip in range(len(words)):
+                subset = words[:skip] + words[skip + 1:]
+                rows += self._fts("label_words", " ".join(f'"{w}"' for w in subset), "rank", SEARCH_CANDIDATES)
+            result = self._ranked(query, rows, limit, min_score)
+        if len(query) >= 3 and (not result or result[0]["score"] < TRIGRAM_FALLBACK):
+            # подстроки-половины: одна опечатка портит не больше одной из них
+            k = max(3, len(query) // 2)
+            halves = dict.fromkeys((query[:k], query[-k:]))
+            rows += self._fts("label_trigram", " OR ".join(f'"{h}"' for h in halves), "rank", SEARCH_CANDIDATES)
+            result = self._ranked(query, rows, limit, min_score)
+        return result
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict]:
+        """Подсказки по мере ввода: метки, в которых есть все слова prefix (последнее — началом слова)."""
+        words = re.findall(r"\w+", prefix.lower())
+        if not words:
+            return []
+        match = " ".join(f'"{w}"' for w in words) + "*"
+        rows = self._fts("label_words", match, "l.is_alt, length(l.label), rank", limit * 3)
+        seen, result = set(), []
+        for entry_id, label, _, preferred, uri in rows:
+            if entry_id not in seen:
+                seen.add(entry_id)
+                result.append({"preferred": preferred, "uri": uri, "label": label})
+        return result[:limit]
+
+    def close(self):
+        """Закрывает соединение текущего потока."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
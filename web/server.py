@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Query, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse
+from fastapi.responses import Response, HTMLResponse, RedirectResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from jinja2 import Environment, FileSystemLoader, TemplateNotFound
 from pathlib import Path
@@ -44,7 +44,7 @@ def index(q: str = Query(None)):
             if q_lower in r["file"].lower()
             or q_lower in r["description"].lower()
             or any(q_lower in kw for kw in r["keywords"])
-            or any(q_lower in k for k in (r.get("disambigs") or {}))
+            or any(q_lower in k for k in (r.get("disambiguations") or r.get("disambigs") or {}))
         ]
 
     try:
@@ -54,6 +54,48 @@ def index(q: str = Query(None)):
         return HTMLResponse("<h2>❌ Шаблон preview.html не найден</h2>", status_code=500)
 
 
+def _previewable(file: str) -> bool:
+    """Превью отдаём только для файлов из results.json или из папок input (output.input_dir)."""
+    if any(r["file"] == file for r in load_results()):
+        return True
+    from adapters.config_loader import get_config
+    input_dirs = get_config().input_dir
+    roots = [Path("input")] + [Path(d) for d in ([input_dirs] if isinstance(input_dirs, str) else input_dirs)]
+    resolved = Path(file).resolve()
+    return any(resolved.is_relative_to(root.resolve()) for root in roots)
+
+
+@app.get("/thumb")
+def thumb(file: str = Query(...)):
+    """Превью файла из общего кэша: картинка — уменьшенная копия, видео — главный ключевой кадр"""
+    from adapters.image_loader import THUMB_SIZE, load_image
+    from adapters.media_cache import cached_path, encode_jpeg
+    from services.series_service import VIDEO_EXT
+
+    path = Path(file)
+    if not _previewable(file):
+        return JSONResponse({"error": f"{file} нет в results.json и вне папок input"}, status_code=403)
+    if not path.is_file():
+        return JSONResponse({"error": f"{file} не найден"}, status_code=404)
+
+    def build():
+        if path.suffix.lower() in VIDEO_EXT:
+            from services.keyframe_service import keyframes
+            main = keyframes(path).main
+            if main is None:
+                raise ValueError("в ролике нет кадров")
+            return main.preview
+        return load_image(path, THUMB_SIZE)
+
+    try:
+        cached = cached_path(path, "thumb", {"side": THUMB_SIZE}, build)
+        if cached is not None:
+            return FileResponse(cached, media_type="image/jpeg")
+        return Response(encode_jpeg(build(), 85), media_type="image/jpeg")
+    except Exception as e:
+        return JSONResponse({"error": f"{path.name}: {e}"}, status_code=422)
+
+
 @app.post("/update")
 def update(file: str = Form(...), title: str = Form(...), description: str = Form(...),
            keywords: str = Form(...), category: str = Form(""),
@@ -65,6 +107,8 @@ def update(file: str = Form(...), title: str = Form(...), description: str = For
             r["title"] = title.strip()
             r["description"] = description.strip()
             r["keywords"] = [kw.strip() for kw in keywords.split(",") if kw.strip()]
+            if (category.strip() or None) != r.get("category"):
+                r.pop("categories", None)  # ручная категория важнее посчитанных по стокам
             r["category"] = category.strip() or None
             r["flags"] = {
                 "ai_generated": ai_generated is not None,
@@ -86,6 +130,7 @@ def batch_update(files: str = Form(...), category: str = Form(""),
         if r["file"] in file_list:
             if category:
                 r["category"] = category.strip()
+                r.pop("categories", None)
             if any([ai_generated, fictional, people_not_real]):
                 r["flags"] = {
                     "ai_generated": ai_generated is not None,
@@ -96,6 +141,57 @@ def batch_update(files: str = Form(...), category: str = Form(""),
     return RedirectResponse("/", status_code=303)
 
 
+@app.get("/regenerate")
+async def regenerate(file: str = Query(...)):
+    """
+    Перегенерация атрибуции одного файла потоком (text/event-stream):
+    каждое событие — {"field", "value"} из callback, включая field.delta
+    с токенами прямо из модели. В конце результат сохраняется в results.json.
+    """
+    results = load_results()
+    record = next((r for r in results if r["file"] == file), None)
+    if record is None:
+        return JSONResponse({"error": f"{file} нет в results.json"}, status_code=404)
+
+    from services.image_service import process_image
+    from services.video_service import process_video
+    process = process_video if record.get("type") == "video" else process_image
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def callback(field: str, value: str):
+        loop.call_soon_threadsafe(events.put_nowait, (field, value))
+
+    async def run():
+        try:
+            meta = await asyncio.to_thread(process, Path(file), callback)
+        finally:
+            events.put_nowait(None)
+        record.update(
+            title=meta.title or record.get("title", ""),
+            description=meta.description or record.get("description", ""),
+            keywords=meta.keywords or record.get("keywords", []),
+            category=meta.category or record.get("category"),
+            secondary_category=meta.secondary_category or record.get("secondary_category"),
+            categories=meta.categories or record.get("categories"),
+            disambiguations=meta.disambiguations or record.get("disambiguations", {}),
+            captions=meta.captions or record.get("captions", []),
+        )
+        save_results(results)
+
+    async def stream():
+        task = asyncio.create_task(run())
+        while (event := await events.get()) is not None:
+            field, value = event
+            yield f"data: {json.dumps({'field': field, 'value': value}, ensure_ascii=False)}\n\n"
+        await task
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
 # --- WebSocket автообновления ---
 last_mtime = 0
 
@@ -120,6 +216,29 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/models", response_class=JSONResponse)
+def models():
+    """Состояние моделей: загружена ли, время загрузки, RSS"""
+    from services.model_registry import registry
+    return registry.stats()
+
+
+@app.get("/vocab/suggest", response_class=JSONResponse)
+def vocab_suggest(q: str = Query(...), limit: int = Query(10)):
+    """Подсказки словаря Getty по мере ввода ключа (пусто, если словарь не загружен)"""
+    from services.disambiguation_service import get_vocab
+    vocab = get_vocab()
+    return vocab.suggest(q, limit) if vocab else []
+
+
+@app.get("/vocab/search", response_class=JSONResponse)
+def vocab_search(q: str = Query(...), limit: int = Query(10)):
+    """Нечёткий поиск по словарю Getty (плюрали, опечатки, фразы)"""
+    from services.disambiguation_service import get_vocab
+    vocab = get_vocab()
+    return vocab.search(q, limit) if vocab else []
+
+
 @app.get("/results", response_class=JSONResponse)
 def get_results():
     """Отдать JSON прямо в браузер"""